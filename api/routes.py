@@ -13,6 +13,7 @@ import jsonpickle
 # local
 import conf.config as conf
 import modules.byzantine as byz
+from modules.nodeset import NodeSet
 from communication.zeromq.node import Node
 
 # globals
@@ -51,8 +52,10 @@ def get_byz_behaviors():
 
 class SetEncoder(json.JSONEncoder):
     def default(self, obj):
-        if isinstance(obj, set):
+        if isinstance(obj, (set, frozenset)):
             return list(obj)
+        if isinstance(obj, NodeSet):
+            return obj.to_list()
         return json.JSONEncoder.default(self, obj)
 
 @routes.route("/data", methods=["GET"])
@@ -161,11 +164,17 @@ def get_nodes_list():
 
 @routes.route("/publish_node", methods=["POST"])
 def publish_node():
+    """Adds a node, or a list of nodes, to the system.
+
+    A list is added with a single refresh of the system.
+    """
     data = request.get_json()
-    new_node = Node(data['id'], data['hostname'], data['ip'], data['port'])
-    conf.add_node_to_hosts_file(new_node)
+    new_nodes = [Node(d['id'], d['hostname'], d['ip'], d['port'])
+                 for d in (data if isinstance(data, list) else [data])]
+    for new_node in new_nodes:
+        conf.add_node_to_hosts_file(new_node)
 
-    # re-fresh system to account for new, added node
-    app.resolver.refresh(new_node)
+    # re-fresh system to account for new, added nodes
+    app.resolver.refresh_nodes(new_nodes)
 
     return jsonify(success=True)
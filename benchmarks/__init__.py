@@ -0,0 +1 @@
+"""Package containing benchmarks, run as python -m benchmarks.<name>."""
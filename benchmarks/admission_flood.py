@@ -0,0 +1,104 @@
+"""Benchmark of receiver CPU usage under a flood from a single sender.
+
+Starts a UDP receiver in a separate process and floods it with FD tokens
+from one node id as fast as possible, with and without admission control.
+Reports the number of datagrams the receiver read from its socket, how many
+payloads reached the application, the CPU time used by the receiver process
+per wall-clock second and per datagram read.
+
+Without admission control every datagram is decoded and dispatched, so the
+receiver falls behind and its CPU is spent on the flooding node. With
+admission control, datagrams over the rate limit of the sender are dropped
+from their header, so the number of decoded messages stays bounded by the
+token bucket and each dropped datagram costs a fraction of a decode.
+
+    python -m benchmarks.admission_flood [seconds]
+"""
+
+# standard
+import multiprocessing
+import socket
+import sys
+import time
+from threading import Thread
+
+# external
+import psutil
+
+# local
+from communication.admission import AdmissionControl
+from communication.udp.message import Message
+from communication.udp.receiver import Receiver
+from resolve.enums import MessageType
+
+FLOODER_ID = 1
+
+
+def run_receiver(port, use_admission, received, dispatched):
+    """Runs a receiver, sharing its counters through received/dispatched."""
+    admission = None
+    if use_admission:
+        admission = AdmissionControl(0, known_senders=lambda: [0, 1, 2],
+                                     channel="UDP")
+    payloads = []
+    receiver = Receiver(("127.0.0.1", port),
+                        on_message_recv=payloads.append,
+                        admission=admission)
+    Thread(target=receiver.listen, daemon=True).start()
+    while True:
+        received.value = receiver.msgs_recv
+        dispatched.value = len(payloads)
+        time.sleep(0.05)
+
+
+def flood(port, seconds):
+    """Sends FD tokens to port from FLOODER_ID for the given seconds."""
+    payload = {"type": MessageType.FAILURE_DETECTOR_MESSAGE,
+               "sender": FLOODER_ID}
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.connect(("127.0.0.1", port))
+    # distinct counters for consecutive datagrams, so each one is accepted
+    datagrams = [Message(FLOODER_ID, c, payloads=[payload] * 8).to_bytes()
+                 for c in range(1000)]
+    end = time.time() + seconds
+    while time.time() < end:
+        for datagram in datagrams:
+            try:
+                sock.send(datagram)
+            except OSError:
+                pass
+    sock.close()
+
+
+def run(use_admission, seconds, port):
+    """Runs one flood and returns (received, dispatched, cpu seconds)."""
+    received = multiprocessing.Value("l", 0)
+    dispatched = multiprocessing.Value("l", 0)
+    p = multiprocessing.Process(target=run_receiver,
+                                args=(port, use_admission, received,
+                                      dispatched))
+    p.start()
+    time.sleep(0.5)
+
+    proc = psutil.Process(p.pid)
+    cpu_before = sum(proc.cpu_times()[:2])
+    flood(port, seconds)
+    time.sleep(0.2)
+    cpu = sum(proc.cpu_times()[:2]) - cpu_before
+    result = (received.value, dispatched.value, cpu)
+
+    p.terminate()
+    p.join()
+    return result
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"Flooding a UDP receiver from node {FLOODER_ID} for {seconds}s")
+    print(f"{'admission':>10} {'received':>10} {'dispatched':>12} " +
+          f"{'cpu/s':>8} {'cpu us/datagram':>16}")
+    for i, use_admission in enumerate([False, True]):
+        received, dispatched, cpu = run(use_admission, seconds, 7900 + i)
+        per_datagram = 10**6 * cpu / max(received, 1)
+        print(f"{str(use_admission):>10} {received:>10} {dispatched:>12} " +
+              f"{cpu / seconds:>8.2f} {per_datagram:>16.1f}")
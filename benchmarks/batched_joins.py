@@ -0,0 +1,82 @@
+"""Benchmark of the time to add k processors to a stable configuration.
+
+Starts the round-based simulator, see simulation.simulator, from a stable
+configuration of the given number of members. k joining processors arrive
+one every STAGGER rounds, either close together or spread out. The
+configuration follows the participants, with the joins within the batch
+window grouped, see BatchPolicy and JoiningMechanismModule. Reports the
+rounds until all processors are members of the same configuration, the
+reconfigurations processor 0 went through on the way, and the messages
+sent per processor and round.
+
+    python -m benchmarks.batched_joins [--members M] [--window W ...]
+                                       [--stagger R ...] [--delay R]
+                                       [--seed S] [--max-rounds R] [k ...]
+"""
+
+# standard
+import argparse
+
+# local
+from modules.nodeset import NodeSet, as_node_set
+from simulation.simulator import Simulator, START_STABLE
+
+
+def add_nodes(members, k, window, stagger, delay, seed, max_rounds):
+    """Returns tuple (rounds, reconfigurations, messages per node and round).
+
+    rounds is None if the k processors were not added within max_rounds.
+    """
+    n = members + k
+    arrivals = {members + j: 1 + j * stagger for j in range(k)}
+    sim = Simulator(n, seed=seed, max_delay=delay, start=START_STABLE,
+                    members=range(members), arrivals=arrivals,
+                    batch_window=window)
+    everyone = NodeSet(range(n))
+    configs = [NodeSet(range(members))]
+    rounds = None
+    while sim.round < max_rounds:
+        sim.step()
+        config = as_node_set(sim.recsa(0).get_config_j(0))
+        if config is not None and config != configs[-1]:
+            configs.append(config)
+        if all(sim.recsa(i).get_config_j(i) == everyone for i in range(n)):
+            rounds = sim.round
+            break
+    return rounds, len(configs) - 1, sim.msgs_sent / n / max(sim.round, 1)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sizes", metavar="k", type=int, nargs="*",
+                        default=[1, 5, 10, 20])
+    parser.add_argument("--members", type=int, default=30)
+    parser.add_argument("--window", type=float, action="append",
+                        help="batch window in rounds, default 0, 1 and 10")
+    parser.add_argument("--stagger", type=int, action="append",
+                        help="rounds between two arrivals, default 1 and 10")
+    parser.add_argument("--delay", type=int, default=1,
+                        help="max message delay in rounds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-rounds", type=int, default=300)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    windows = args.window or [0, 1, 10]
+    staggers = args.stagger or [1, 10]
+
+    print(f"Adding k processors to {args.members} members, " +
+          f"delay 1-{args.delay} rounds, seed {args.seed}")
+    print(f"{'k':>5} {'stagger':>8} {'window':>7} {'rounds':>7} " +
+          f"{'reconfigs':>10} {'msgs/node/round':>16}")
+    for k in args.sizes:
+        for stagger in staggers:
+            for window in windows:
+                rounds, reconfigs, msgs = add_nodes(
+                    args.members, k, window, stagger, args.delay, args.seed,
+                    args.max_rounds)
+                shown = "never" if rounds is None else str(rounds)
+                print(f"{k:>5} {stagger:>8} {window:>7g} {shown:>7} " +
+                      f"{reconfigs:>10} {msgs:>16.1f}")
@@ -0,0 +1,81 @@
+"""Benchmark of RecSA/RecMA convergence in the round-based simulator.
+
+Runs the scenarios below with the modules of n processors in one process,
+see simulation.simulator, and reports the rounds until the processors agree
+on a configuration without active notifications, the CPU time per round,
+and the messages sent per processor and round.
+
+    clean   no processor is a participant at the start
+    crash   a stable configuration of all processors, a third crash at once
+    join    a stable configuration, a tenth of the processors are joining
+
+    python -m benchmarks.convergence [--delay R] [--loss P] [--seed S]
+                                     [--scenario NAME] [--max-rounds R]
+                                     [--digests] [n ...]
+
+Every processor exchanges its O(n) state with all others in every round,
+so the CPU time per round grows at least quadratically with n. In the
+crash scenario it is 0.17 s at n=100, 0.69 s at 200, 3.4 s at 400 and
+28 s at 1000, where the run converges in 17 rounds after 9.5 minutes. The
+default sizes therefore stop at 100, larger ones are given explicitly.
+"""
+
+# standard
+import argparse
+import time
+
+# local
+from simulation.simulator import Simulator, START_CLEAN, START_STABLE
+
+
+def scenario(name, n):
+    """Returns the Simulator arguments for a scenario with n processors."""
+    if name == "clean":
+        return {"start": START_CLEAN}
+    if name == "crash":
+        crashed = range(1, 1 + n // 3)
+        return {"start": START_STABLE, "crashes": {k: 1 for k in crashed}}
+    if name == "join":
+        return {"start": START_STABLE, "members": range(n - max(n // 10, 1))}
+    raise ValueError(f"Unknown scenario {name}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sizes", metavar="n", type=int, nargs="*",
+                        default=[10, 50, 100])
+    parser.add_argument("--scenario", choices=["clean", "crash", "join"],
+                        action="append")
+    parser.add_argument("--delay", type=int, default=1,
+                        help="max message delay in rounds")
+    parser.add_argument("--loss", type=float, default=0,
+                        help="probability that a message is lost")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-rounds", type=int, default=60,
+                        help="rounds after which a run is given up")
+    parser.add_argument("--digests", action="store_true",
+                        help="send digests of unchanged RecSA state")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    scenarios = args.scenario or ["clean", "crash", "join"]
+
+    print(f"Convergence, delay 1-{args.delay} rounds, loss {args.loss}, " +
+          f"seed {args.seed}" + (", digests" if args.digests else ""))
+    print(f"{'n':>5} {'scenario':>9} {'rounds':>7} {'cpu/round (s)':>14} " +
+          f"{'max cpu (s)':>12} {'msgs/node/round':>16} {'wall (s)':>9}")
+    for n in args.sizes:
+        for name in scenarios:
+            start = time.perf_counter()
+            sim = Simulator(n, seed=args.seed, max_delay=args.delay,
+                            loss=args.loss, digests=args.digests,
+                            **scenario(name, n))
+            rounds = sim.run(args.max_rounds)
+            wall = time.perf_counter() - start
+            mean_cpu, max_cpu = sim.cpu_stats()
+            msgs = sim.msgs_sent / n / max(sim.round, 1)
+            shown = "never" if rounds is None else str(rounds)
+            print(f"{n:>5} {name:>9} {shown:>7} {mean_cpu:>14.3f} " +
+                  f"{max_cpu:>12.3f} {msgs:>16.1f} {wall:>9.1f}")
@@ -0,0 +1,97 @@
+"""Benchmark of failure detector accuracy under injected jitter.
+
+Simulates, on a virtual clock, n processors that each send a token to
+processor 0 every FD_SLEEP seconds with normally distributed jitter and
+occasional delay spikes. Processor 1 crashes half way through the run. For
+the token counting FDModule and the PhiAccrualFDModule the benchmark reports
+the time from the crash until processor 1 is suspected, and the fraction of
+reads of the trusted set in which an alive processor was falsely suspected,
+averaged over the alive processors.
+
+    python -m benchmarks.fd_jitter [duration] [jitter]
+"""
+
+# standard
+import heapq
+import random
+import sys
+
+# local
+from modules.constants import FD_SLEEP
+from modules.fd.module import FDModule
+from modules.fd.phi import PhiAccrualFDModule
+
+SAMPLE_INTERVAL = 0.05
+SPIKE_PROBABILITY = 0.01
+SPIKE_DELAY = 1
+CRASHED = 1
+
+
+class VirtualClock:
+    """Time source advanced by the simulation."""
+
+    def __init__(self):
+        self.time = 0
+
+    def __call__(self):
+        return self.time
+
+
+def simulate(create, n, duration, jitter, seed=0):
+    """Returns tuple (detection latency, false suspicion rate)."""
+    rand = random.Random(seed)
+    clock = VirtualClock()
+    fd = create(n, clock)
+    crash_at = duration / 2
+
+    def next_arrival(sent_at):
+        delay = max(rand.gauss(FD_SLEEP, jitter), 0)
+        if rand.random() < SPIKE_PROBABILITY:
+            delay += SPIKE_DELAY
+        return sent_at + delay
+
+    events = [(next_arrival(0), j) for j in range(1, n)]
+    heapq.heapify(events)
+    detected_at = None
+    reads = false_suspicions = 0
+    sample_at = SAMPLE_INTERVAL
+    while sample_at < duration:
+        while events and events[0][0] <= sample_at:
+            arrival, j = heapq.heappop(events)
+            clock.time = arrival
+            if j == CRASHED and arrival >= crash_at:
+                continue
+            fd.upon_token_from_pj(j)
+            heapq.heappush(events, (next_arrival(arrival), j))
+        clock.time = sample_at
+        trusted = fd.get_trusted()
+        if sample_at > 5 * FD_SLEEP:
+            alive = range(1 if sample_at < crash_at else 2, n)
+            reads += len(alive)
+            false_suspicions += sum(1 for k in alive if k not in trusted)
+        if (detected_at is None and sample_at >= crash_at and
+                CRASHED not in trusted):
+            detected_at = sample_at
+        sample_at += SAMPLE_INTERVAL
+
+    latency = None if detected_at is None else detected_at - crash_at
+    return latency, false_suspicions / max(reads, 1)
+
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 120
+    jitter = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+
+    implementations = [
+        ("count", lambda n, clock: FDModule(0, None, n)),
+        ("phi", lambda n, clock: PhiAccrualFDModule(0, None, n, now=clock)),
+    ]
+
+    print(f"Failure detector accuracy, {duration:.0f}s, jitter {jitter}s, " +
+          f"spikes of {SPIKE_DELAY}s with p={SPIKE_PROBABILITY}")
+    print(f"{'n':>6} {'mode':>8} {'detection (s)':>14} {'false susp.':>12}")
+    for n in [4, 16, 64, 256]:
+        for name, create in implementations:
+            latency, rate = simulate(create, n, duration, jitter)
+            detection = "never" if latency is None else f"{latency:.2f}"
+            print(f"{n:>6} {name:>8} {detection:>14} {rate:>12.3f}")
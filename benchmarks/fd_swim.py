@@ -0,0 +1,153 @@
+"""Benchmark of the SWIM failure detector against all-to-all tokens.
+
+Runs n failure detector modules in one process, connected by a simulated
+network on a virtual clock. Each message is delivered after the FD_SLEEP
+pacing of the UDP token channel plus a jittered link latency. Processor 1
+crashes a third into the run. For the all-to-all token counting FDModule
+and the SwimFDModule the benchmark reports the messages sent per node per
+second, the time until every alive node stopped trusting the crashed
+processor, and the fraction of trusted set reads in which an alive
+processor was falsely suspected.
+
+    python -m benchmarks.fd_swim [duration] [n ...]
+"""
+
+# standard
+import heapq
+import itertools
+import random
+import sys
+import time
+
+# local
+from modules.constants import FD_SLEEP
+from modules.fd.module import FDModule
+from modules.fd.swim import SwimFDModule
+
+LINK_LATENCY = 0.01
+LINK_JITTER = 0.005
+TICK_INTERVAL = 0.1
+CRASHED = 1
+
+
+class Network:
+    """Delivers messages between in-process modules on a virtual clock."""
+
+    def __init__(self, n, seed=0):
+        self.time = 0
+        self.rand = random.Random(seed)
+        self.events = []
+        self.order = itertools.count()
+        self.modules = []
+        self.crashed = set()
+        self.sent = [0 for i in range(n)]
+
+    def send(self, sender, receiver, msg):
+        """Schedules delivery of msg from sender to receiver."""
+        if sender in self.crashed:
+            return
+        self.sent[sender] += 1
+        delay = FD_SLEEP + max(self.rand.gauss(LINK_LATENCY, LINK_JITTER), 0)
+        heapq.heappush(self.events, (self.time + delay, next(self.order),
+                                     receiver, msg))
+
+    def schedule(self, at, callback):
+        """Schedules a callback at the given time."""
+        heapq.heappush(self.events, (at, next(self.order), None, callback))
+
+    def run_until(self, end):
+        """Processes all events up to time end."""
+        while self.events and self.events[0][0] <= end:
+            at, _, receiver, msg = heapq.heappop(self.events)
+            self.time = at
+            if receiver is None:
+                msg()
+            elif receiver not in self.crashed:
+                module = self.modules[receiver]
+                module.handle_tokens([(time.monotonic(), msg)])
+        self.time = end
+
+
+class NodeResolver:
+    """Minimal resolver routing failure detector messages to the network."""
+
+    def __init__(self, network, id):
+        self.network = network
+        self.id = id
+
+    def send_to_node(self, node_id, msg, fd_msg=False):
+        self.network.send(self.id, node_id, msg)
+
+
+def create_count(network, id, n):
+    module = FDModule(id, NodeResolver(network, id), n)
+    for j in range(n):
+        if j != id:
+            module.send_msg(j)
+    return module
+
+
+def create_swim(network, id, n):
+    module = SwimFDModule(id, NodeResolver(network, id), n,
+                          now=lambda: network.time)
+    module.random.seed(id)
+    return module
+
+
+def simulate(create, n, duration):
+    """Returns tuple (msgs per node per second, detection, false susp.)."""
+    network = Network(n)
+    network.modules = [create(network, i, n) for i in range(n)]
+    crash_at = duration / 3
+    detected_at = None
+    reads = false_suspicions = 0
+
+    def tick():
+        nonlocal detected_at, reads, false_suspicions
+        now = network.time
+        alive = [i for i in range(n) if i not in network.crashed]
+        detected = True
+        for i in alive:
+            module = network.modules[i]
+            if isinstance(module, SwimFDModule):
+                module.tick(now)
+            trusted = module.get_trusted()
+            if now > crash_at / 2:
+                reads += len(alive) - 1
+                false_suspicions += sum(1 for k in alive
+                                        if k != i and k not in trusted)
+            detected = detected and CRASHED not in trusted
+        if detected_at is None and now >= crash_at and detected:
+            detected_at = now
+        network.schedule(now + TICK_INTERVAL, tick)
+
+    def crash():
+        network.crashed.add(CRASHED)
+
+    network.schedule(0, tick)
+    network.schedule(crash_at, crash)
+    network.run_until(duration)
+
+    alive_sent = sum(c for i, c in enumerate(network.sent) if i != CRASHED)
+    load = alive_sent / (n - 1) / duration
+    latency = None if detected_at is None else detected_at - crash_at
+    return load, latency, false_suspicions / max(reads, 1)
+
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 60
+    sizes = [int(a) for a in sys.argv[2:]] or [8, 16, 32, 64]
+
+    implementations = [("all-to-all", create_count), ("swim", create_swim)]
+
+    print(f"Failure detectors in one process, {duration:.0f}s virtual time")
+    print(f"{'n':>5} {'mode':>11} {'msgs/node/s':>12} " +
+          f"{'detection (s)':>14} {'false susp.':>12} {'wall (s)':>9}")
+    for n in sizes:
+        for name, create in implementations:
+            start = time.perf_counter()
+            load, latency, rate = simulate(create, n, duration)
+            wall = time.perf_counter() - start
+            detection = "never" if latency is None else f"{latency:.1f}"
+            print(f"{n:>5} {name:>11} {load:>12.1f} {detection:>14} " +
+                  f"{rate:>12.4f} {wall:>9.1f}")
@@ -0,0 +1,107 @@
+"""Benchmark of the failure detector token processing rate.
+
+Feeds tokens from random processors to the failure detector and reports the
+number of tokens processed per second, both when only tokens are processed
+and when the trusted set is read after every token (as RecSA does). The
+current FDModule is compared to the previous implementation that updated
+the beat of every processor on each token, and to the NumPy-backed
+VectorizedFDModule if NumPy is installed. The last column applies tokens in
+batches of BATCH tokens and reads the trusted set after each batch.
+
+    python -m benchmarks.fd_tokens [n] [tokens]
+"""
+
+# standard
+import random
+import sys
+import time
+from copy import deepcopy
+
+# local
+from modules.constants import BEAT_THRESHOLD
+from modules.fd.module import FDModule
+from modules.fd.vectorized import VectorizedFDModule, numpy_available
+
+BATCH = 50
+
+
+class LegacyFD:
+    """The O(n) per token failure detector that FDModule replaced."""
+
+    def __init__(self, id, n):
+        self.id = id
+        self.number_of_nodes = n
+        self.beat = [0 for i in range(n)]
+        self.monitor = [0 for i in range(n)]
+        self.fd_set = set()
+
+    def upon_token_from_pj(self, processor_j):
+        self.beat[processor_j] = 0
+        self.beat[self.id] = 0
+
+        self.monitor[processor_j] = min(self.monitor[processor_j] + 1, 3)
+        self.monitor[self.id] = min(self.monitor[processor_j] + 1, 3)
+
+        new_fd_set = {processor_j, self.id}
+        for other_processor in range(self.number_of_nodes):
+            if other_processor == self.id or other_processor == processor_j:
+                continue
+            self.beat[other_processor] += 1
+            if self.beat[other_processor] < BEAT_THRESHOLD:
+                new_fd_set.add(other_processor)
+        self.fd_set = deepcopy(new_fd_set)
+
+    def get_trusted(self):
+        return self.fd_set
+
+
+def tokens_per_second(fd, senders, read_trusted):
+    """Returns tokens processed per second for the sequence of senders."""
+    start = time.perf_counter()
+    for j in senders:
+        fd.upon_token_from_pj(j)
+        if read_trusted:
+            fd.get_trusted()
+    return len(senders) / (time.perf_counter() - start)
+
+
+def batched_tokens_per_second(fd, senders):
+    """Returns tokens per second when applied in batches of BATCH tokens."""
+    batches = [senders[i:i + BATCH] for i in range(0, len(senders), BATCH)]
+    start = time.perf_counter()
+    for batch in batches:
+        fd.upon_tokens_from(batch)
+        fd.get_trusted()
+    return len(senders) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    tokens = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    rand = random.Random(0)
+    senders = [rand.randrange(1, n) for _ in range(tokens)]
+
+    implementations = [("legacy", lambda: LegacyFD(0, n)),
+                       ("FDModule", lambda: FDModule(0, None, n))]
+    if numpy_available():
+        implementations.append(("Vectorized",
+                                lambda: VectorizedFDModule(0, None, n)))
+
+    # all implementations must agree on the trusted set
+    results = set()
+    for _, create in implementations:
+        fd = create()
+        for j in senders:
+            fd.upon_token_from_pj(j)
+        results.add(frozenset(fd.get_trusted()))
+    assert len(results) == 1
+
+    print(f"Failure detector, n={n}, {tokens} tokens")
+    print(f"{'implementation':>16} {'tokens/s':>12} " +
+          f"{'+trusted':>12} {f'batch {BATCH}':>12}")
+    for name, create in implementations:
+        only = tokens_per_second(create(), senders, False)
+        trusted = tokens_per_second(create(), senders, True)
+        batch = ("-" if name == "legacy" else
+                 f"{batched_tokens_per_second(create(), senders):.0f}")
+        print(f"{name:>16} {only:>12.0f} {trusted:>12.0f} {batch:>12}")
@@ -0,0 +1,139 @@
+"""Benchmark of the time from invoking scripts/join.py to participating.
+
+Launches a system of the given number of members as local processes, with
+a hosts file of its own, and waits until they are all participants. Then
+adds the given number of nodes one after the other with scripts/join.py
+against node 0, and reports for each the seconds from the invocation of
+join.py until the new node is a participant, as seen through its /data
+route. Uses the ports of the nodes, see README, so no other system may run
+on the host.
+
+    python -m benchmarks.join_latency [--members M] [--joins K]
+                                      [--timeout S] [--policy NAME]
+"""
+
+# standard
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+# external
+import requests
+
+# local
+from modules.constants import NOT_PARTICIPANT, BOTTOM
+
+POLL_INTERVAL = 0.05
+
+
+def node_env(node_id, n, hosts_path, policy):
+    env = os.environ.copy()
+    env.pop("WERKZEUG_RUN_MAIN", None)
+    env.update({"ID": str(node_id), "API_PORT": str(4000 + node_id),
+                "NUMBER_OF_NODES": str(n), "NUMBER_OF_CLIENTS": "1",
+                "NUMBER_OF_BYZANTINE": "1", "HOSTS_PATH": hosts_path,
+                "RECMA_POLICY": policy})
+    return env
+
+
+def participant(node_id):
+    """Tests whether the node is a participant, False if it is not up."""
+    try:
+        data = requests.get(f"http://localhost:{4000 + node_id}/data",
+                            timeout=1).json()
+    except (requests.RequestException, ValueError):
+        return False
+    config = data["RECSA_MODULE"]["config"].get(str(node_id))
+    return config not in [None, NOT_PARTICIPANT, BOTTOM]
+
+
+def wait_for(nodes, timeout):
+    """Returns the seconds until all nodes are participants, None if they
+    were not within timeout seconds."""
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        if all(participant(j) for j in nodes):
+            return time.monotonic() - start
+        time.sleep(POLL_INTERVAL)
+    return None
+
+
+def launch(members, hosts_path, policy, log):
+    """Launches the members and returns their processes."""
+    with open(hosts_path, "w") as f:
+        for j in range(members):
+            f.write(f"{j},localhost,127.0.0.1,{5000 + j}\n")
+    return [subprocess.Popen([sys.executable, "main.py"], stdout=log,
+                             stderr=log, start_new_session=True,
+                             env=node_env(j, members, hosts_path, policy))
+            for j in range(members)]
+
+
+def join(node_id, hosts_path, policy, log, timeout):
+    """Runs join.py and returns tuple (process, seconds to participant).
+
+    join.py puts itself and the node it launches in a process group of
+    their own.
+    """
+    start = time.monotonic()
+    process = subprocess.Popen(
+        [sys.executable, "scripts/join.py", "http://localhost:4000"],
+        stdout=log, stderr=log,
+        env=node_env(node_id, node_id + 1, hosts_path, policy))
+    while time.monotonic() - start < timeout:
+        if participant(node_id):
+            return process, time.monotonic() - start
+        time.sleep(POLL_INTERVAL)
+    return process, None
+
+
+def stop(processes):
+    for process in processes:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--members", type=int, default=3)
+    parser.add_argument("--joins", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=120,
+                        help="seconds after which a join is given up")
+    parser.add_argument("--policy", default="trust",
+                        help="RECMA_POLICY of all nodes")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="join_latency")
+    hosts_path = os.path.join(workdir, "hosts.txt")
+    log = open(os.path.join(workdir, "nodes.log"), "w")
+    processes = launch(args.members, hosts_path, args.policy, log)
+    try:
+        booted = wait_for(range(args.members), args.timeout)
+        if booted is None:
+            sys.exit(f"Members did not boot, see {workdir}/nodes.log")
+        print(f"{args.members} members booted in {booted:.1f} s, " +
+              f"policy {args.policy}, logs in {workdir}")
+        print(f"{'node':>5} {'to participant (s)':>19}")
+        times = []
+        for node_id in range(args.members, args.members + args.joins):
+            process, seconds = join(node_id, hosts_path, args.policy, log,
+                                    args.timeout)
+            processes.append(process)
+            shown = "never" if seconds is None else f"{seconds:.2f}"
+            print(f"{node_id:>5} {shown:>19}")
+            if seconds is None:
+                break
+            times.append(seconds)
+        if times:
+            print(f"mean {sum(times) / len(times):.2f} s")
+    finally:
+        stop(processes)
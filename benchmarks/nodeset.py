@@ -0,0 +1,107 @@
+"""Benchmark of the NodeSet bitmask against lists and sets of ids.
+
+For sets of processors as stored by RecSA, reports the memory of a single
+set and of the RecSA state of one processor, with every set stored as a
+list (as received from the wire) and as a NodeSet, as well as the time of
+the set operations used by the modules and of one RecSA iteration in the
+stable state with all n processors participating.
+
+    python -m benchmarks.nodeset [n ...]
+"""
+
+# standard
+import sys
+import timeit
+import tracemalloc
+
+# local
+from modules import constants
+from modules.nodeset import NodeSet
+from modules.recsa.module import RecSAModule
+from benchmarks.recsa_iteration import StubResolver, seconds_per_iteration
+
+OPERATION_REPEAT = 200
+
+
+def allocated(build):
+    """Returns the bytes allocated by build() that are still referenced."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del value
+    return size
+
+
+def create(n, as_set):
+    """Returns a stable RecSA module, each set built by as_set(range(n))."""
+    mod = RecSAModule(0, StubResolver(n), n)
+    for k in range(n):
+        mod.config[k] = as_set(range(n))
+        mod.prp[k] = constants.DFLT_NTF
+        mod.alll[k] = True
+        mod.fd[k] = as_set(range(n))
+        mod.fd_part[k] = as_set(range(n))
+        mod.echo_part[k] = as_set(range(n))
+        mod.echo_prp[k] = constants.DFLT_NTF
+        mod.echo_all[k] = True
+    mod.all_seen = NodeSet(range(n))
+    return mod
+
+
+def microseconds(statement, **values):
+    """Returns the mean time of statement in microseconds."""
+    timer = timeit.Timer(statement, globals=values)
+    return timer.timeit(OPERATION_REPEAT) / OPERATION_REPEAT * 1e6
+
+
+def operations(n):
+    """Returns rows (operation, list/set time, NodeSet time) in us."""
+    a_list, b_list = list(range(n)), list(range(1, n + 1))
+    a, b = NodeSet(a_list), NodeSet(b_list)
+    a_set, b_set = set(a_list), set(b_list)
+    return [
+        ("equality", microseconds("set(a) == set(b)", a=a_list, b=b_list),
+         microseconds("a == b", a=a, b=b)),
+        ("union", microseconds("a | b", a=a_set, b=b_set),
+         microseconds("a | b", a=a, b=b)),
+        ("intersection", microseconds("a & b", a=a_set, b=b_set),
+         microseconds("a & b", a=a, b=b)),
+        ("hash", microseconds("hash(frozenset(a))", a=a_list),
+         microseconds("hash(a)", a=a)),
+        ("lex compare", microseconds("max(sorted(a), sorted(b))",
+                                     a=a_list, b=b_list),
+         microseconds("a.lex_lt(b)", a=a, b=b)),
+        ("to list", microseconds("list(a)", a=a_list),
+         microseconds("a.to_list()", a=a)),
+    ]
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [100, 200, 500, 1000]
+
+    print("Memory, all n processors in every set")
+    print(f"{'n':>5} {'list (B)':>9} {'NodeSet (B)':>12} " +
+          f"{'state, lists (kB)':>18} {'state, NodeSets (kB)':>21}")
+    for n in sizes:
+        one_list = allocated(lambda: list(range(n)))
+        one_node_set = allocated(lambda: NodeSet(range(n)))
+        state_lists = allocated(lambda: create(n, list))
+        state_node_sets = allocated(lambda: create(n, NodeSet))
+        print(f"{n:>5} {one_list:>9} {one_node_set:>12} " +
+              f"{state_lists / 1024:>18.0f} {state_node_sets / 1024:>21.0f}")
+
+    print()
+    print("Set operations (us)")
+    print(f"{'n':>5} {'operation':>13} {'list/set':>9} {'NodeSet':>8}")
+    for n in sizes:
+        for name, baseline, node_set in operations(n):
+            print(f"{n:>5} {name:>13} {baseline:>9.2f} {node_set:>8.2f}")
+
+    print()
+    print("RecSA iteration, NodeSet state")
+    print(f"{'n':>5} {'time (ms)':>10}")
+    for n in sizes:
+        seconds = seconds_per_iteration(create(n, NodeSet))
+        print(f"{n:>5} {seconds * 1000:>10.3f}")
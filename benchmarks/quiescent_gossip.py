@@ -0,0 +1,192 @@
+"""Benchmark of idle CPU and bandwidth of RecSA and RecMA in a stable cluster.
+
+Runs the RecSA and RecMA modules of n processors in one process on a
+virtual clock, connected by a simulated LAN, starting from a stable
+configuration of all of them, with a failure detector that trusts everyone.
+Iterations are scheduled as RecSAModule.run() and RecMAModule.run() do.
+After WARMUP seconds, the benchmark reports the CPU time the modules spend
+per processor and second, the bytes they send per processor and second,
+encoded as the communication links encode them, and the RecMA messages
+sent per processor and second. This is done with the resend interval
+lengthened while quiescent and RecMA flags sent when changed, and with
+both at the fast rate, see RecSAModule and RecMAModule.
+
+    python -m benchmarks.quiescent_gossip [--duration S] [--digests] [n ...]
+"""
+
+# standard
+import argparse
+import heapq
+import itertools
+import random
+import time
+
+# local
+from modules import constants
+from modules.constants import RUN_SLEEP, RECMA_MIN_INTERVAL
+from modules.nodeset import NodeSet
+from modules.recma.module import RecMAModule
+from resolve.enums import Module, MessageType
+from simulation.simulator import MODULE_OF_MESSAGE, SimRecSAModule, SimResolver
+from benchmarks.recsa_digests import encoded_size
+
+LINK_LATENCY = 0.001
+WARMUP = 30
+
+
+class FixedRecSA(SimRecSAModule):
+    """RecSA module resending at the fast rate only."""
+
+    adaptive_backoff = False
+
+
+class FixedRecMA(RecMAModule):
+    """RecMA module sending its flags at the fast rate only."""
+
+    adaptive_backoff = False
+    change_only = False
+
+
+class Cluster:
+    """Delivers messages and schedules iterations on a virtual clock.
+
+    Provides what SimResolver expects of a simulator, with a trusted set
+    that never changes.
+    """
+
+    def __init__(self, n, adaptive, digests, seed=0):
+        self.time = 0
+        self.round = 0
+        self.monitor_rounds = 0
+        self.trusted = (1, frozenset(range(n)))
+        self.rand = random.Random(seed)
+        self.events = []
+        self.order = itertools.count()
+        self.measuring = False
+        self.bytes = 0
+        self.recma_msgs = 0
+        self.cpu = 0
+        recsa_cls = SimRecSAModule if adaptive else FixedRecSA
+        recma_cls = RecMAModule if adaptive else FixedRecMA
+        self.resolvers = [SimResolver(self, i) for i in range(n)]
+        self.next_start = {}
+        self.last_start = {}
+        for resolver in self.resolvers:
+            recsa = recsa_cls(resolver.id, resolver, n, digests=digests)
+            recma = recma_cls(resolver.id, resolver, n)
+            resolver.modules = {Module.RECSA_MODULE: recsa,
+                                Module.RECMA_MODULE: recma}
+            set_stable_state(recsa, recma, n)
+            for mod in [recsa, recma]:
+                self.last_start[mod] = 0
+                self.schedule(mod, self.rand.uniform(0, RUN_SLEEP))
+
+    def send(self, sender, receiver, msg):
+        """Schedules delivery of msg to receiver."""
+        if self.measuring:
+            self.bytes += encoded_size(msg)
+            if msg["type"] == MessageType.RECMA_MESSAGE:
+                self.recma_msgs += 1
+        heapq.heappush(self.events, (self.time + LINK_LATENCY,
+                                     next(self.order), receiver, msg))
+
+    def schedule(self, mod, at):
+        """Schedules the next iteration of mod at time at."""
+        self.next_start[mod] = at
+        heapq.heappush(self.events, (at, next(self.order), mod, None))
+
+    def due(self, mod):
+        """Returns when mod runs its next iteration, see wait_for_input()."""
+        last = self.last_start[mod]
+        if isinstance(mod, RecMAModule):
+            if mod.wakeup.is_set():
+                return max(last + RECMA_MIN_INTERVAL, self.time)
+            return last + RUN_SLEEP * mod.backoff
+        if mod.wakeup.is_set():
+            return max(last + mod.min_interval, self.time)
+        return last + mod.max_interval * mod.backoff
+
+    def reschedule(self, mod):
+        """Moves the next iteration of mod forward if now due."""
+        at = self.due(mod)
+        if at < self.next_start[mod]:
+            self.schedule(mod, at)
+
+    def run_until(self, end):
+        """Processes events up to time end."""
+        while self.events and self.events[0][0] <= end:
+            at, _, target, msg = heapq.heappop(self.events)
+            self.time = at
+            started = time.process_time()
+            if msg is not None:
+                mod = self.resolvers[target].modules[
+                    MODULE_OF_MESSAGE[msg["type"]]]
+                mod.receive_msg(msg)
+                self.reschedule(mod)
+            elif at == self.next_start[target]:
+                mod = target
+                self.last_start[mod] = at
+                mod.run_iteration()
+                self.schedule(mod, self.due(mod))
+            if self.measuring:
+                self.cpu += time.process_time() - started
+        self.time = end
+
+
+def set_stable_state(recsa, recma, n):
+    """Sets the state of the modules to agree on all n processors."""
+    everyone = NodeSet(range(n))
+    for k in range(n):
+        recsa.config[k] = everyone
+        recsa.prp[k] = constants.DFLT_NTF
+        recsa.alll[k] = True
+        recsa.fd[k] = everyone
+        recsa.fd_part[k] = everyone
+        recsa.echo_part[k] = everyone
+        recsa.echo_prp[k] = constants.DFLT_NTF
+        recsa.echo_all[k] = True
+    recsa.all_seen = everyone
+    recma.prev_config = everyone
+
+
+def idle_load(n, adaptive, digests, duration):
+    """Returns tuple (CPU share, bytes, RecMA messages per second).
+
+    All values are per processor.
+    """
+    cluster = Cluster(n, adaptive, digests)
+    cluster.run_until(WARMUP)
+    cluster.measuring = True
+    cluster.run_until(WARMUP + duration)
+    for resolver in cluster.resolvers:
+        recsa = resolver.modules[Module.RECSA_MODULE]
+        if recsa.get_config_j(recsa.id) != NodeSet(range(n)):
+            raise RuntimeError("The stable configuration was not kept")
+    return (cluster.cpu / n / duration, cluster.bytes / n / duration,
+            cluster.recma_msgs / n / duration)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sizes", metavar="n", type=int, nargs="*",
+                        default=[50])
+    parser.add_argument("--duration", type=float, default=60,
+                        help="virtual seconds measured after the warmup")
+    parser.add_argument("--digests", action="store_true",
+                        help="send digests of unchanged RecSA state")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    print(f"Idle RecSA and RecMA load over {args.duration:.0f}s " +
+          f"after {WARMUP}s" + (", digests" if args.digests else ""))
+    print(f"{'n':>5} {'resends':>9} {'cpu (%)':>8} {'bytes/node/s':>13} " +
+          f"{'recma msgs/node/s':>18}")
+    for n in args.sizes:
+        for name, adaptive in [("fixed", False), ("backoff", True)]:
+            cpu, rate, recma = idle_load(n, adaptive, args.digests,
+                                         args.duration)
+            print(f"{n:>5} {name:>9} {cpu * 100:>8.2f} {rate:>13.0f} " +
+                  f"{recma:>18.2f}")
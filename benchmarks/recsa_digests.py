@@ -0,0 +1,94 @@
+"""Benchmark of the bytes RecSA sends in a steady state, with digests.
+
+Runs n processors in the round-based simulator, see simulation.simulator,
+starting from a stable configuration of all of them. Every RecSA message is
+encoded as the communication links encode it, and the benchmark reports the
+RecSA bytes and messages per processor and round after WARMUP rounds, with
+the full state sent in every round and with digests of unchanged state, see
+RecSAModule. It also reports the rounds until convergence after a third of
+the processors crashed.
+
+    python -m benchmarks.recsa_digests [--rounds R] [n ...]
+"""
+
+# standard
+import argparse
+
+# third party
+import jsonpickle
+
+# local
+from modules.nodeset import to_wire
+from resolve.enums import MessageType
+from simulation.simulator import Simulator, START_STABLE
+
+WARMUP = 5
+
+
+def encoded_size(msg):
+    """Returns the bytes msg takes when encoded by the communication links."""
+    wire = dict(msg)
+    if "data" in msg:
+        wire["data"] = {key: to_wire(value)
+                        for key, value in msg["data"].items()}
+    return len(jsonpickle.encode(wire).encode())
+
+
+class MeasuringSimulator(Simulator):
+    """Simulator counting the encoded bytes of RecSA messages."""
+
+    def __init__(self, *args, **kwargs):
+        self.recsa_bytes = 0
+        self.recsa_msgs = 0
+        super().__init__(*args, **kwargs)
+
+    def send(self, sender, receiver, msg):
+        if msg["type"] == MessageType.RECSA_MESSAGE:
+            self.recsa_bytes += encoded_size(msg)
+            self.recsa_msgs += 1
+        super().send(sender, receiver, msg)
+
+
+def steady_state(n, digests, rounds):
+    """Returns tuple (bytes, messages) per processor and round."""
+    sim = MeasuringSimulator(n, start=START_STABLE, digests=digests)
+    for _ in range(WARMUP):
+        sim.step()
+    sim.recsa_bytes = sim.recsa_msgs = 0
+    for _ in range(rounds):
+        sim.step()
+    if not sim.converged():
+        raise RuntimeError("The stable configuration was not kept")
+    return (sim.recsa_bytes / n / rounds, sim.recsa_msgs / n / rounds)
+
+
+def crash_recovery(n, digests):
+    """Returns the rounds until convergence after a third crashed."""
+    crashed = range(1, 1 + n // 3)
+    sim = Simulator(n, start=START_STABLE, digests=digests,
+                    crashes={k: 1 for k in crashed})
+    return sim.run(max_rounds=60)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sizes", metavar="n", type=int, nargs="*",
+                        default=[10, 50, 100])
+    parser.add_argument("--rounds", type=int, default=30,
+                        help="steady-state rounds measured")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    print(f"RecSA steady-state traffic over {args.rounds} rounds")
+    print(f"{'n':>5} {'mode':>8} {'bytes/node/round':>17} " +
+          f"{'msgs/node/round':>16} {'crash rounds':>13}")
+    for n in args.sizes:
+        for mode, digests in [("full", False), ("digests", True)]:
+            size, msgs = steady_state(n, digests, args.rounds)
+            rounds = crash_recovery(n, digests)
+            shown = "never" if rounds is None else str(rounds)
+            print(f"{n:>5} {mode:>8} {size:>17.0f} {msgs:>16.1f} " +
+                  f"{shown:>13}")
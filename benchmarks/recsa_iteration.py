@@ -0,0 +1,89 @@
+"""Benchmark of one iteration of the RecSA do-forever loop.
+
+Runs RecSA iterations in a stable state where all n processors are trusted
+participants that agree on the configuration, which is the common case and
+the one in which every predicate visits all participants. Reports the time
+per iteration with the per-iteration context, and with the context
+disabled, i.e. every predicate computed from scratch.
+
+    python -m benchmarks.recsa_iteration [n ...]
+"""
+
+# standard
+import sys
+import time
+
+# local
+from modules import constants
+from modules.nodeset import NodeSet
+from modules.recsa.module import RecSAModule
+
+MIN_DURATION = 0.5
+
+
+class WithoutContext(RecSAModule):
+    """Computes every predicate from scratch, as before iteration contexts."""
+
+    def context(self):
+        return None
+
+
+class StubResolver:
+    """Resolver for a processor that trusts all n processors."""
+
+    def __init__(self, n):
+        self.trusted = frozenset(range(n))
+
+    def fd_get_trusted(self):
+        return self.trusted
+
+    def fd_stable_monitor(self, k):
+        return True
+
+    def fd_reset_monitor(self, k):
+        pass
+
+    def send_to_node(self, node_id, msg, fd_msg=False):
+        pass
+
+
+def create(cls, n):
+    """Returns a RecSA module in a stable state with n participants."""
+    mod = cls(0, StubResolver(n), n)
+    everyone = NodeSet(range(n))
+    for k in range(n):
+        mod.config[k] = everyone
+        mod.prp[k] = constants.DFLT_NTF
+        mod.alll[k] = True
+        mod.fd[k] = everyone
+        mod.fd_part[k] = everyone
+        mod.echo_part[k] = everyone
+        mod.echo_prp[k] = constants.DFLT_NTF
+        mod.echo_all[k] = True
+    mod.all_seen = everyone
+    return mod
+
+
+def seconds_per_iteration(mod):
+    """Returns the mean time of one iteration."""
+    iterations = 0
+    start = time.perf_counter()
+    while True:
+        mod.iterate()
+        iterations += 1
+        elapsed = time.perf_counter() - start
+        if elapsed > MIN_DURATION:
+            return elapsed / iterations
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10, 25, 50, 100, 200]
+
+    print("RecSA iteration time, all processors trusted participants")
+    print(f"{'n':>5} {'context (ms)':>13} {'no context (ms)':>16} " +
+          f"{'speedup':>8}")
+    for n in sizes:
+        with_ctx = seconds_per_iteration(create(RecSAModule, n))
+        without_ctx = seconds_per_iteration(create(WithoutContext, n))
+        print(f"{n:>5} {with_ctx * 1000:>13.3f} " +
+              f"{without_ctx * 1000:>16.3f} {without_ctx / with_ctx:>8.1f}")
@@ -0,0 +1,178 @@
+"""Benchmark of the end-to-end latency of a RecSA reconfiguration.
+
+Runs n RecSA modules in one process on a virtual clock, connected by a
+simulated LAN, starting from a stable state in which all n processors are
+participants of the same configuration. Processor 0 then proposes the
+configuration without processor n - 1 through estab(). The benchmark
+reports the time until every processor installed the new configuration and
+returned to phase 0, and the RecSA iterations per processor and second.
+
+Iterations are either scheduled every RUN_SLEEP seconds, as the RecSA loop
+used to, or triggered by input as RecSAModule.run() does: as soon as
+notify() was called, but at least min_interval and at most max_interval,
+lengthened by the backoff while quiescent, after the previous iteration.
+
+    python -m benchmarks.recsa_reconfiguration [n ...]
+"""
+
+# standard
+import heapq
+import itertools
+import random
+import sys
+
+# local
+from modules import constants
+from modules.constants import (RUN_SLEEP, RECSA_MIN_INTERVAL,
+                               RECSA_MAX_INTERVAL)
+from modules.nodeset import NodeSet
+from modules.recsa.module import RecSAModule
+
+LINK_LATENCY = 0.001
+LINK_JITTER = 0.0005
+WARMUP = 3
+TIMEOUT = 60
+
+
+class NodeResolver:
+    """Resolver of a processor that trusts all n processors."""
+
+    def __init__(self, network, id, n):
+        self.network = network
+        self.id = id
+        self.trusted = frozenset(range(n))
+
+    def fd_get_trusted(self):
+        return self.trusted
+
+    def fd_get_trusted_snapshot(self):
+        return (1, self.trusted)
+
+    def fd_stable_monitor(self, k):
+        return True
+
+    def fd_reset_monitor(self, k):
+        pass
+
+    def send_to_node(self, node_id, msg, fd_msg=False):
+        if node_id != self.id:
+            self.network.send(node_id, msg)
+
+
+class Network:
+    """Delivers messages and schedules iterations on a virtual clock."""
+
+    def __init__(self, n, event_triggered, seed=0):
+        self.time = 0
+        self.rand = random.Random(seed)
+        self.event_triggered = event_triggered
+        self.events = []
+        self.order = itertools.count()
+        self.modules = [create(self, i, n) for i in range(n)]
+        self.last_start = [0 for i in range(n)]
+        self.next_start = [None for i in range(n)]
+        self.iterations = 0
+        for i in range(n):
+            self.schedule(i, self.rand.uniform(0, RUN_SLEEP))
+
+    def send(self, receiver, msg):
+        """Schedules delivery of msg to receiver."""
+        delay = max(self.rand.gauss(LINK_LATENCY, LINK_JITTER), 0)
+        heapq.heappush(self.events, (self.time + delay, next(self.order),
+                                     receiver, msg))
+
+    def schedule(self, i, at):
+        """Schedules the next iteration of processor i at time at."""
+        self.next_start[i] = at
+        heapq.heappush(self.events, (at, next(self.order), i, None))
+
+    def due(self, i):
+        """Returns when processor i runs its next iteration."""
+        last = self.last_start[i]
+        if not self.event_triggered:
+            return last + RUN_SLEEP
+        mod = self.modules[i]
+        if mod.wakeup.is_set():
+            return max(last + mod.min_interval, self.time)
+        return last + mod.max_interval * mod.backoff
+
+    def reschedule(self, i):
+        """Moves the next iteration of processor i forward if now due."""
+        at = self.due(i)
+        if at < self.next_start[i]:
+            self.schedule(i, at)
+
+    def run_until(self, end, done=lambda: False):
+        """Processes events up to time end or until done() holds."""
+        while self.events and self.events[0][0] <= end:
+            at, _, i, msg = heapq.heappop(self.events)
+            self.time = at
+            mod = self.modules[i]
+            if msg is not None:
+                mod.receive_msg(msg)
+                self.reschedule(i)
+            elif at == self.next_start[i]:
+                self.last_start[i] = at
+                mod.run_iteration()
+                self.iterations += 1
+                self.schedule(i, self.due(i))
+                if done():
+                    return True
+        self.time = end
+        return False
+
+
+def create(network, id, n):
+    """Returns a module of processor id in a stable state."""
+    mod = RecSAModule(id, NodeResolver(network, id, n), n,
+                      min_interval=RECSA_MIN_INTERVAL,
+                      max_interval=RECSA_MAX_INTERVAL)
+    everyone = NodeSet(range(n))
+    for k in range(n):
+        mod.config[k] = everyone
+        mod.prp[k] = constants.DFLT_NTF
+        mod.alll[k] = True
+        mod.fd[k] = everyone
+        mod.fd_part[k] = everyone
+        mod.echo_part[k] = everyone
+        mod.echo_prp[k] = constants.DFLT_NTF
+        mod.echo_all[k] = True
+    mod.all_seen = everyone
+    return mod
+
+
+def simulate(n, event_triggered):
+    """Returns tuple (reconfiguration latency, iterations per node per s)."""
+    network = Network(n, event_triggered)
+    network.run_until(WARMUP)
+    proposal = NodeSet(range(n - 1))
+    network.modules[0].estab(proposal)
+    network.reschedule(0)
+    if network.modules[0].get_prp_j(0)[0] != 1:
+        raise RuntimeError("estab() was not allowed in the stable state")
+
+    def done():
+        return all(mod.get_config_j(mod.id) == proposal and
+                   mod.get_prp_j(mod.id) == constants.DFLT_NTF
+                   for mod in network.modules)
+
+    start, iterations = network.time, network.iterations
+    finished = network.run_until(start + TIMEOUT, done)
+    elapsed = network.time - start
+    rate = (network.iterations - iterations) / n / elapsed
+    return (elapsed if finished else None), rate
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [4, 8, 16, 32]
+
+    print("RecSA reconfiguration latency on a simulated LAN " +
+          f"({LINK_LATENCY * 1000:.0f}ms links)")
+    print(f"{'n':>5} {'scheduling':>16} {'latency (s)':>12} " +
+          f"{'iterations/node/s':>18}")
+    for n in sizes:
+        for name, event_triggered in [(f"every {RUN_SLEEP}s", False),
+                                      ("event-triggered", True)]:
+            latency, rate = simulate(n, event_triggered)
+            shown = "timeout" if latency is None else f"{latency:.2f}"
+            print(f"{n:>5} {name:>16} {shown:>12} {rate:>18.1f}")
@@ -0,0 +1,86 @@
+"""Benchmark of the CPU time of RecSA iterations in a steady state.
+
+All n processors are trusted participants that agree on the configuration
+and keep resending the same state. Before every iteration the module
+receives the state of the n - 1 other processors, as it does in a running
+system. Reports the CPU time per iteration when the results of the stale
+information predicates are reused while their inputs are unchanged, and
+when every predicate is evaluated in every iteration, as well as the
+evaluations skipped per iteration.
+
+    python -m benchmarks.recsa_steady_state [n ...]
+"""
+
+# standard
+import sys
+import time
+
+# local
+from modules import constants
+from modules.nodeset import NodeSet, to_wire
+from modules.recsa.module import RecSAModule
+from benchmarks.recsa_iteration import StubResolver
+
+MIN_DURATION = 0.5
+
+
+class WithoutCache(RecSAModule):
+    """Evaluates every predicate in every iteration."""
+
+    def evaluate(self, name):
+        return getattr(self, name)()
+
+
+def create(cls, n):
+    """Returns a RecSA module in a stable state with n participants."""
+    mod = cls(0, StubResolver(n), n)
+    everyone = NodeSet(range(n))
+    for k in range(n):
+        mod.config[k] = everyone
+        mod.prp[k] = constants.DFLT_NTF
+        mod.alll[k] = True
+        mod.fd[k] = everyone
+        mod.fd_part[k] = everyone
+        mod.echo_part[k] = everyone
+        mod.echo_prp[k] = constants.DFLT_NTF
+        mod.echo_all[k] = True
+    mod.all_seen = everyone
+    return mod
+
+
+def messages(n):
+    """Returns the messages the other processors send in the steady state."""
+    everyone = to_wire(NodeSet(range(n)))
+    data = {"fd": everyone, "fd_part": everyone, "config": everyone,
+            "prp": constants.DFLT_NTF, "alll": True,
+            "echo_fd_part": everyone, "echo_prp": constants.DFLT_NTF,
+            "echo_all": True}
+    return [{"sender": j, "data": data} for j in range(1, n)]
+
+
+def cpu_per_iteration(mod):
+    """Returns tuple (CPU seconds, skipped evaluations) per iteration."""
+    msgs = messages(mod.number_of_nodes)
+    iterations = 0
+    start = time.process_time()
+    while True:
+        for msg in msgs:
+            mod.receive_msg(msg)
+        mod.iterate()
+        iterations += 1
+        elapsed = time.process_time() - start
+        if elapsed > MIN_DURATION:
+            return elapsed / iterations, mod.predicates_skipped / iterations
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10, 25, 50, 100, 200]
+
+    print("RecSA steady-state CPU per iteration, including received state")
+    print(f"{'n':>5} {'cached (ms)':>12} {'uncached (ms)':>14} " +
+          f"{'speedup':>8} {'skipped/iteration':>18}")
+    for n in sizes:
+        cached, skipped = cpu_per_iteration(create(RecSAModule, n))
+        uncached, _ = cpu_per_iteration(create(WithoutCache, n))
+        print(f"{n:>5} {cached * 1000:>12.3f} {uncached * 1000:>14.3f} " +
+              f"{uncached / cached:>8.2f} {skipped:>18.2f}")
@@ -0,0 +1,135 @@
+"""Benchmark of the snapshot transfer of the application state to a joiner.
+
+Runs the Joining Mechanism modules of a joiner and of the given number of
+configuration members in one process, on a virtual clock. Each member sends
+over an uplink of the given bandwidth, messages queue behind each other, and
+every message takes the given latency on top. The joiner fetches a snapshot
+of the given size in chunks from all members at once, see
+modules.joining_mechanism.snapshot. Reports the virtual time of the
+transfer, its throughput and the CPU time per MB of snapshot. With --fail,
+the first member stops answering halfway through the transfer, and the
+chunks it owed are requested again from the others after the timeout.
+
+    python -m benchmarks.snapshot_transfer [--size MB] [--bandwidth MB/S]
+                                           [--latency S] [--fail]
+                                           [sources ...]
+"""
+
+# standard
+import argparse
+import heapq
+import itertools
+import json
+import time
+
+# local
+from modules.constants import RUN_SLEEP
+from modules.nodeset import NodeSet
+from modules.joining_mechanism.module import JoiningMechanismModule
+
+
+class Network:
+    """Virtual clock and the links between the processors."""
+
+    def __init__(self, bandwidth, latency):
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self.now = 0.0
+        self.events = []
+        self.order = itertools.count()
+        self.link_free = {}  # sender -> time its uplink is idle again
+        self.failed = set()
+        self.modules = {}
+
+    def send(self, sender, receiver, msg):
+        if sender in self.failed:
+            return
+        size = len(json.dumps(msg["data"]))
+        start = max(self.now, self.link_free.get(sender, 0.0))
+        self.link_free[sender] = start + size / self.bandwidth
+        arrival = self.link_free[sender] + self.latency
+        heapq.heappush(self.events, (arrival, next(self.order), receiver, msg))
+
+    def run_until(self, until):
+        """Delivers the messages that arrive before time until."""
+        while self.events and self.events[0][0] <= until:
+            self.now, _, receiver, msg = heapq.heappop(self.events)
+            if receiver not in self.failed:
+                self.modules[receiver].receive_msg(msg)
+        self.now = until
+
+
+class BenchResolver:
+    """Resolver of a processor in the benchmark."""
+
+    def __init__(self, network, id, app_state=None):
+        self.network = network
+        self.id = id
+        self.app_state = app_state
+
+    def send_to_node(self, node_id, msg, fd_msg=False):
+        self.network.send(self.id, node_id, msg)
+
+    def abd_get_state(self):
+        return self.app_state
+
+    def abd_set_state(self, state):
+        self.app_state = state
+
+
+def transfer(sources, size, bandwidth, latency, fail=False):
+    """Returns tuple (virtual seconds, CPU seconds) of the transfer of a
+    snapshot of size bytes from the given number of sources."""
+    network = Network(bandwidth, latency)
+    clock = lambda: network.now
+    state = {"label": 1, "data": "x" * size}
+    joiner_id = sources
+    for j in range(sources + 1):
+        resolver = BenchResolver(network, j, state if j < sources else None)
+        network.modules[j] = JoiningMechanismModule(j, resolver, sources + 1,
+                                                    clock=clock)
+    joiner = network.modules[joiner_id]
+    members = NodeSet(range(sources))
+    for j in members:
+        joiner.passs[j] = True
+        joiner.state[j] = network.modules[j].offer_snapshot()
+
+    started = time.process_time()
+    tick = RUN_SLEEP / 10
+    while not joiner.snapshot_ready(members):
+        network.run_until(network.now + tick)
+        if fail and 0 not in network.failed and \
+                joiner.transfer.received() >= size / 2:
+            network.failed.add(0)
+    joiner.init_vars(joiner.state)
+    cpu = time.process_time() - started
+    assert joiner.resolver.app_state == state
+    return network.now, cpu
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sources", type=int, nargs="*", default=[1, 2, 4])
+    parser.add_argument("--size", type=float, default=16,
+                        help="snapshot size in MB")
+    parser.add_argument("--bandwidth", type=float, default=10,
+                        help="uplink bandwidth of a member in MB/s")
+    parser.add_argument("--latency", type=float, default=0.01,
+                        help="one-way latency in seconds")
+    parser.add_argument("--fail", action="store_true",
+                        help="fail the first member halfway")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    size = int(args.size * 2**20)
+
+    print(f"Snapshot of {args.size:g} MB, uplinks {args.bandwidth:g} MB/s, " +
+          f"latency {args.latency:g} s" + (", failing" if args.fail else ""))
+    print(f"{'sources':>8} {'time (s)':>9} {'MB/s':>7} {'cpu/MB (s)':>11}")
+    for sources in args.sources:
+        seconds, cpu = transfer(sources, size, args.bandwidth * 2**20,
+                                args.latency, args.fail)
+        print(f"{sources:>8} {seconds:>9.2f} {args.size / seconds:>7.2f} " +
+              f"{cpu / args.size:>11.4f}")
@@ -0,0 +1,127 @@
+"""Admission control applied by receivers before a message is decoded.
+
+Checks are based on the message header and size only, so that a flooding or
+misbehaving sender cannot make a node spend time decoding its messages.
+"""
+
+# standard
+import logging
+import os
+import time
+
+# local
+from metrics.messages import msgs_dropped
+from modules.constants import (ADMISSION_RATE, ADMISSION_BURST,
+                               ADMISSION_MAX_SIZE)
+
+# globals
+logger = logging.getLogger(__name__)
+
+# reasons for dropping a message
+UNKNOWN_SENDER = "UNKNOWN_SENDER"
+TOO_LARGE = "TOO_LARGE"
+RATE_LIMITED = "RATE_LIMITED"
+MALFORMED = "MALFORMED"
+SENDER_MISMATCH = "SENDER_MISMATCH"
+
+
+class TokenBucket:
+    """Token bucket allowing rate events per second with bursts of burst."""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        """Initializes a full bucket."""
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.last = clock()
+
+    def consume(self, n=1):
+        """Takes n tokens from the bucket, returns False if not enough."""
+        now = self.clock()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens < n:
+            return False
+        self.tokens -= n
+        return True
+
+    def refund(self, n=1):
+        """Gives n consumed tokens back to the bucket."""
+        self.tokens = min(self.burst, self.tokens + n)
+
+
+class AdmissionControl:
+    """Per-sender admission control for a receiver channel.
+
+    A message is admitted if its sender is known, it is not larger than
+    max_size bytes and the token bucket of the sender is not empty.
+    known_senders is a callable returning the ids of all known nodes, or None
+    if any sender should be accepted.
+    """
+
+    def __init__(self, node_id, known_senders=None, rate=None, burst=None,
+                 max_size=None, channel="", clock=time.monotonic):
+        """Initializes admission control, defaults can be set by env vars."""
+        self.node_id = node_id
+        self.known_senders = known_senders
+        self.rate = (rate if rate is not None else
+                     float(os.getenv("ADMISSION_RATE", ADMISSION_RATE)))
+        self.burst = (burst if burst is not None else
+                      float(os.getenv("ADMISSION_BURST", ADMISSION_BURST)))
+        self.max_size = (max_size if max_size is not None else
+                         int(os.getenv("ADMISSION_MAX_SIZE",
+                                       ADMISSION_MAX_SIZE)))
+        self.channel = channel
+        self.clock = clock
+        self.buckets = {}
+        self.dropped = {}
+
+    def admit(self, sender_id, size):
+        """Returns True if a message of size bytes from sender_id is admitted.
+
+        Dropped messages are counted per sender and reason.
+        """
+        if sender_id is None:
+            return self.drop(sender_id, MALFORMED)
+        if (self.known_senders is not None and
+                sender_id not in self.known_senders()):
+            return self.drop(sender_id, UNKNOWN_SENDER)
+        if size > self.max_size:
+            return self.drop(sender_id, TOO_LARGE)
+
+        bucket = self.buckets.get(sender_id)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst, clock=self.clock)
+            self.buckets[sender_id] = bucket
+        if not bucket.consume():
+            return self.drop(sender_id, RATE_LIMITED)
+        return True
+
+    def reject_sender(self, sender_id):
+        """Drops an admitted message whose sender differs from its header.
+
+        The token the message took from the bucket of sender_id is given
+        back, so that messages with a spoofed header do not use up the rate
+        of the node they claim to be from. Returns False.
+        """
+        bucket = self.buckets.get(sender_id)
+        if bucket is not None:
+            bucket.refund()
+        return self.drop(sender_id, SENDER_MISMATCH)
+
+    def drop(self, sender_id, reason):
+        """Records a dropped message and returns False."""
+        key = (sender_id, reason)
+        self.dropped[key] = self.dropped.get(key, 0) + 1
+        if self.dropped[key] == 1:
+            logger.warning(f"Dropping {self.channel} messages from " +
+                           f"{sender_id}: {reason}")
+        msgs_dropped.labels(self.node_id, self.channel, sender_id,
+                            reason).inc()
+        return False
+
+    def dropped_from(self, sender_id):
+        """Returns the number of dropped messages from sender_id."""
+        return sum(c for (s, _), c in self.dropped.items() if s == sender_id)
@@ -1,30 +1,63 @@
 """Models a message to be sent over the self-stabilizing communication link"""
 
 # standard
+import struct
 import jsonpickle
 
+# header prepended to the encoded message, containing the sender_id
+HEADER = struct.Struct("!i")
+
+# separator between two encoded payloads in the list of payloads
+PAYLOAD_SEPARATOR_SIZE = len(", ")
+
 
 class Message:
     """Models a message sent over the self-stabilizing communication link
 
-    A message consists of a sender_id, msg_counter and eventual payload.
+    A message consists of a sender_id, msg_counter and eventual payloads.
     The msg_counter is used by the sender/receiver to carry out the algorithm
-    for token passing with sequence numbers proposed by Dolev.
+    for token passing with sequence numbers proposed by Dolev. Several
+    payloads can be attached to one token, they are delivered in order.
+
+    On the wire, the encoded message is prefixed by a fixed-size header
+    containing the sender_id, so that receivers can identify the sender
+    without decoding the message. Payloads are encoded without references
+    to each other, such that the size of an encoded message is the sum of
+    the sizes of its parts, see payload_size.
     """
 
-    def __init__(self, sender_id, msg_counter, payload={}):
+    def __init__(self, sender_id, msg_counter, payloads=None):
         """Initializes a message"""
         self.sender_id = sender_id
         self.msg_counter = msg_counter
-        self.payload = payload
+        self.payloads = payloads if payloads is not None else []
 
     def from_bytes(bytes):
         """Decodes bytes object to a Message instance"""
-        return jsonpickle.decode(bytes.decode())
+        return jsonpickle.decode(bytes[HEADER.size:].decode())
+
+    def peek_sender_id(bytes):
+        """Returns the sender_id in the header of an encoded message
+
+        Returns None if bytes is too short to contain a header.
+        """
+        if len(bytes) < HEADER.size:
+            return None
+        return HEADER.unpack_from(bytes)[0]
 
     def to_bytes(self):
         """Encodes a Message instance to bytes"""
-        return jsonpickle.encode(self).encode()
+        return (HEADER.pack(self.sender_id) +
+                jsonpickle.encode(self, make_refs=False).encode())
+
+    def payload_size(payload):
+        """Returns the number of bytes payload takes in an encoded message
+
+        A message with payloads p_1, ..., p_k takes the size of the message
+        without payloads plus the sizes of p_1, ..., p_k plus k-1 times
+        PAYLOAD_SEPARATOR_SIZE.
+        """
+        return len(jsonpickle.encode(payload, make_refs=False).encode())
 
     def get_sender_id(self):
         """Returns the sender_id of the message"""
@@ -34,10 +67,10 @@ class Message:
         """Returns the msg_counter (token) of the message"""
         return self.msg_counter
 
-    def get_payload(self):
-        """Returns the payload of the message"""
-        return self.payload
+    def get_payloads(self):
+        """Returns the list of payloads attached to the message"""
+        return self.payloads
 
     def has_payload(self):
-        """Returns True if payload is attached to the message"""
-        return self.payload != {}
+        """Returns True if at least one payload is attached to the message"""
+        return len(self.payloads) > 0
@@ -11,6 +11,7 @@ import time
 
 # local
 from communication.udp.message import Message
+from communication.admission import MALFORMED, TOO_LARGE, SENDER_MISMATCH
 import modules.byzantine as byz
 
 logger = logging.getLogger(__name__)
@@ -19,11 +20,19 @@ logger = logging.getLogger(__name__)
 class Receiver:
     """Models a receiver in the self-stabilizing communication protocol."""
 
-    def __init__(self, addr, buf_size=1024, on_message_recv=None):
-        """Initializes the receiver."""
+    def __init__(self, addr, buf_size=1024, on_message_recv=None,
+                 admission=None):
+        """Initializes the receiver.
+
+        If admission (an AdmissionControl) is supplied, datagrams that are
+        not admitted based on their header and size are dropped before they
+        are decoded. Datagrams whose sender differs from the header are
+        dropped too, without using up the rate of the sender in the header.
+        """
         self.addr = addr
         self.buf_size = buf_size
         self.on_message_recv = on_message_recv
+        self.admission = admission
 
         # setup socket
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -49,40 +58,73 @@ class Receiver:
         while True:
             # block until data is available over socket
             msg, addr = self.recv()
-
-            sender_id = msg.get_sender_id()
-            msg_counter = msg.get_msg_counter()
-            # token arrives
-            if sender_id not in self.msg_counters:
-                self.msg_counters[sender_id] = -1
-
-            # accept message if new token, otherwise send back
-            if msg_counter != self.msg_counters[sender_id]:
-                self.msg_counters[sender_id] = msg_counter
-                # send back token to sender
-                self.send(msg, addr)
-
-                # call callback if supplied
-                if msg.has_payload() and self.on_message_recv is not None:
-                    self.on_message_recv(msg.get_payload())
-
-            else:
-                # if token already received, send back token to sender
-                self.send(msg, addr)
+            self.on_token(msg, addr)
+
+    def on_token(self, msg, addr):
+        """Handles a message received from the sender at addr."""
+        sender_id = msg.get_sender_id()
+        msg_counter = msg.get_msg_counter()
+        # token arrives
+        if sender_id not in self.msg_counters:
+            self.msg_counters[sender_id] = -1
+
+        # only the token is sent back, payloads are not echoed
+        token = Message(sender_id, msg_counter)
+
+        # accept message if new token, otherwise send back
+        if msg_counter != self.msg_counters[sender_id]:
+            self.msg_counters[sender_id] = msg_counter
+            # send back token to sender
+            self.send(token, addr)
+
+            # call callback for each payload in the order they were sent
+            if self.on_message_recv is not None:
+                for payload in msg.get_payloads():
+                    self.on_message_recv(payload)
+
+        else:
+            # if token already received, send back token to sender
+            self.send(token, addr)
 
     def recv(self):
         """Receive a message over the socket
 
         Blocking method that returns whenever a message has been received
-        over the bound socket.
+        over the bound socket and admitted. Datagrams larger than buf_size,
+        that cannot be decoded or whose sender differs from the header are
+        dropped.
         """
-        msg_bytes, address = self.socket.recvfrom(1024)
-        msg = Message.from_bytes(msg_bytes)
-
-        self.msgs_recv += 1
-        self.bytes_recv += len(msg_bytes)
-
-        return (msg, address)
+        while True:
+            msg_bytes, address = self.socket.recvfrom(self.buf_size + 1)
+            self.msgs_recv += 1
+            self.bytes_recv += len(msg_bytes)
+
+            sender_id = Message.peek_sender_id(msg_bytes)
+            if len(msg_bytes) > self.buf_size:
+                self.drop(sender_id, TOO_LARGE)
+                continue
+            if (self.admission is not None and
+                    not self.admission.admit(sender_id, len(msg_bytes))):
+                continue
+
+            try:
+                msg = Message.from_bytes(msg_bytes)
+            except Exception:
+                self.drop(sender_id, MALFORMED)
+                continue
+            if msg.get_sender_id() != sender_id:
+                logger.debug(f"Dropping datagram from {sender_id}: " +
+                             f"{SENDER_MISMATCH}")
+                if self.admission is not None:
+                    self.admission.reject_sender(sender_id)
+                continue
+            return (msg, address)
+
+    def drop(self, sender_id, reason):
+        """Drops a received datagram, counted if admission control is used."""
+        logger.debug(f"Dropping datagram from {sender_id}: {reason}")
+        if self.admission is not None:
+            self.admission.drop(sender_id, reason)
 
     def send(self, msg, addr):
         """Send a message over the socket
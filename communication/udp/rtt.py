@@ -0,0 +1,48 @@
+"""Round-trip time estimation for the self-stabilizing UDP channel."""
+
+# local
+from modules.constants import FD_TIMEOUT, FD_MIN_RTO, FD_MAX_RTO
+
+# weights and variance factor as proposed by Jacobson/Karels (RFC 6298)
+ALPHA = 1 / 8
+BETA = 1 / 4
+K = 4
+
+
+class RTTEstimator:
+    """Estimates the retransmission timeout of a link from token round trips.
+
+    Keeps a smoothed round-trip time (srtt) and its variation (rttvar) and
+    derives the retransmission timeout (rto) from them. The timeout is backed
+    off exponentially whenever it expires and is always kept within
+    [min_rto, max_rto].
+    """
+
+    def __init__(self, initial_rto=FD_TIMEOUT, min_rto=FD_MIN_RTO,
+                 max_rto=FD_MAX_RTO):
+        """Initializes the estimator."""
+        if min_rto <= 0 or min_rto > max_rto:
+            raise ValueError("Bounds must satisfy 0 < min_rto <= max_rto")
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.srtt = None
+        self.rttvar = None
+        self.rto = self.clamp(initial_rto)
+
+    def clamp(self, rto):
+        """Returns rto bounded by min_rto and max_rto."""
+        return max(self.min_rto, min(rto, self.max_rto))
+
+    def on_sample(self, rtt):
+        """Updates the estimate with a measured round-trip time in seconds."""
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - BETA) * self.rttvar + BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - ALPHA) * self.srtt + ALPHA * rtt
+        self.rto = self.clamp(self.srtt + K * self.rttvar)
+
+    def on_timeout(self):
+        """Backs off the retransmission timeout after it expired."""
+        self.rto = self.clamp(self.rto * 2)
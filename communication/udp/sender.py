@@ -9,13 +9,18 @@ from threading import Thread
 import socket
 import logging
 import time
+import os
 from queue import Queue
 
 # local
-from communication.udp.message import Message
-from modules.constants import FD_SLEEP, FD_TIMEOUT
+from communication.udp.message import Message, PAYLOAD_SEPARATOR_SIZE
+from communication.udp.rtt import RTTEstimator
+from modules.constants import (FD_SLEEP, FD_TIMEOUT, FD_ADDR_TTL,
+                               FD_RERESOLVE_AFTER, FD_MIN_RTO, FD_MAX_RTO)
 import modules.byzantine as byz
 from communication.constants import UDP, MAXINT
+from metrics.udp import (addr_resolution_latency, link_rtt, link_rto,
+                         payloads_per_token, payloads_dropped)
 
 logger = logging.getLogger(__name__)
 
@@ -24,8 +29,14 @@ class Sender:
     """Models a sender in the self-stabilizing communication protocol."""
 
     def __init__(self, id, addr, cap=MAXINT, bufsize=1024, check_ready=None,
-                 on_message_sent=None):
-        """Initalizes the sender."""
+                 on_message_sent=None, token_interval=None,
+                 on_token_lost=None):
+        """Initalizes the sender.
+
+        The optional callable token_interval returns the number of seconds
+        tokens are paced by, FD_SLEEP if not supplied. The optional callable
+        on_token_lost is called whenever a token has to be retransmitted.
+        """
         self.id = id
         if type(addr) != tuple or type(addr[0]) != str or type(addr[1]) != int:
             raise ValueError(f"Arg addr must be tuple (hostname, port)")
@@ -34,15 +45,63 @@ class Sender:
         self.bufsize = bufsize
         self.check_ready = check_ready
         self.on_message_sent = on_message_sent
+        self.token_interval = token_interval or (lambda: FD_SLEEP)
+        self.on_token_lost = on_token_lost
 
-        # setup socket
+        # setup socket, connected to the receiver once its address is resolved
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.resolved_addr = None
+        self.resolved_at = 0
+        self.failed_sends = 0
 
         self.msg_counter = 0
         self.msg_queue = Queue()
+        self.pending_payload = None
         self.last_sent_msg = None
         self.last_recv_msg_counter = -1
 
+        # retransmission timeout estimated from token round trips
+        self.rtt = RTTEstimator(
+            initial_rto=FD_TIMEOUT,
+            min_rto=float(os.getenv("FD_MIN_RTO", FD_MIN_RTO)),
+            max_rto=float(os.getenv("FD_MAX_RTO", FD_MAX_RTO)))
+        self.token_sent_at = None
+        self.token_retransmitted = False
+
+    def resolve(self):
+        """Resolves the address of the receiver and connects the socket to it
+
+        The hostname is only looked up here, so that sending a token costs a
+        single syscall. Returns True if the socket is connected to a resolved
+        address afterwards.
+        """
+        hostname, port = self.addr
+        start_time = time.time()
+        try:
+            infos = socket.getaddrinfo(hostname, port, socket.AF_INET,
+                                       socket.SOCK_DGRAM)
+            resolved_addr = infos[0][4]
+        except socket.gaierror as e:
+            logger.error(f"Could not resolve {hostname}: {e}")
+            return self.resolved_addr is not None
+        finally:
+            addr_resolution_latency.labels(self.id, hostname).observe(
+                time.time() - start_time)
+
+        if resolved_addr != self.resolved_addr:
+            self.socket.connect(resolved_addr)
+            logger.debug(f"Resolved {self.addr} to {resolved_addr}")
+        self.resolved_addr = resolved_addr
+        self.resolved_at = time.time()
+        self.failed_sends = 0
+        return True
+
+    def needs_resolve(self):
+        """Returns True if the receiver address should be (re-)resolved."""
+        return (self.resolved_addr is None or
+                self.failed_sends >= FD_RERESOLVE_AFTER or
+                time.time() - self.resolved_at > FD_ADDR_TTL)
+
     def add_msg_to_queue(self, msg):
         """Adds the message to the FIFO queue for this sender channel."""
         self.msg_queue.put(msg)
@@ -57,14 +116,65 @@ class Sender:
         msg = self.msg_queue.get()
         return msg
 
+    def get_next_payload(self):
+        """Gets the next payload to attach to a token
+
+        A payload that did not fit in the previous token is returned before
+        any message in the queue. Non-blocking method.
+        """
+        if self.pending_payload is not None:
+            payload = self.pending_payload
+            self.pending_payload = None
+            return payload
+        return self.get_msg_from_queue()
+
+    def has_payload_to_send(self):
+        """Returns True if there is at least one payload waiting to be sent."""
+        return self.pending_payload is not None or not self.msg_queue.empty()
+
+    def pack_token(self):
+        """Constructs the next token with as many payloads as fit in bufsize
+
+        Payloads are attached in FIFO order. The first payload that does not
+        fit is kept for the next token. A payload that does not fit even
+        alone is dropped, as the receiver would drop the token and the link
+        would retransmit it forever.
+        """
+        hostname, port = self.addr
+        payloads = []
+        msg = Message(self.id, self.msg_counter, payloads=payloads)
+        size = len(msg.to_bytes())
+        while True:
+            payload = self.get_next_payload()
+            if payload is None:
+                break
+            added_size = Message.payload_size(payload)
+            if payloads:
+                added_size += PAYLOAD_SEPARATOR_SIZE
+            if size + added_size > self.bufsize:
+                if payloads:
+                    self.pending_payload = payload
+                    break
+                logger.warning(f"Dropping payload to {self.addr} larger " +
+                               f"than {self.bufsize} bytes")
+                payloads_dropped.labels(self.id, hostname, port).inc()
+                continue
+            payloads.append(payload)
+            size += added_size
+
+        payloads_per_token.labels(self.id, hostname, port).observe(
+            len(payloads))
+        return msg
+
     def start(self):
         """Main loop for the sender
 
         This is the main loop of the sender in the self-stabilizing
         token-passing algorithm with bounded sequence number proposed by Dolev.
         It uses a token attached to each message which is sent back and forth
-        between the sender and receiver. Payload can be attached to
-        the messages to exchange application-level data.
+        between the sender and receiver. All queued payloads that fit in one
+        datagram are attached to the token to exchange application-level
+        data.
         """
         # busy-wait on check_ready function if supplied
         if self.check_ready is not None and callable(self.check_ready):
@@ -79,22 +189,38 @@ class Sender:
             msg = self.recv()
             msg_counter = msg.get_msg_counter()
             self.last_recv_msg_counter = msg_counter
+            self.failed_sends = 0
+            returned_at = time.time()
+            self.on_token_returned(msg_counter)
+
+            # pace tokens only after the round trip has been accounted for
+            self.pace(returned_at)
 
             # token arrives
             if msg_counter >= self.msg_counter:
                 # busy wait until there is a new message to send
-                while self.msg_queue.empty():
+                while not self.has_payload_to_send():
                     time.sleep(0.1)
 
-                msg = self.get_msg_from_queue()
                 self.msg_counter += 1 % self.cap
-                fd_msg = Message(self.id, self.msg_counter, payload=msg)
+                fd_msg = self.pack_token()
                 self.send(fd_msg)
             else:
                 # re-send last sent message
                 self.send(self.last_sent_msg)
                 logger.debug(f"Got invalid msg_counter {msg_counter} back")
-            time.sleep(FD_SLEEP)
+
+    def pace(self, since):
+        """Sleeps until the token interval has passed since the given time
+
+        The interval is re-read while sleeping, such that a shorter interval
+        takes effect at once.
+        """
+        while True:
+            remaining = since + self.token_interval() - time.time()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, FD_SLEEP))
 
     def send(self, msg, timeout=True):
         """Sends a message over the link to the receiver
@@ -108,16 +234,25 @@ class Sender:
             time.sleep(0.1)
 
         msg_as_bytes = msg.to_bytes()
-        self.socket.sendto(msg_as_bytes, self.addr)
+        if self.needs_resolve():
+            self.resolve()
+        try:
+            self.socket.send(msg_as_bytes)
+        except OSError as e:
+            # re-resolve once sends keep failing, the timeout re-sends later
+            logger.debug(f"Could not send msg to {self.addr}: {e}")
+            self.failed_sends += 1
         self.last_sent_msg = msg
 
         # Emit size of sent message
         if self.on_message_sent is not None:
             metric_data = {"bytes_size": len(msg_as_bytes),
                            "msg_type": UDP}
-            self.on_message_sent(msg.get_payload(), metric_data)
+            self.on_message_sent(msg.get_payloads(), metric_data)
 
         if timeout:
+            self.token_sent_at = time.time()
+            self.token_retransmitted = False
             t = Thread(target=self.check_timeout, args=(msg,))
             t.start()
 
@@ -127,24 +262,72 @@ class Sender:
         Helper method that blocks until a message is received from the
         receiver.
         """
-        msg_bytes = self.socket.recv(self.bufsize)
+        while True:
+            try:
+                msg_bytes = self.socket.recv(self.bufsize)
+                break
+            except ConnectionRefusedError:
+                # connected socket got ICMP port unreachable, receiver not up
+                self.failed_sends += 1
         msg = Message.from_bytes(msg_bytes)
         return msg
 
+    def on_token_returned(self, msg_counter):
+        """Feeds the round trip of the current token to the RTT estimator
+
+        Round trips of retransmitted tokens are ambiguous and therefore not
+        sampled (Karn's algorithm).
+        """
+        if (msg_counter != self.msg_counter or self.token_sent_at is None or
+                self.token_retransmitted):
+            return
+        self.rtt.on_sample(time.time() - self.token_sent_at)
+        self.token_sent_at = None
+        self.emit_rtt_metrics()
+
+    def emit_rtt_metrics(self):
+        """Emits the current RTT estimate and retransmission timeout."""
+        hostname, port = self.addr
+        if self.rtt.srtt is not None:
+            link_rtt.labels(self.id, hostname, port).set(self.rtt.srtt)
+        link_rto.labels(self.id, hostname, port).set(self.rtt.rto)
+
+    def kick(self):
+        """Re-sends the token in flight at once
+
+        Called when the receiver signalled that it is up, such that a token
+        lost while it was not does not wait for the retransmission timeout,
+        which may have been backed off meanwhile.
+        """
+        msg = self.last_sent_msg
+        if msg is None or self.last_recv_msg_counter >= msg.get_msg_counter():
+            return
+        logger.debug(f"Receiver {self.addr} up, re-sending msg " +
+                     f"{msg.get_msg_counter()}")
+        self.token_retransmitted = True
+        self.send(msg, timeout=False)
+
     def check_timeout(self, msg):
         """Helper method that re-sends a message if needed
 
-        If the token sent is not recevied within FD_TIMEOUT seconds, the
-        message is re-sent.
+        If the token sent is not received within the retransmission timeout
+        estimated for the link, the message is re-sent and the timeout is
+        backed off until the token returns.
         """
-        start_time = time.time()
         msg_counter = msg.get_msg_counter()
-        while time.time() - start_time < FD_TIMEOUT:
-            if self.last_recv_msg_counter >= msg_counter:
-                # token returned from receiver
-                return
-            else:
-                time.sleep(FD_SLEEP)
-        logger.debug(f"Timeout, re-sending msg {msg_counter} to {self.addr}")
-        self.send(msg, timeout=False)
-        self.check_timeout(msg)
+        while True:
+            deadline = time.time() + self.rtt.rto
+            while time.time() < deadline:
+                if self.last_recv_msg_counter >= msg_counter:
+                    # token returned from receiver
+                    return
+                time.sleep(min(FD_SLEEP, self.rtt.rto / 4))
+            logger.debug(f"Timeout, re-sending msg {msg_counter} to " +
+                         f"{self.addr}")
+            self.failed_sends += 1
+            self.token_retransmitted = True
+            if self.on_token_lost is not None:
+                self.on_token_lost()
+            self.rtt.on_timeout()
+            self.emit_rtt_metrics()
+            self.send(msg, timeout=False)
@@ -1,13 +1,18 @@
 """Code related to modelling of messages to be sent over comm links."""
 from enum import Enum
+import struct
 import jsonpickle
 
+# header frame sent before each message, containing sender_id and counter
+HEADER = struct.Struct("!iq")
+
 
 class MessageEnum(Enum):
     """Enum representing a message type."""
 
     SENDER_MESSAGE = 0
     RECEIVER_MESSAGE = 1
+    REJECT_MESSAGE = 2  # reply to a message the receiver dropped
 
 
 class Message:
@@ -43,3 +48,17 @@ class Message:
     def as_bytes(self):
         """Returns byte representation of JSON string."""
         return str.encode(self.as_json())
+
+    def header_as_bytes(self):
+        """Returns the header frame (sender_id and counter) of the message."""
+        return HEADER.pack(self.sender_id, self.counter)
+
+
+def parse_header(header_bytes):
+    """Returns tuple (sender_id, counter) of a header frame.
+
+    Returns None if the frame is not a valid header.
+    """
+    if len(header_bytes) != HEADER.size:
+        return None
+    return HEADER.unpack(header_bytes)
@@ -7,7 +7,8 @@ import jsonpickle
 import time
 
 # local
-from .message import Message, MessageEnum
+from .message import Message, MessageEnum, parse_header
+from communication.admission import MALFORMED, SENDER_MISMATCH
 
 # globals
 logger = logging.getLogger(__name__)
@@ -20,13 +21,21 @@ class Receiver():
     connect to in order to send messages.
     """
 
-    def __init__(self, id, ip, port, resolver, on_ack=None):
-        """Initializes the receiver."""
+    def __init__(self, id, ip, port, resolver, on_ack=None, admission=None):
+        """Initializes the receiver.
+
+        If admission (an AdmissionControl) is supplied, messages that are not
+        admitted based on their header frame and size are dropped before
+        they are decoded. Messages whose sender differs from the header are
+        dropped too, without using up the rate of the sender in the header.
+        Dropped messages are answered with a reject.
+        """
         self.id = id
         self.ip = ip
         self.port = port
         self.resolver = resolver
         self.on_ack = on_ack
+        self.admission = admission
 
         self.context = zmq.Context()
         self.socket = self.context.socket(zmq.REP)
@@ -38,12 +47,62 @@ class Receiver():
     def start(self):
         """Starts the zeromq server."""
         while True:
-            msg_bytes = self.socket.recv()
-            msg_json = msg_bytes.decode()
-            msg = jsonpickle.decode(msg_json)
-            self.resolver.dispatch_msg(msg.get_data())
+            self.handle(self.socket.recv_multipart())
+
+    def handle(self, frames):
+        """Admits, dispatches and answers a received message."""
+        header = parse_header(frames[0]) if len(frames) == 2 else None
+        if header is None:
+            self.drop(None, -1, MALFORMED)
+            return
+
+        sender_id, counter = header
+        size = len(frames[1])
+        if (self.admission is not None and
+                not self.admission.admit(sender_id, size)):
+            self.reject(counter)
+            return
+
+        try:
+            msg = jsonpickle.decode(frames[1].decode())
+            data = msg.get_data()
+            sender = data["sender"]
+        except Exception:
+            self.drop(sender_id, counter, MALFORMED)
+            return
+        if msg.get_sender_id() != sender_id or sender != sender_id:
+            self.reject_sender(sender_id, counter)
+            return
+        self.resolver.dispatch_msg(data)
+
+        self.ack(msg.get_counter())
 
-            self.ack(msg.get_counter())
+    def drop(self, sender_id, counter, reason):
+        """Drops a received message, counted if admission control is used."""
+        logger.debug(f"Dropping message from {sender_id}: {reason}")
+        if self.admission is not None:
+            self.admission.drop(sender_id, reason)
+        self.reject(counter)
+
+    def reject_sender(self, sender_id, counter):
+        """Drops a message whose sender differs from the header frame.
+
+        The message is not counted against the rate of sender_id, see
+        AdmissionControl.reject_sender.
+        """
+        logger.debug(f"Dropping message from {sender_id}: {SENDER_MISMATCH}")
+        if self.admission is not None:
+            self.admission.reject_sender(sender_id)
+        self.reject(counter)
+
+    def reject(self, counter):
+        """Replies to a dropped message, required by the REQ/REP pattern.
+
+        The reply is a reject rather than an ack, so the sender can tell
+        dropped messages apart from delivered ones.
+        """
+        msg = Message(MessageEnum.REJECT_MESSAGE, counter, self.id)
+        self.socket.send(msg.as_bytes())
 
     def ack(self, counter):
         """Sends a message over the specified channel."""
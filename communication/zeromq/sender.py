@@ -10,7 +10,7 @@ from queue import Queue
 import jsonpickle
 
 # local
-from metrics.messages import msgs_in_queue
+from metrics.messages import msgs_in_queue, msgs_rejected
 from .message import Message, MessageEnum
 import modules.byzantine as byz
 from communication.constants import ZERO_MQ
@@ -70,18 +70,25 @@ class Sender():
                 reply = await self.send(msg)
                 if reply.get_counter() != self.counter:
                     raise ValueError("did not get same counter back")
+                if reply.get_type() == MessageEnum.REJECT_MESSAGE:
+                    logger.debug(f"Message {self.counter} rejected by " +
+                                 f"node {self.recv.id}")
+                    msgs_rejected.labels(self.id, self.recv.id,
+                                         self.recv.hostname).inc()
                 self.counter += 1 % self.cap
 
     async def send(self, data):
         """Sends a message over the specified channel.
 
         Constructs a message consisting of the token and the payload and sends
-        it over the socket.
+        it over the socket, preceded by a header frame that lets the receiver
+        apply admission control without decoding the message.
         """
         msg = Message(MessageEnum.SENDER_MESSAGE, self.counter, self.id, data)
         sent_time = time.time()
         msg_as_bytes = msg.as_bytes()
-        await self.socket.send(msg_as_bytes)
+        await self.socket.send_multipart([msg.header_as_bytes(),
+                                          msg_as_bytes])
 
         reply_bytes = await self.socket.recv()
         # metric rtt time for sent and ACKed message
@@ -14,11 +14,22 @@ from communication.zeromq.sender import Sender
 from communication.zeromq.receiver import Receiver
 from communication.udp.sender import Sender as FDSender
 from communication.udp.receiver import Receiver as FDReceiver
+from communication.admission import AdmissionControl
+from communication.constants import ZERO_MQ, UDP
 import conf.config as config
 from api.server import start_server
 from modules.recma.module import RecMAModule
+from modules.recma.policies import LatencyPolicy, FastestPolicy, BatchPolicy
 from modules.recsa.module import RecSAModule
 from modules.fd.module import FDModule
+from modules.fd.vectorized import VectorizedFDModule, numpy_available
+from modules.fd.phi import PhiAccrualFDModule
+from modules.fd.swim import SwimFDModule
+from modules.constants import (FD_MODE_COUNT, FD_MODE_PHI, FD_MODE_SWIM,
+                               RECSA_MIN_INTERVAL, RECSA_MAX_INTERVAL,
+                               RECMA_POLICY_TRUST, RECMA_POLICY_LATENCY,
+                               RECMA_POLICY_FASTEST, RECMA_POLICY_BATCH,
+                               JOIN_BATCH_WINDOW)
 from modules.joining_mechanism.module import JoiningMechanismModule
 from modules.abd.module import ABDModule
 from resolve.enums import Module, SystemStatus
@@ -37,6 +48,77 @@ def start_api(resolver):
     thread.start()
 
 
+def create_fd_module(resolver, n):
+    """Creates the failure detector module.
+
+    The kind of failure detector is selected by env var FD_MODE, which is
+    either "count" (default), "phi" or "swim". The state of the count failure
+    detector is kept in NumPy arrays if env var FD_NUMPY is set and NumPy is
+    installed.
+    """
+    mode = os.getenv("FD_MODE", FD_MODE_COUNT)
+    if mode == FD_MODE_PHI:
+        logger.info("Using phi accrual failure detector")
+        return PhiAccrualFDModule(id, resolver, n)
+    if mode == FD_MODE_SWIM:
+        logger.info("Using SWIM probing failure detector")
+        return SwimFDModule(id, resolver, n)
+    if mode != FD_MODE_COUNT:
+        logger.error(f"Invalid FD_MODE {mode}, using {FD_MODE_COUNT}")
+
+    if os.getenv("FD_NUMPY"):
+        if numpy_available():
+            logger.info("Using NumPy-backed failure detector")
+            return VectorizedFDModule(id, resolver, n)
+        logger.warning("FD_NUMPY set but NumPy is not installed")
+    return FDModule(id, resolver, n)
+
+
+def create_recsa_module(resolver, n):
+    """Creates the RecSA module.
+
+    Env vars RECSA_MIN_INTERVAL and RECSA_MAX_INTERVAL override the bounds in
+    seconds on the time between two iterations of the RecSA loop. If env var
+    RECSA_DIGESTS is set, unchanged state is sent as a digest.
+    """
+    min_interval = float(os.getenv("RECSA_MIN_INTERVAL", RECSA_MIN_INTERVAL))
+    max_interval = float(os.getenv("RECSA_MAX_INTERVAL", RECSA_MAX_INTERVAL))
+    return RecSAModule(id, resolver, n, min_interval=min_interval,
+                       max_interval=max_interval,
+                       digests=bool(os.getenv("RECSA_DIGESTS")))
+
+
+def join_batch_window():
+    """Returns the seconds joins are grouped for, env var JOIN_BATCH_WINDOW."""
+    return float(os.getenv("JOIN_BATCH_WINDOW", JOIN_BATCH_WINDOW))
+
+
+def create_recma_module(resolver, n):
+    """Creates the RecMA module.
+
+    The policy RecMA evaluates the configuration with is selected by env var
+    RECMA_POLICY, which is either "trust" (default), "latency", "fastest" or
+    "batch". The size of the configuration kept by the "fastest" policy is
+    given by env var RECMA_SIZE and defaults to n. The "batch" policy groups
+    joins and leaves within env var JOIN_BATCH_WINDOW seconds.
+    """
+    mode = os.getenv("RECMA_POLICY", RECMA_POLICY_TRUST)
+    if mode == RECMA_POLICY_LATENCY:
+        logger.info("Using latency-aware reconfiguration policy")
+        return RecMAModule(id, resolver, n, policy=LatencyPolicy())
+    if mode == RECMA_POLICY_FASTEST:
+        k = int(os.getenv("RECMA_SIZE", n))
+        logger.info(f"Using reconfiguration policy of the {k} fastest")
+        return RecMAModule(id, resolver, n, policy=FastestPolicy(k))
+    if mode == RECMA_POLICY_BATCH:
+        logger.info("Using reconfiguration policy of batched joins")
+        return RecMAModule(id, resolver, n,
+                           policy=BatchPolicy(join_batch_window()))
+    if mode != RECMA_POLICY_TRUST:
+        logger.error(f"Invalid RECMA_POLICY {mode}, using {RECMA_POLICY_TRUST}")
+    return RecMAModule(id, resolver, n)
+
+
 def start_modules(resolver):
     """Starts all modules in separate threads."""
     n = int(os.getenv("NUMBER_OF_NODES", 0))
@@ -54,10 +136,11 @@ def start_modules(resolver):
         logger.warning("Node will load state from conf/start_state.json")
 
     modules = {
-        Module.RECMA_MODULE: RecMAModule(id, resolver, n),
-        Module.RECSA_MODULE: RecSAModule(id, resolver, n),
-        Module.FAILURE_DETECTOR_MODULE: FDModule(id, resolver, n),
-        Module.JOINING_MECHANISM_MODULE: JoiningMechanismModule(id, resolver, n),
+        Module.RECMA_MODULE: create_recma_module(resolver, n),
+        Module.RECSA_MODULE: create_recsa_module(resolver, n),
+        Module.FAILURE_DETECTOR_MODULE: create_fd_module(resolver, n),
+        Module.JOINING_MECHANISM_MODULE: JoiningMechanismModule(
+            id, resolver, n, batch_window=join_batch_window()),
         Module.ABD_MODULE: ABDModule(id, resolver, n)
     }
 
@@ -74,8 +157,10 @@ def setup_communication(resolver):
     nodes = config.get_nodes()
 
     # setup receiver to receiver channel messages from other nodes
+    admission = AdmissionControl(id, known_senders=resolver.get_node_ids,
+                                 channel=ZERO_MQ)
     receiver = Receiver(id, nodes[id].ip, nodes[id].port, resolver,
-                        resolver.on_message_sent)
+                        resolver.on_message_sent, admission=admission)
     t = Thread(target=receiver.start)
     t.start()
 
@@ -143,8 +228,11 @@ def setup_fd_communication(resolver):
 
     # setup self-stabilizing receiver channel for failure detectors on
     # other nodes
+    admission = AdmissionControl(id, known_senders=resolver.get_node_ids,
+                                 channel=UDP)
     receiver = FDReceiver(("0.0.0.0", 7000 + id),
-                          on_message_recv=resolver.dispatch_msg)
+                          on_message_recv=resolver.dispatch_msg,
+                          admission=admission)
     t = Thread(target=receiver.listen)
     t.start()
 
@@ -155,7 +243,9 @@ def setup_fd_communication(resolver):
         if id != node.id:
             sender = FDSender(id, (node.hostname, 7000 + node.id),
                               check_ready=resolver.system_running,
-                              on_message_sent=resolver.on_message_sent)
+                              on_message_sent=resolver.on_message_sent,
+                              token_interval=resolver.fd_token_interval,
+                              on_token_lost=resolver.fd_on_token_lost)
             senders[node.id] = sender
             t = Thread(target=sender.start)
             t.start()
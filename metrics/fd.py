@@ -0,0 +1,18 @@
+"""Metrics related to the failure detector."""
+
+from prometheus_client import Gauge, Histogram
+
+token_queue_wait = Histogram("fd_token_queue_wait",
+                             "Time tokens spend in the failure detector " +
+                             "queue before being handled",
+                             ["node_id"])
+
+tokens_per_batch = Histogram("fd_tokens_per_batch",
+                             "Number of tokens handled in one batch",
+                             ["node_id"],
+                             buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+
+token_backoff = Gauge("fd_token_backoff",
+                      "Factor the failure detector token interval is " +
+                      "lengthened by",
+                      ["node_id"])
@@ -0,0 +1,20 @@
+"""Metrics related to the Joining Mechanism module."""
+
+from prometheus_client import Counter, Histogram
+
+snapshot_bytes = Counter("joining_snapshot_bytes",
+                         "Bytes of application state snapshots received " +
+                         "in chunks that passed their checksum",
+                         ["node_id"])
+
+snapshot_duration = Histogram("joining_snapshot_duration",
+                              "Time from the start of a snapshot transfer " +
+                              "to the snapshot being applied",
+                              ["node_id"])
+
+snapshot_throughput = Histogram("joining_snapshot_throughput",
+                                "Bytes per second of the snapshot transfers " +
+                                "completed",
+                                ["node_id"],
+                                buckets=(2**10, 2**14, 2**17, 2**20, 2**23,
+                                         2**26, float("inf")))
@@ -9,3 +9,11 @@ msgs_sent = Counter("msg_sent",
 msgs_in_queue = Gauge("msgs_in_queue",
                       "The amount of messages waiting to be sent over channel",
                       ["node_id", "receiver_id", "receiver_hostname"])
+
+msgs_dropped = Counter("msgs_dropped",
+                       "Number of messages dropped by admission control",
+                       ["node_id", "channel", "sender_id", "reason"])
+
+msgs_rejected = Counter("msgs_rejected",
+                        "Number of messages sent but dropped by the receiver",
+                        ["node_id", "receiver_id", "receiver_hostname"])
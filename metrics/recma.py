@@ -0,0 +1,13 @@
+"""Metrics related to the RecMA module."""
+
+from prometheus_client import Gauge, Histogram
+
+backoff = Gauge("recma_backoff",
+                "Factor the interval between RecMA state resends is " +
+                "lengthened by",
+                ["node_id"])
+
+flag_latency = Histogram("recma_flag_latency",
+                         "Time from a change of the RecMA flags of a " +
+                         "processor to sending them, by its local clock",
+                         ["node_id"])
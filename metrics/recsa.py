@@ -0,0 +1,18 @@
+"""Metrics related to the RecSA module."""
+
+from prometheus_client import Counter, Gauge
+
+predicates_skipped = Counter("recsa_predicates_skipped",
+                             "Number of predicate evaluations answered " +
+                             "from the results of previous iterations",
+                             ["node_id"])
+
+backoff = Gauge("recsa_backoff",
+                "Factor the interval between RecSA state resends is " +
+                "lengthened by",
+                ["node_id"])
+
+view_age = Gauge("recsa_view_age",
+                 "Seconds since RecSA published the view read by the " +
+                 "other modules",
+                 ["node_id"])
@@ -0,0 +1,27 @@
+"""Metrics related to the self-stabilizing UDP communication channel."""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+addr_resolution_latency = Histogram("udp_addr_resolution_latency",
+                                    "Time spent resolving the address of " +
+                                    "a UDP receiver",
+                                    ["node_id", "receiver_hostname"])
+
+link_rtt = Gauge("udp_link_rtt",
+                 "Smoothed round-trip time of tokens over a UDP link",
+                 ["node_id", "receiver_hostname", "receiver_port"])
+
+link_rto = Gauge("udp_link_rto",
+                 "Retransmission timeout of tokens over a UDP link",
+                 ["node_id", "receiver_hostname", "receiver_port"])
+
+payloads_per_token = Histogram("udp_payloads_per_token",
+                               "Number of payloads packed into one token",
+                               ["node_id", "receiver_hostname",
+                                "receiver_port"],
+                               buckets=(0, 1, 2, 4, 8, 16, 32, 64))
+
+payloads_dropped = Counter("udp_payloads_dropped",
+                           "Number of payloads dropped as they do not fit " +
+                           "into one token",
+                           ["node_id", "receiver_hostname", "receiver_port"])
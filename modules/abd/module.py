@@ -130,6 +130,16 @@ class ABDModule:
         }
         self.resolver.send_to_node(j, msg)
     
+    def get_state(self):
+        """Returns the state of the register a joining processor starts
+        from, see JoiningMechanismModule.init_vars."""
+        return {"label": self.label}
+
+    def set_state(self, state):
+        """Applies a state returned by get_state of another processor."""
+        self.label = max(state["label"], self.label)
+        logger.info(f"Register initialized to value/label {self.label}")
+
     def get_data(self):
         return {
             "is_writer": self.id == 0,
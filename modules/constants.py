@@ -4,13 +4,63 @@
 APP_NAME = "SelfStabilizingReconfiguration"
 RUN_SLEEP = 1
 INTEGRATION_RUN_SLEEP = 0.05
+RECSA_MIN_INTERVAL = 0.05  # Min seconds between starts of RecSA iterations
+RECSA_MAX_INTERVAL = RUN_SLEEP  # Max seconds between RecSA iterations
+RECSA_FD_POLL_INTERVAL = 0.1  # Seconds between checks for FD changes
+RECSA_FULL_EVALUATION_PERIOD = 10  # Iterations between uncached predicates
+RECSA_FULL_STATE_PERIOD = 100  # Max iterations between full states to a node
+GOSSIP_MAX_BACKOFF = 16  # Max factor RecSA/RecMA resends are slowed by
+RECMA_MIN_INTERVAL = 0.05  # Min seconds between starts of RecMA iterations
+RECMA_REFRESH_PERIOD = 8  # Max iterations between unchanged flags to a node
+JOIN_BATCH_WINDOW = 1  # Seconds joins and leaves are grouped for
+JOIN_BATCH_MAX_WAIT = 10  # Max seconds a join or leave is held back
+SNAPSHOT_CHUNK_SIZE = 2**15  # Bytes of application state per chunk
+SNAPSHOT_WINDOW = 8  # Max chunks requested from a member at a time
+SNAPSHOT_CHUNK_TIMEOUT = 2  # Seconds before a chunk is requested again
+SNAPSHOT_CACHE = 4  # Snapshots a member keeps for joiners to fetch
+JOIN_MIN_INTERVAL = 0.05  # Min seconds between Joining iterations when busy
+JOIN_RETRY_MIN = 0.1  # Initial seconds between join requests or ready signals
+JOIN_RETRY_MAX = 4  # Max seconds between join requests or ready signals
+RECMA_SLOW_PERCENTILE = 0.9  # Members with a higher RTT rank may be replaced
+RECMA_SLOW_FACTOR = 2  # Min ratio of a replaced member's RTT to the median
+RECMA_SLOW_EVALUATIONS = 5  # Evaluations a member must be slow in a row
 FD_SLEEP = 0.25
-FD_TIMEOUT = 5
+FD_TIMEOUT = 5  # Initial retransmission timeout before any RTT is measured
+FD_MIN_RTO = 0.2  # Lower bound for the retransmission timeout
+FD_MAX_RTO = 60  # Upper bound for the retransmission timeout
+FD_ADDR_TTL = 300  # Seconds before a resolved receiver address is refreshed
+FD_RERESOLVE_AFTER = 3  # Failed sends/timeouts before re-resolving address
 MAX_QUEUE_SIZE = 10  # Max allowed amount of messages in send queue
+ADMISSION_RATE = 200  # Messages per second admitted from each sender
+ADMISSION_BURST = 400  # Messages admitted from a sender in a burst
+ADMISSION_MAX_SIZE = 2**20  # Max size in bytes of an admitted message
+
+# RecMA
+RECMA_POLICY_TRUST = "trust"  # Replace config if a quarter is not trusted
+RECMA_POLICY_LATENCY = "latency"  # Also replace persistently slow members
+RECMA_POLICY_FASTEST = "fastest"  # Keep the k fastest trusted participants
+RECMA_POLICY_BATCH = "batch"  # Config follows participants, in batches
 
 # FD
+FD_MODE_COUNT = "count"  # (N, THETA) failure detector counting tokens
+FD_MODE_PHI = "phi"  # Phi accrual failure detector
+FD_MODE_SWIM = "swim"  # SWIM-style probing failure detector
 BEAT_THRESHOLD = 30  # Threshold for liveness, beat-variable
 CNT_THRESHOLD = 20  # Threshold for progress, cnt-variable
+PHI_THRESHOLD = 8  # Suspicion level above which a processor is not trusted
+PHI_WINDOW = 100  # Number of inter-arrival times kept per processor
+PHI_MIN_STD = 0.1  # Lower bound for the std of inter-arrival times
+PHI_FIRST_INTERVAL = 1  # Assumed inter-arrival time before tokens arrive
+PHI_RECOMPUTE_INTERVAL = 0.1  # Max age in seconds of the trusted set
+FD_QUEUE_TIMEOUT = 0.1  # Max seconds to block waiting for a token
+FD_MAX_BACKOFF = 8  # Max factor the token interval is lengthened by
+FD_QUIET_PERIOD = 60  # Seconds of stability before lengthening the interval
+SWIM_PERIOD = 2  # Seconds per protocol period, one probe per period
+SWIM_PROBE_TIMEOUT = 0.8  # Seconds to wait for an ack before indirect probes
+SWIM_INDIRECT_PROBES = 3  # Number of processors asked to probe indirectly
+SWIM_SUSPECT_TIMEOUT = 6  # Seconds a processor is suspected before faulty
+SWIM_MAX_PIGGYBACK = 6  # Max membership updates attached to a message
+SWIM_RETRANSMIT_MULT = 3  # Each update is sent MULT * log2(n) times
 
 NOT_PARTICIPANT = 'NOT_PARTICIPANT'
 BOTTOM = 'BOTTOM'
@@ -5,12 +5,16 @@ import logging
 from copy import deepcopy
 import time
 import os
+from threading import Lock
 
 # local
 from resolve.enums import Function, Module
-from modules.constants import CNT_THRESHOLD, BEAT_THRESHOLD
+from modules.constants import (CNT_THRESHOLD, BEAT_THRESHOLD,
+                               FD_QUEUE_TIMEOUT, FD_MAX_BACKOFF,
+                               FD_QUIET_PERIOD)
 from resolve.enums import MessageType
-from queue import Queue
+from queue import Queue, Empty
+from metrics.fd import token_queue_wait, tokens_per_batch, token_backoff
 import conf.config as conf
 from communication.zeromq.rate_limiter import throttle
 import modules.byzantine as byz
@@ -20,23 +24,47 @@ logger = logging.getLogger(__name__)
 
 
 class FDModule:
-    """Models the (N, THETA) failure detector."""
+    """Models the (N, THETA) failure detector.
+
+    Instead of incrementing beat[k] for every other processor k on each
+    received token, the module counts received tokens in a logical clock and
+    stores the clock value at which each processor was last heard of, such
+    that beat[k] = clock - last_heard[k]. Receiving a token is thereby O(1)
+    and the trusted set is computed lazily when it is requested.
+
+    The trusted set is published as an immutable snapshot together with a
+    version that is incremented only when the membership of the set changes,
+    such that consumers can cache results derived from it per version.
+
+    While the trusted set and the monitors are stable, the interval tokens
+    are paced by is doubled every FD_QUIET_PERIOD seconds, up to
+    FD_MAX_BACKOFF times FD_SLEEP. It snaps back to FD_SLEEP when the trusted
+    set changes, a monitor is reset or a token is lost. Each token advances
+    the clock by the mean backoff of both ends of its link, such that
+    BEAT_THRESHOLD corresponds to the same time regardless of the interval.
+    """
 
     first_run = True
+    adaptive_backoff = True
 
     def __init__(self, id, resolver, n):
         """Initializes the module."""
         self.resolver = resolver
         self.id = id
         self.number_of_nodes = n
-        self.beat = [0 for i in range(n)]
+        self.clock = 0  # number of tokens received
+        self.last_heard = [0 for i in range(n)]
         self.monitor = [0 for i in range(n)]
         self.cnt = 0
         self.cur_check_req = []
-        self.fd_set = set()
+        self.trusted = (0, frozenset())  # (version, trusted set) snapshot
+        self.trusted_clock = 0  # clock value trusted was computed for
+        self.trusted_lock = Lock()
         self.prim = -1
         self.msg_queue = Queue()
         self.was_unresponsive = False
+        self.backoff = 1  # factor the token interval is lengthened by
+        self.quiet_since = time.monotonic()
 
         if os.getenv("INTEGRATION_TEST") or os.getenv("INJECT_START_STATE"):
             start_state = conf.get_start_state()
@@ -46,7 +74,7 @@ class FDModule:
                 if data is not None:
                     logger.warning("Injecting start state")
                     if "beat" in data:
-                        self.beat = deepcopy(data["beat"])
+                        self.set_beat(data["beat"])
                     if "cnt" in data:
                         self.cnt = deepcopy(data["cnt"])
                     if "cur_check_req" in data:
@@ -61,13 +89,10 @@ class FDModule:
             time.sleep(0.1)
 
         while True:
-            if self.msg_queue.empty():
-                time.sleep(0.1)
-            else:
-                msg = self.msg_queue.get()
-                processor_j = msg["sender"]
-                self.upon_token_from_pj(processor_j)
-                self.send_msg(processor_j)
+            batch = self.drain_queue(FD_QUEUE_TIMEOUT)
+            if batch:
+                self.handle_tokens(batch)
+            self.update_backoff(time.monotonic())
 
             if testing:
                 break
@@ -81,40 +106,161 @@ class FDModule:
 
             throttle()
 
-    def upon_token_from_pj(self, processor_j):
-        """Checks responsiveness and liveness of processor j."""
-        self.beat[processor_j] = 0
-        self.beat[self.id] = 0
+    def drain_queue(self, timeout):
+        """Returns all queued tokens, blocking up to timeout for the first.
+
+        Returns a list of tuples (enqueued at, msg), empty on timeout.
+        """
+        try:
+            batch = [self.msg_queue.get(timeout=timeout)]
+        except Empty:
+            return []
+        while True:
+            try:
+                batch.append(self.msg_queue.get_nowait())
+            except Empty:
+                return batch
+
+    def handle_tokens(self, batch):
+        """Applies a batch of queued tokens and answers their senders.
+
+        The tokens are applied as one bulk update, after which each distinct
+        sender is answered once, in the order its first token was received.
+        """
+        self.observe_batch(batch)
+        senders = [msg["sender"] for _, msg in batch]
+        weights = [self.token_weight(msg) for _, msg in batch]
+        self.upon_tokens_from(senders, weights)
+        for processor_j in dict.fromkeys(senders):
+            self.send_msg(processor_j)
+
+    def observe_batch(self, batch):
+        """Emits the queue wait time of each token and the batch size."""
+        now = time.monotonic()
+        for enqueued_at, _ in batch:
+            token_queue_wait.labels(self.id).observe(now - enqueued_at)
+        tokens_per_batch.labels(self.id).observe(len(batch))
+
+    def upon_token_from_pj(self, processor_j, weight=1):
+        """Checks responsiveness and liveness of processor j.
+
+        Resets beat[j] and beat[i] and implicitly increments beat[k] of all
+        other processors k by advancing the logical clock by weight.
+        """
+        self.clock += weight
+        self.last_heard[processor_j] = self.clock
+        self.last_heard[self.id] = self.clock
 
         self.monitor[processor_j] = min(self.monitor[processor_j] + 1, 3)
         self.monitor[self.id] = min(self.monitor[processor_j] + 1, 3)
 
-        new_fd_set = {processor_j, self.id}
-        for other_processor in range(self.number_of_nodes):
-            if other_processor == self.id or other_processor == processor_j:
-                continue
-            self.beat[other_processor] += 1
-            if self.beat[other_processor] < BEAT_THRESHOLD:
-                new_fd_set.add(other_processor)
-        self.fd_set = deepcopy(new_fd_set)
+    def upon_tokens_from(self, processors, weights=None):
+        """Handles tokens from the list processors, in the given order.
+
+        Each token advances the clock by the corresponding entry of weights,
+        by one if weights is not given.
+        """
+        if weights is None:
+            weights = [1 for _ in processors]
+        for processor_j, weight in zip(processors, weights):
+            self.upon_token_from_pj(processor_j, weight)
+
+    def token_weight(self, msg):
+        """Returns the clock increment of a token, see class docstring."""
+        backoff = msg.get("backoff", 1)
+        if not isinstance(backoff, int):
+            backoff = 1
+        total = self.backoff + min(max(backoff, 1), FD_MAX_BACKOFF)
+        return total // 2 if total % 2 == 0 else total / 2
+
+    def update_backoff(self, now):
+        """Doubles the backoff if the FD has been quiet for long enough."""
+        if (not self.adaptive_backoff or self.backoff >= FD_MAX_BACKOFF or
+                now - self.quiet_since < FD_QUIET_PERIOD):
+            return
+        # publishing a changed trusted set snaps the backoff back
+        version = self.trusted[0]
+        _, trusted = self.get_trusted_snapshot()
+        if self.trusted[0] != version:
+            return
+        if all(self.stable_monitor(k) for k in trusted if k != self.id):
+            self.set_backoff(self.backoff * 2)
+        self.quiet_since = now
+
+    def reset_backoff(self):
+        """Snaps the token interval back to the fast rate."""
+        self.quiet_since = time.monotonic()
+        if self.backoff != 1:
+            self.set_backoff(1)
+
+    def set_backoff(self, backoff):
+        """Sets the factor the token interval is lengthened by."""
+        logger.debug(f"Token interval backoff set to {backoff}")
+        self.backoff = backoff
+        token_backoff.labels(self.id).set(backoff)
 
     # Macros
+    def get_beat(self):
+        """Returns the beat list, i.e. tokens received since last heard of."""
+        return [self.clock - heard for heard in self.last_heard]
+
+    def set_beat(self, beat):
+        """Sets the beat list relative to the current clock value."""
+        self.last_heard = [self.clock - b for b in beat]
+
     def reset(self):
         """Resets local variables."""
         logger.debug("Reset Failure Detector")
-        self.beat = [0 for i in range(self.number_of_nodes)]
+        # the trusted set is the one computed upon the last received token
+        self.get_trusted()
+        self.set_beat([0 for i in range(self.number_of_nodes)])
         self.monitor = [0 for i in range(self.number_of_nodes)]
         self.cnt = 0
         self.cur_check_req = []
 
+    def add_node(self):
+        """Extends the local variables when a node has joined the system."""
+        self.get_trusted()
+        self.number_of_nodes += 1
+        self.last_heard.append(self.clock)
+        self.monitor.append(0)
+
     # Interface functions
     def get_trusted(self):
-        """Returns the set of trusted processors."""
-        return self.fd_set
+        """Returns the set of trusted processors as an immutable frozenset."""
+        return self.get_trusted_snapshot()[1]
+
+    def get_trusted_snapshot(self):
+        """Returns tuple (version, trusted set) of the latest trusted set.
+
+        The set is computed from the beat values upon the most recently
+        received token and cached until another token is received. The
+        version only changes when the set itself changes.
+        """
+        if self.clock != self.trusted_clock:
+            with self.trusted_lock:
+                clock = self.clock
+                if clock != self.trusted_clock:
+                    self.publish_trusted(self.compute_trusted(clock))
+                    self.trusted_clock = clock
+        return self.trusted
+
+    def compute_trusted(self, clock):
+        """Returns the processors with beat below BEAT_THRESHOLD at clock."""
+        return frozenset(k for k, heard in enumerate(self.last_heard)
+                         if clock - heard < BEAT_THRESHOLD)
+
+    def publish_trusted(self, trusted):
+        """Publishes a new trusted set, bumping the version if it changed."""
+        version, current = self.trusted
+        if trusted != current:
+            self.trusted = (version + 1, trusted)
+            self.reset_backoff()
 
     def reset_monitor(self, processor_j):
         """Resets the FD monitor counter for a specified processor"""
         self.monitor[processor_j] = 0
+        self.reset_backoff()
 
     def stable_monitor(self, processor_j):
         return self.monitor[processor_j] == 3
@@ -128,7 +274,8 @@ class FDModule:
         """
         msg = {
             "type": MessageType.FAILURE_DETECTOR_MESSAGE,
-            "sender": self.id
+            "sender": self.id,
+            "backoff": self.backoff
         }
         self.resolver.send_to_node(processor_j, msg, fd_msg=True)
 
@@ -138,14 +285,14 @@ class FDModule:
         Called by the Resolver to recieve a message containing the vcm of
         processor j
         """
-        self.msg_queue.put(msg)
+        self.msg_queue.put((time.monotonic(), msg))
 
     # Function to extract data
     def get_data(self):
         """Returns current values on local variables."""
         return {
             "id": self.id,
-            "beat": deepcopy(self.beat),
+            "beat": self.get_beat(),
             "cnt": deepcopy(self.cnt),
             "cur_check_req": deepcopy(self.cur_check_req),
             "prim_fd": deepcopy(self.prim)
@@ -0,0 +1,135 @@
+"""Contains a phi accrual failure detector module."""
+
+# standard
+import logging
+import math
+import time
+from collections import deque
+
+# local
+from modules.constants import (PHI_THRESHOLD, PHI_WINDOW, PHI_MIN_STD,
+                               PHI_FIRST_INTERVAL, PHI_RECOMPUTE_INTERVAL)
+from modules.fd.module import FDModule
+
+# globals
+logger = logging.getLogger(__name__)
+
+
+def phi(elapsed, mean, std):
+    """Returns the suspicion level after elapsed seconds without a token.
+
+    The inter-arrival times are assumed to be normally distributed with the
+    given mean and std, the cumulative distribution function is approximated
+    with a logistic function as done by Hayashibara et al. and in Akka.
+    """
+    y = (elapsed - mean) / std
+    a = y * (1.5976 + 0.070566 * y * y)
+    # phi = -log10(1 - cdf) = log10(1 + exp(a)), computed without overflow
+    if a > 0:
+        return (a + math.log1p(math.exp(-a))) / math.log(10)
+    return math.log1p(math.exp(a)) / math.log(10)
+
+
+class PhiAccrualFDModule(FDModule):
+    """Models a phi accrual failure detector.
+
+    Instead of counting tokens from other processors, the module keeps the
+    last PHI_WINDOW inter-arrival times of tokens from each processor and
+    trusts a processor as long as its suspicion level phi is below
+    PHI_THRESHOLD. Suspicion thereby depends on wall-clock time and the
+    observed token rate of each link rather than on the cluster size.
+
+    Offers the same interface as FDModule, monitors are kept the same way.
+    The token interval is not lengthened, as phi already adapts to the
+    observed token rate.
+    """
+
+    adaptive_backoff = False
+
+    def __init__(self, id, resolver, n, now=time.monotonic):
+        """Initializes the module."""
+        super().__init__(id, resolver, n)
+        self.now = now
+        self.threshold = PHI_THRESHOLD
+        start = self.now()
+        self.trusted_at = start
+        self.clear_history(start)
+
+    def clear_history(self, now):
+        """Forgets all inter-arrival times, processors were heard of at now."""
+        n = self.number_of_nodes
+        self.heard_from = set()
+        self.last_arrival = [now for i in range(n)]
+        self.intervals = [deque(maxlen=PHI_WINDOW) for i in range(n)]
+        self.interval_sum = [0 for i in range(n)]
+        self.interval_sum_sq = [0 for i in range(n)]
+
+    def upon_token_from_pj(self, processor_j, weight=1):
+        """Records the arrival of a token from processor j."""
+        now = self.now()
+        if processor_j in self.heard_from:
+            self.record_interval(processor_j,
+                                 now - self.last_arrival[processor_j])
+        self.heard_from.add(processor_j)
+        self.last_arrival[processor_j] = now
+        super().upon_token_from_pj(processor_j, weight)
+
+    def record_interval(self, processor_j, interval):
+        """Adds an inter-arrival time to the window of processor j."""
+        intervals = self.intervals[processor_j]
+        if len(intervals) == intervals.maxlen:
+            oldest = intervals[0]
+            self.interval_sum[processor_j] -= oldest
+            self.interval_sum_sq[processor_j] -= oldest * oldest
+        intervals.append(interval)
+        self.interval_sum[processor_j] += interval
+        self.interval_sum_sq[processor_j] += interval * interval
+
+    def suspicion(self, processor_j, now):
+        """Returns the current suspicion level phi of processor j."""
+        count = len(self.intervals[processor_j])
+        if count == 0:
+            mean, std = PHI_FIRST_INTERVAL, PHI_FIRST_INTERVAL / 4
+        else:
+            mean = self.interval_sum[processor_j] / count
+            variance = self.interval_sum_sq[processor_j] / count - mean * mean
+            std = math.sqrt(max(variance, 0))
+        std = max(std, PHI_MIN_STD)
+        return phi(now - self.last_arrival[processor_j], mean, std)
+
+    def reset(self):
+        """Resets local variables."""
+        super().reset()
+        self.clear_history(self.now())
+
+    def add_node(self):
+        """Extends the local variables when a node has joined the system."""
+        super().add_node()
+        self.last_arrival.append(self.now())
+        self.intervals.append(deque(maxlen=PHI_WINDOW))
+        self.interval_sum.append(0)
+        self.interval_sum_sq.append(0)
+
+    def get_trusted_snapshot(self):
+        """Returns tuple (version, trusted set) of the latest trusted set.
+
+        Suspicion grows with time, so the set is recomputed when a token has
+        been received or when it is older than PHI_RECOMPUTE_INTERVAL.
+        """
+        now = self.now()
+        if (self.clock != self.trusted_clock or
+                now - self.trusted_at > PHI_RECOMPUTE_INTERVAL):
+            with self.trusted_lock:
+                self.publish_trusted(self.compute_trusted(self.clock, now))
+                self.trusted_clock = self.clock
+                self.trusted_at = now
+        return self.trusted
+
+    def compute_trusted(self, clock, now=None):
+        """Returns the processors with a suspicion level below threshold."""
+        if clock == 0:
+            return frozenset()
+        now = now if now is not None else self.now()
+        return frozenset(
+            k for k in range(len(self.last_arrival))
+            if k == self.id or self.suspicion(k, now) < self.threshold)
@@ -0,0 +1,300 @@
+"""Contains a SWIM-style probing failure detector module."""
+
+# standard
+import heapq
+import logging
+import math
+import random
+import time
+
+# local
+from modules.constants import (FD_QUEUE_TIMEOUT, SWIM_PERIOD,
+                               SWIM_PROBE_TIMEOUT, SWIM_INDIRECT_PROBES,
+                               SWIM_SUSPECT_TIMEOUT, SWIM_MAX_PIGGYBACK,
+                               SWIM_RETRANSMIT_MULT)
+from modules.fd.module import FDModule
+from resolve.enums import MessageType
+from communication.zeromq.rate_limiter import throttle
+
+# globals
+logger = logging.getLogger(__name__)
+
+# membership states
+ALIVE = 0
+SUSPECT = 1
+FAULTY = 2
+
+# kinds of SWIM messages
+PING = "ping"
+ACK = "ack"
+PING_REQ = "ping-req"
+
+
+class SwimFDModule(FDModule):
+    """Models a SWIM-style probing failure detector.
+
+    Instead of exchanging tokens with every other processor, the module
+    probes one processor per protocol period of SWIM_PERIOD seconds, in a
+    randomized round-robin order. If no ack arrives within
+    SWIM_PROBE_TIMEOUT, SWIM_INDIRECT_PROBES other processors are asked to
+    probe it on our behalf. A processor that remains unacknowledged until
+    the end of the period is suspected, and considered faulty once it has
+    been suspected for SWIM_SUSPECT_TIMEOUT seconds.
+
+    Membership updates (processor, state, incarnation) are piggybacked on
+    the probe messages and spread infection-style. A processor refutes a
+    suspicion of itself by incrementing its incarnation number. The number
+    of messages sent per period is thereby constant in the cluster size.
+
+    The trusted set contains all processors not considered faulty. Offers
+    the same interface as FDModule, monitors are kept the same way.
+    """
+
+    adaptive_backoff = False
+
+    def __init__(self, id, resolver, n, now=time.monotonic):
+        """Initializes the module."""
+        super().__init__(id, resolver, n)
+        self.now = now
+        self.random = random.Random()
+        self.trusted_changes = -1  # value of changes trusted was computed for
+        self.changes = 0
+        self.clear_members(self.now())
+
+    def clear_members(self, now):
+        """Considers all processors alive and restarts probing at now."""
+        n = self.number_of_nodes
+        self.status = [ALIVE for i in range(n)]
+        self.incarnation = [0 for i in range(n)]
+        self.suspected_at = {}
+        self.updates = {}  # processor k -> transmissions left of its update
+        self.probe_order = []
+        self.probe_target = None
+        self.probe_seq = 0
+        self.probe_acked = True
+        self.indirect_sent = True
+        self.probe_deadline = now
+        self.period_end = now
+        self.changes += 1
+        self.disseminate(self.id)
+
+    def run(self, testing=False):
+        """Called whenever the module is launched in a separate thread."""
+        # block until system is ready
+        while not testing and not self.resolver.system_running():
+            time.sleep(0.1)
+
+        while True:
+            batch = self.drain_queue(FD_QUEUE_TIMEOUT)
+            if batch:
+                self.handle_tokens(batch)
+            self.tick(self.now())
+
+            if testing:
+                break
+
+            throttle()
+
+    def handle_tokens(self, batch):
+        """Handles a batch of queued SWIM messages."""
+        self.observe_batch(batch)
+        for _, msg in batch:
+            self.upon_swim_msg(msg)
+
+    def upon_swim_msg(self, msg):
+        """Handles a SWIM message, which is proof that its sender is alive."""
+        processor_j = msg.get("sender")
+        if not self.is_member(processor_j):
+            return
+        for update in msg.get("updates", []):
+            if isinstance(update, list) and len(update) == 3:
+                self.apply_update(*update)
+        self.apply_update(processor_j, ALIVE, msg.get("incarnation", 0))
+        self.upon_token_from_pj(processor_j)
+
+        kind = msg.get("swim")
+        if kind == PING:
+            self.send_swim(processor_j, ACK, seq=msg.get("seq"),
+                           target=self.id, origin=msg.get("origin"))
+        elif kind == PING_REQ and self.is_member(msg.get("target")):
+            self.send_swim(msg["target"], PING, seq=msg.get("seq"),
+                           origin=processor_j)
+        elif kind == ACK:
+            origin = msg.get("origin")
+            if origin is not None and origin != self.id:
+                # relay the ack of an indirect probe
+                if self.is_member(origin):
+                    self.send_swim(origin, ACK, seq=msg.get("seq"),
+                                   target=msg.get("target"))
+            elif (msg.get("target") == self.probe_target and
+                  msg.get("seq") == self.probe_seq):
+                self.probe_acked = True
+
+    def tick(self, now):
+        """Advances the probing protocol to time now."""
+        if (not self.probe_acked and not self.indirect_sent and
+                now >= self.probe_deadline):
+            self.indirect_sent = True
+            self.send_indirect_probes()
+
+        if now >= self.period_end:
+            target = self.probe_target
+            if not self.probe_acked and self.status[target] == ALIVE:
+                logger.debug(f"Suspecting processor {target}")
+                self.set_status(target, SUSPECT, self.incarnation[target])
+            self.expire_suspicions(now)
+            self.start_probe(now)
+
+    def start_probe(self, now):
+        """Starts a new protocol period by probing the next processor."""
+        self.probe_target = self.next_probe_target()
+        self.probe_seq += 1
+        self.probe_acked = self.probe_target is None
+        self.indirect_sent = self.probe_target is None
+        self.probe_deadline = now + SWIM_PROBE_TIMEOUT
+        self.period_end = now + SWIM_PERIOD
+        if self.probe_target is not None:
+            self.send_swim(self.probe_target, PING, seq=self.probe_seq)
+
+    def next_probe_target(self):
+        """Returns the next processor in randomized round-robin order."""
+        if not self.probe_order:
+            self.probe_order = [k for k in range(self.number_of_nodes)
+                                if k != self.id]
+            self.random.shuffle(self.probe_order)
+        return self.probe_order.pop() if self.probe_order else None
+
+    def send_indirect_probes(self):
+        """Asks alive processors to probe the current probe target."""
+        candidates = [k for k, status in enumerate(self.status)
+                      if status == ALIVE and
+                      k not in (self.id, self.probe_target)]
+        k = min(SWIM_INDIRECT_PROBES, len(candidates))
+        for processor_k in self.random.sample(candidates, k):
+            self.send_swim(processor_k, PING_REQ, seq=self.probe_seq,
+                           target=self.probe_target)
+
+    def expire_suspicions(self, now):
+        """Considers processors faulty once suspected for too long."""
+        for processor_k, at in list(self.suspected_at.items()):
+            if now - at >= SWIM_SUSPECT_TIMEOUT:
+                logger.debug(f"Processor {processor_k} considered faulty")
+                self.set_status(processor_k, FAULTY,
+                                self.incarnation[processor_k])
+
+    # Membership
+    def is_member(self, processor_k):
+        """Returns True if processor_k is a valid processor id."""
+        return (isinstance(processor_k, int) and
+                0 <= processor_k < self.number_of_nodes)
+
+    def apply_update(self, processor_k, status, incarnation):
+        """Applies a membership update if it overrides the current state.
+
+        Follows the SWIM precedence rules: an update with a higher
+        incarnation always overrides, at equal incarnation faulty overrides
+        suspect, which overrides alive. Suspicions of this processor itself
+        are refuted by incrementing its incarnation.
+        """
+        if (not self.is_member(processor_k) or
+                status not in (ALIVE, SUSPECT, FAULTY)):
+            return
+        current = self.incarnation[processor_k]
+        if processor_k == self.id:
+            if status != ALIVE and incarnation >= current:
+                self.incarnation[self.id] = incarnation + 1
+                self.disseminate(self.id)
+            return
+        if (incarnation > current or
+                (incarnation == current and
+                 status > self.status[processor_k])):
+            self.set_status(processor_k, status, incarnation)
+
+    def set_status(self, processor_k, status, incarnation):
+        """Sets the state of processor k and disseminates the change."""
+        self.status[processor_k] = status
+        self.incarnation[processor_k] = incarnation
+        if status == SUSPECT:
+            self.suspected_at[processor_k] = self.now()
+        else:
+            self.suspected_at.pop(processor_k, None)
+        self.disseminate(processor_k)
+        self.changes += 1
+
+    def disseminate(self, processor_k):
+        """Schedules the state of processor k to be piggybacked."""
+        n = max(self.number_of_nodes, 2)
+        self.updates[processor_k] = (SWIM_RETRANSMIT_MULT *
+                                     math.ceil(math.log2(n)))
+
+    def piggyback(self, processor_j):
+        """Returns the membership updates to attach to a message to j.
+
+        The updates sent the fewest times are preferred. The state of j
+        itself is always attached if j is not considered alive, such that j
+        gets the chance to refute it.
+        """
+        chosen = heapq.nlargest(SWIM_MAX_PIGGYBACK, self.updates,
+                                key=self.updates.get)
+        if self.status[processor_j] != ALIVE and processor_j not in chosen:
+            chosen.append(processor_j)
+        for processor_k in chosen:
+            if processor_k in self.updates:
+                self.updates[processor_k] -= 1
+                if self.updates[processor_k] <= 0:
+                    del self.updates[processor_k]
+        return [[k, self.status[k], self.incarnation[k]] for k in chosen]
+
+    # Macros
+    def reset(self):
+        """Resets local variables."""
+        super().reset()
+        self.clear_members(self.now())
+
+    def add_node(self):
+        """Extends the local variables when a node has joined the system."""
+        super().add_node()
+        self.status.append(ALIVE)
+        self.incarnation.append(0)
+        self.changes += 1
+
+    # Interface functions
+    def get_trusted_snapshot(self):
+        """Returns tuple (version, trusted set) of the latest trusted set.
+
+        Nothing is trusted until the first message has been received,
+        afterwards the set is recomputed whenever the membership changed.
+        """
+        if self.clock != 0 and self.changes != self.trusted_changes:
+            with self.trusted_lock:
+                changes = self.changes
+                if changes != self.trusted_changes:
+                    self.publish_trusted(self.compute_trusted(self.clock))
+                    self.trusted_changes = changes
+        return self.trusted
+
+    def compute_trusted(self, clock):
+        """Returns the processors not considered faulty."""
+        return frozenset(k for k, status in enumerate(self.status)
+                         if k == self.id or status != FAULTY)
+
+    # Functions to send messages to other nodes
+    def send_swim(self, processor_j, kind, **fields):
+        """Sends a SWIM message with piggybacked updates to processor j."""
+        msg = {
+            "type": MessageType.FAILURE_DETECTOR_MESSAGE,
+            "sender": self.id,
+            "swim": kind,
+            "incarnation": self.incarnation[self.id],
+            "updates": self.piggyback(processor_j),
+            **fields
+        }
+        self.resolver.send_to_node(processor_j, msg, fd_msg=True)
+
+    # Function to extract data
+    def get_data(self):
+        """Returns current values on local variables."""
+        data = super().get_data()
+        data["status"] = list(self.status)
+        data["incarnation"] = list(self.incarnation)
+        return data
@@ -0,0 +1,112 @@
+"""Contains a failure detector keeping its state in NumPy arrays."""
+
+# standard
+import logging
+
+# external
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# local
+from modules.constants import BEAT_THRESHOLD
+from modules.fd.module import FDModule
+
+# globals
+logger = logging.getLogger(__name__)
+
+
+def numpy_available():
+    """Returns True if NumPy can be used by the failure detector."""
+    return np is not None
+
+
+class VectorizedFDModule(FDModule):
+    """Models the (N, THETA) failure detector with NumPy-backed state.
+
+    Behaves exactly like FDModule, but last_heard and monitor are NumPy
+    arrays. Batches of tokens are applied with vectorized operations and the
+    trusted set is extracted with np.flatnonzero, which pays off for large
+    clusters. Requires NumPy to be installed.
+    """
+
+    def __init__(self, id, resolver, n):
+        """Initializes the module."""
+        if np is None:
+            raise ImportError("NumPy is required by VectorizedFDModule")
+        super().__init__(id, resolver, n)
+        self.last_heard = np.array(self.last_heard, dtype=np.int64)
+        self.monitor = np.array(self.monitor, dtype=np.int64)
+
+    def upon_token_from_pj(self, processor_j, weight=1):
+        """Checks responsiveness and liveness of processor j."""
+        if isinstance(weight, float):
+            self.use_float_clock()
+        super().upon_token_from_pj(processor_j, weight)
+
+    def use_float_clock(self):
+        """Keeps clock values as floats once tokens have fractional weight."""
+        if self.last_heard.dtype.kind != "f":
+            self.last_heard = self.last_heard.astype(np.float64)
+
+    def upon_tokens_from(self, processors, weights=None):
+        """Handles tokens from the list processors, in the given order.
+
+        Equivalent to calling upon_token_from_pj for each processor. The
+        token from processors[i] is received at clock plus the sum of the
+        first i + 1 weights, the monitor of each processor saturates at 3 and
+        the monitor of this processor is derived from the last sender, as in
+        upon_token_from_pj.
+        """
+        if len(processors) == 0:
+            return
+        senders = np.asarray(processors, dtype=np.int64)
+        if weights is None:
+            heard_at = self.clock + np.arange(1, len(senders) + 1)
+        else:
+            heard_at = self.clock + np.cumsum(weights)
+            if heard_at.dtype.kind == "f":
+                self.use_float_clock()
+        np.maximum.at(self.last_heard, senders, heard_at)
+
+        counts = np.bincount(senders, minlength=len(self.monitor))
+        np.minimum(self.monitor + counts, 3, out=self.monitor)
+
+        self.clock = heard_at[-1].item()
+        self.last_heard[self.id] = self.clock
+        self.monitor[self.id] = min(self.monitor[senders[-1]] + 1, 3)
+
+    def get_beat(self):
+        """Returns the beat list, i.e. tokens received since last heard of."""
+        return (self.clock - self.last_heard).tolist()
+
+    def set_beat(self, beat):
+        """Sets the beat list relative to the current clock value."""
+        self.last_heard = self.clock - np.asarray(beat)
+
+    def reset(self):
+        """Resets local variables."""
+        logger.debug("Reset Failure Detector")
+        self.get_trusted()
+        self.last_heard = np.full(self.number_of_nodes, self.clock,
+                                  dtype=self.last_heard.dtype)
+        self.monitor = np.zeros(self.number_of_nodes, dtype=np.int64)
+        self.cnt = 0
+        self.cur_check_req = []
+
+    def add_node(self):
+        """Extends the local variables when a node has joined the system."""
+        self.get_trusted()
+        self.number_of_nodes += 1
+        self.last_heard = np.append(self.last_heard, self.clock)
+        self.monitor = np.append(self.monitor, 0)
+
+    def compute_trusted(self, clock):
+        """Returns the processors with beat below BEAT_THRESHOLD at clock."""
+        beat = clock - self.last_heard
+        return frozenset(np.flatnonzero(beat < BEAT_THRESHOLD).tolist())
+
+    def stable_monitor(self, processor_j):
+        """Returns True if the monitor of processor_j is saturated."""
+        return bool(self.monitor[processor_j] == 3)
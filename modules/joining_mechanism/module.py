@@ -1,28 +1,71 @@
 """Contains code related to the Joining Mechanism module."""
 
 # standard
+import collections
 import logging
 import time
 import datetime
+from threading import Lock
 
 # local
-from modules.constants import RUN_SLEEP, BOTTOM, NOT_PARTICIPANT
+from modules.constants import (RUN_SLEEP, BOTTOM, NOT_PARTICIPANT,
+                               JOIN_BATCH_WINDOW, JOIN_MIN_INTERVAL,
+                               JOIN_RETRY_MIN, JOIN_RETRY_MAX)
 import modules.constants as constants
+from modules.nodeset import NodeSet, as_node_set
+from modules.joining_mechanism.snapshot import SnapshotCache, SnapshotTransfer
 from resolve.enums import MessageType
+from metrics.joining import (snapshot_bytes, snapshot_duration,
+                             snapshot_throughput)
 
 # globals
 logger = logging.getLogger(__name__)
 
 
 class JoiningMechanismModule:
-    """Joining Mechanism module"""
+    """Joining Mechanism module
 
-    def __init__(self, id, resolver, n):
-        """Initializes the module."""
+    Members answer the join requests that arrive within batch_window seconds
+    of the first pending one together, with one pass vote, so that the
+    processors requesting to join at about the same time become
+    participants in the same round. Requests are kept while a
+    reconfiguration is not allowed. With a batch_window of 0, every request
+    is answered as it arrives if allowed.
+
+    The application state is transferred to a joiner as a snapshot, see
+    modules.joining_mechanism.snapshot. A response carries the metadata of
+    the snapshot of the member, or BOTTOM if it has no application state,
+    and the joiner fetches the chunks from all passing members that offered
+    the same snapshot before it participates. The transfer is kept across
+    flush_arrays, so that it resumes where it was interrupted, and until p_i
+    is a participant, so that the snapshot is not transferred again if
+    participate() did not take effect.
+
+    A joining processor sends its join requests at once and retries them
+    with backoff, from JOIN_RETRY_MIN up to JOIN_RETRY_MAX seconds. The
+    backoff is reset whenever the configuration changes or its passes are
+    flushed. While joining, or while requests wait to be answered, the
+    module iterates every JOIN_MIN_INTERVAL seconds instead of RUN_SLEEP.
+    """
+
+    def __init__(self, id, resolver, n, batch_window=JOIN_BATCH_WINDOW,
+                 clock=time.monotonic):
+        """Initializes the module, clock returns the current time."""
         self.resolver = resolver
         self.id = id
         self.number_of_nodes = n
         self.msgs_sent = 0
+        self.batch_window = batch_window
+        self.clock = clock
+        self.requests = {}  # joiner -> time its pending request arrived
+        self.requests_lock = Lock()  # guards requests, filled by receivers
+        self.snapshots = SnapshotCache()  # snapshots offered to joiners
+        self.transfer = None  # SnapshotTransfer to p_i while joining
+        self.applied = None  # transfer whose snapshot was applied
+        self.joining = True  # p_i was not a participant in the last iteration
+        self.requested_conf = None  # configuration join requests go to
+        self.retry_interval = JOIN_RETRY_MIN
+        self.retry_at = 0  # time the join requests are due again
 
         # Algorithm variables:
         self.state = {}  # Dict where key is id and value is an application state
@@ -32,15 +75,34 @@ class JoiningMechanismModule:
         """Initializes all variables related to the application based on default values."""
         self.passs = {}
         self.state = {}
+        self.retry_interval = JOIN_RETRY_MIN
+        self.retry_at = 0
         for j in self.resolver.recsa_get_fd_j(self.id):
             self.passs[j] = False
             self.state[j] = BOTTOM
 
     def init_vars(self, state):
         """Initializes all variables related to the application based on the
-        states exchanged with the configuration members."""
-        logger.debug("init_vars() was called. Not implemented yet.")
-        # TODO: Implement
+        states exchanged with the configuration members.
+
+        The snapshot transferred is applied. Nothing is applied if the
+        members offered no application state. The transfer is only recorded
+        the first time its snapshot is applied.
+        """
+        if self.transfer is None:
+            return
+        snapshot = self.transfer.snapshot()
+        self.resolver.abd_set_state(snapshot.state())
+        if self.applied is self.transfer:
+            return
+        self.applied = self.transfer
+        duration = self.clock() - self.transfer.started
+        logger.info(f"Applied snapshot {snapshot.digest} of " +
+                    f"{len(snapshot.data)} bytes after {duration:.3f} s")
+        snapshot_duration.labels(self.id).observe(duration)
+        if duration > 0:
+            snapshot_throughput.labels(self.id).observe(
+                len(snapshot.data) / duration)
 
     def pass_query(self):
         return True
@@ -58,24 +120,92 @@ class JoiningMechanismModule:
         self.flush_arrays()
 
         while True:
-            # Algorithm 3.3 in the technical report
-            while self.id not in self.resolver.recsa_get_fd_part_j(self.id):
-                cur_conf = self.resolver.recsa_get_config()
-                if cur_conf in [NOT_PARTICIPANT, BOTTOM]:
-                    cur_conf = {}
-                num_trusted_member_passes = len(
-                    [j for j in cur_conf if j in self.resolver.recsa_get_fd_j(self.id) and self.passs[j] == True])
-                if self.resolver.recsa_allow_reco() and num_trusted_member_passes > (len(cur_conf) / 2):
-                    self.init_vars(self.state)
-                    logger.info("Calling participate()")
-                    self.resolver.recsa_participate()
-                elif not self.resolver.recsa_allow_reco():
-                    self.flush_arrays()
-                if self.resolver.recsa_allow_reco():
-                    for j in cur_conf:
-                        self.send_join_request(j)
-                time.sleep(RUN_SLEEP)
-            time.sleep(RUN_SLEEP)
+            self.run_iteration()
+            busy = self.joining or self.requests
+            time.sleep(JOIN_MIN_INTERVAL if busy else RUN_SLEEP)
+
+    def run_iteration(self):
+        """Runs an iteration as a joining processor, or answers the pending
+        join requests as a participant. The snapshot transfer is dropped
+        once p_i is a participant."""
+        self.joining = self.id not in self.resolver.recsa_get_fd_part_j(self.id)
+        if self.joining:
+            self.iterate()
+        else:
+            self.transfer = None
+            self.applied = None
+            self.answer_join_requests()
+
+    def iterate(self):
+        """Runs one iteration of Algorithm 3.3 while p_i is not a participant."""
+        cur_conf = self.resolver.recsa_get_config()
+        if cur_conf in [NOT_PARTICIPANT, BOTTOM]:
+            cur_conf = NodeSet()
+        trusted_members = NodeSet.of(cur_conf) & self.resolver.recsa_get_fd_j(self.id)
+        num_trusted_member_passes = len(
+            [j for j in trusted_members if self.passs.get(j) == True])
+        if self.resolver.recsa_allow_reco() and num_trusted_member_passes > (len(cur_conf) / 2) \
+                and self.snapshot_ready(trusted_members):
+            self.init_vars(self.state)
+            logger.info("Calling participate()")
+            self.resolver.recsa_participate()
+        elif not self.resolver.recsa_allow_reco():
+            self.flush_arrays()
+        if self.resolver.recsa_allow_reco() and self.request_due(cur_conf):
+            for j in cur_conf:
+                self.send_join_request(j)
+
+    def request_due(self, conf):
+        """Tests whether the join requests to the members of conf are due,
+        and schedules the next retry."""
+        now = self.clock()
+        if conf != self.requested_conf:
+            self.requested_conf = conf
+            self.retry_interval = JOIN_RETRY_MIN
+            self.retry_at = now
+        if now < self.retry_at:
+            return False
+        self.retry_at = now + self.retry_interval
+        self.retry_interval = min(2 * self.retry_interval, JOIN_RETRY_MAX)
+        return True
+
+    def snapshot_ready(self, trusted_members):
+        """Tests whether the snapshot offered by the passing trusted members
+        has been transferred, and requests the chunks missing otherwise.
+
+        The transfer in progress is continued as long as a passing member
+        still offers its snapshot. Otherwise, the snapshot offered by most
+        of them is transferred.
+        """
+        offers = {j: self.state[j] for j in trusted_members
+                  if self.passs.get(j) and self.state.get(j, BOTTOM) != BOTTOM}
+        if not offers:
+            self.transfer = None
+            return True
+        digests = collections.Counter(m["digest"] for m in offers.values())
+        if self.transfer is None or self.transfer.digest not in digests:
+            digest = digests.most_common(1)[0][0]
+            meta = next(m for m in offers.values() if m["digest"] == digest)
+            logger.info(f"Transferring snapshot {digest} of " +
+                        f"{meta['size']} bytes")
+            self.transfer = SnapshotTransfer(meta, self.clock)
+        self.transfer.sources = NodeSet(
+            j for j, m in offers.items() if m["digest"] == self.transfer.digest)
+        if self.transfer.snapshot() is not None:
+            return True
+        self.request_chunks()
+        return False
+
+    def request_chunks(self, sources=None):
+        """Requests the chunks due from the sources of the transfer."""
+        for j, indexes in self.transfer.requests(sources).items():
+            self.send_msg(j, {"chunk_request": {
+                "digest": self.transfer.digest, "indexes": indexes}})
+
+    def member(self):
+        """Tests whether p_i is a member of the current configuration."""
+        conf = as_node_set(self.resolver.recsa_get_config())
+        return conf is not None and self.id in conf
 
     def receive_msg(self, msg):
         """Called whenever a message is received from another processor."""
@@ -83,6 +213,14 @@ class JoiningMechanismModule:
         data = msg["data"]
         if data == "JOIN":
             self.receive_join_request(processor_j)
+        elif "chunk_request" in data:
+            self.receive_chunk_request(processor_j, data["chunk_request"])
+        elif "chunk" in data:
+            self.receive_chunk(processor_j, data["chunk"])
+        elif "chunk_missing" in data:
+            if self.transfer is not None and \
+                    self.transfer.digest == data["chunk_missing"]:
+                self.transfer.source_missing(processor_j)
         else:
             self.receive_response(processor_j, data)
 
@@ -92,8 +230,64 @@ class JoiningMechanismModule:
             return
         if sender in self.resolver.recsa_get_fd_part_j(self.id):
             return
-        if (self.id in self.resolver.recsa_get_config()) and self.resolver.recsa_allow_reco() == True:
-            self.send_response(sender)
+        if self.member():
+            with self.requests_lock:
+                self.requests.setdefault(sender, self.clock())
+            if self.batch_window <= 0:
+                self.answer_join_requests()
+
+    def answer_join_requests(self):
+        """Answers the pending join requests together once the first of them
+        is batch_window seconds old and a reconfiguration is allowed.
+
+        The pass vote is queried once for the whole batch. Requests of
+        processors that are no longer trusted, or became participants, are
+        dropped, as are all of them if p_i is no longer a member. The batch
+        is taken under requests_lock, so that a request received meanwhile
+        is kept for the next one.
+        """
+        if not self.requests or not self.resolver.recsa_allow_reco():
+            return
+        with self.requests_lock:
+            if not self.requests or \
+                    self.clock() - min(self.requests.values()) < \
+                    self.batch_window:
+                return
+            joiners = NodeSet(self.requests)
+            self.requests = {}
+        if not self.member():
+            return
+        joiners = (joiners & self.resolver.recsa_get_fd_j(self.id)) - \
+            self.resolver.recsa_get_fd_part_j(self.id)
+        passed = self.pass_query()
+        state = self.offer_snapshot() if passed else BOTTOM
+        logger.debug(f"Answering join requests of {joiners}: {passed}")
+        for j in joiners:
+            self.send_response(j, passed, state)
+
+    def receive_chunk_request(self, sender, request):
+        """Sends the requested chunks of a snapshot offered to a joiner."""
+        snapshot = self.snapshots.get(request["digest"])
+        if snapshot is None:
+            self.send_msg(sender, {"chunk_missing": request["digest"]})
+            return
+        for index in request["indexes"]:
+            if 0 <= index < snapshot.chunks:
+                self.send_msg(sender, {"chunk": snapshot.chunk(index)})
+
+    def receive_chunk(self, sender, chunk):
+        """Stores a chunk of the snapshot transferred and requests the next
+        chunks from its sender, so that each source is kept busy."""
+        transfer = self.transfer
+        if transfer is None or transfer.digest != chunk["digest"]:
+            return
+        received = transfer.receive(sender, chunk)
+        if received is not None:
+            snapshot_bytes.labels(self.id).inc(received)
+        else:
+            logger.warning(f"Chunk {chunk['index']} from {sender} corrupted")
+        if not transfer.complete():
+            self.request_chunks(NodeSet([sender]))
 
     def receive_response(self, sender, data):
         """Called whenever a received message is a response to a join request."""
@@ -117,24 +311,39 @@ class JoiningMechanismModule:
         self.resolver.send_to_node(receiver, msg)
         self.msgs_sent += 1
 
-    def send_response(self, receiver):
-        """Sends a response to a join request from another processor."""
+    def send_response(self, receiver, passed, state=BOTTOM):
+        """Sends a response to a join request from another processor, with
+        the metadata of the snapshot offered."""
+        self.send_msg(receiver, {"pass": passed, "state": state})
 
-        # construct msg and send to other processor through resolver
+    def offer_snapshot(self):
+        """Returns the metadata of a snapshot of the application state of
+        p_i, BOTTOM if it has none."""
+        state = self.resolver.abd_get_state()
+        if state is None:
+            return BOTTOM
+        return self.snapshots.offer(state)
+
+    def send_msg(self, receiver, data):
+        """Sends a message of the module to another processor."""
         msg = {
             "type": MessageType.JOINING_MECHANISM_MESSAGE,
             "sender": self.id,
-            "data": {
-                "pass": self.pass_query(),
-                "state": self.state[self.id]
-            }
+            "data": data
         }
         self.resolver.send_to_node(receiver, msg)
         self.msgs_sent += 1
 
     def get_data(self):
         """Called by the API, used to expose data to 3rd party services."""
+        transfer = self.transfer
         return {
             "pass": self.passs,
-            "state": self.state
+            "state": self.state,
+            "snapshot": None if transfer is None else {
+                "digest": transfer.digest,
+                "size": transfer.size,
+                "received": transfer.received(),
+                "sources": transfer.sources.to_list()
+            }
         }
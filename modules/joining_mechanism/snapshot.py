@@ -0,0 +1,217 @@
+"""Contains the snapshot transfer of the application state to joiners.
+
+A configuration member offers a snapshot of its application state in its
+response to a join request, identified by a digest of the whole snapshot.
+The joiner fetches the snapshot in chunks, each with a checksum of its own,
+from all members that offer the same digest in parallel. Chunks that are
+lost, corrupted or not delivered in time are requested again, possibly from
+another member, and the chunks received survive an interruption of the
+transfer.
+"""
+
+# standard
+import base64
+import collections
+import hashlib
+import json
+import logging
+from threading import Lock
+
+# local
+from modules.constants import (SNAPSHOT_CHUNK_SIZE, SNAPSHOT_WINDOW,
+                               SNAPSHOT_CHUNK_TIMEOUT, SNAPSHOT_CACHE)
+from modules.nodeset import NodeSet
+
+# globals
+logger = logging.getLogger(__name__)
+
+
+def checksum(data):
+    """Returns the checksum of a chunk."""
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+class Snapshot:
+    """Application state encoded as bytes and split into chunks.
+
+    The state must be JSON serializable. meta() describes the snapshot in
+    a response to a join request.
+    """
+
+    def __init__(self, data, chunk_size=SNAPSHOT_CHUNK_SIZE):
+        """Initializes the snapshot of the encoded state data."""
+        self.data = data
+        self.chunk_size = chunk_size
+        self.digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        self.chunks = max(1, -(-len(data) // chunk_size))
+
+    @classmethod
+    def of(cls, state, chunk_size=SNAPSHOT_CHUNK_SIZE):
+        """Returns the snapshot of application state state."""
+        data = json.dumps(state, sort_keys=True).encode()
+        return cls(data, chunk_size)
+
+    def state(self):
+        """Returns the application state the snapshot holds."""
+        return json.loads(self.data.decode())
+
+    def meta(self):
+        return {"digest": self.digest, "size": len(self.data),
+                "chunks": self.chunks}
+
+    def chunk(self, index):
+        """Returns the message data of chunk index."""
+        piece = self.data[index * self.chunk_size:
+                          (index + 1) * self.chunk_size]
+        return {"digest": self.digest, "index": index,
+                "data": base64.b64encode(piece).decode(),
+                "checksum": checksum(piece)}
+
+
+class SnapshotCache:
+    """The snapshots a member offered last, by digest."""
+
+    def __init__(self, size=SNAPSHOT_CACHE):
+        self.size = size
+        self.snapshots = collections.OrderedDict()
+
+    def offer(self, state):
+        """Returns the metadata of the snapshot of state and keeps it."""
+        snapshot = Snapshot.of(state)
+        self.snapshots.pop(snapshot.digest, None)
+        self.snapshots[snapshot.digest] = snapshot
+        while len(self.snapshots) > self.size:
+            self.snapshots.popitem(last=False)
+        return snapshot.meta()
+
+    def get(self, digest):
+        return self.snapshots.get(digest)
+
+
+class SnapshotTransfer:
+    """Transfer of one snapshot to a joiner, see module docstring.
+
+    clock returns the current time. At most window chunks are requested
+    from a source at a time. A chunk not received timeout seconds after it
+    was requested is requested again. The source it timed out at is only
+    used again once it delivers a chunk, or no other source is left.
+
+    Chunks are received by the receiving thread while the Joining
+    Mechanism requests them, the state of the transfer is guarded by lock.
+    """
+
+    def __init__(self, meta, clock, window=SNAPSHOT_WINDOW,
+                 timeout=SNAPSHOT_CHUNK_TIMEOUT):
+        """Initializes the transfer of the snapshot described by meta."""
+        self.digest = meta["digest"]
+        self.size = meta["size"]
+        self.chunks = meta["chunks"]
+        self.clock = clock
+        self.window = window
+        self.timeout = timeout
+        self.started = clock()
+        self.pieces = {}  # index -> bytes received
+        self.requested = {}  # index -> tuple (source, time) requested
+        self.sources = NodeSet()  # members offering the snapshot
+        self.missing_at = NodeSet()  # sources that no longer have it
+        self.timed_out = NodeSet()  # sources a chunk timed out at
+        self.corrupted = 0
+        self.assembled = None  # Snapshot once assembled and verified
+        self.lock = Lock()
+
+    def complete(self):
+        with self.lock:
+            return len(self.pieces) == self.chunks
+
+    def received(self):
+        """Returns the number of bytes received."""
+        with self.lock:
+            return sum(len(piece) for piece in self.pieces.values())
+
+    def requests(self, sources=None):
+        """Returns dict source -> indexes of the chunks to request now.
+
+        The chunks that were not requested yet, or timed out, are spread
+        over the sources, or the given subset of them, up to the window of
+        each source.
+        """
+        with self.lock:
+            now = self.clock()
+            for index, (source, at) in list(self.requested.items()):
+                if now - at >= self.timeout:
+                    del self.requested[index]
+                    self.timed_out = self.timed_out.with_node(source)
+            usable = self.sources - self.missing_at
+            if usable - self.timed_out:
+                usable -= self.timed_out
+            if sources is not None:
+                usable &= sources
+            if not usable:
+                return {}
+            load = collections.Counter(s for s, _ in self.requested.values())
+            free = {s: self.window - load[s] for s in usable
+                    if load[s] < self.window}
+            todo = (i for i in range(self.chunks)
+                    if i not in self.pieces and i not in self.requested)
+            result = {}
+            while free:
+                for source in list(free):
+                    index = next(todo, None)
+                    if index is None:
+                        return result
+                    result.setdefault(source, []).append(index)
+                    self.requested[index] = (source, now)
+                    free[source] -= 1
+                    if free[source] == 0:
+                        del free[source]
+            return result
+
+    def receive(self, source, chunk):
+        """Stores a received chunk.
+
+        Returns the number of bytes stored, 0 for a chunk received before,
+        and None if the chunk is corrupted.
+        """
+        with self.lock:
+            index = chunk["index"]
+            if self.requested.get(index, (None,))[0] == source:
+                del self.requested[index]
+            if not 0 <= index < self.chunks or index in self.pieces:
+                return 0
+            try:
+                piece = base64.b64decode(chunk["data"])
+            except (ValueError, TypeError):
+                piece = None
+            if piece is None or checksum(piece) != chunk["checksum"]:
+                self.corrupted += 1
+                return None
+            self.pieces[index] = piece
+            self.timed_out -= NodeSet([source])
+            return len(piece)
+
+    def source_missing(self, source):
+        """Called when source no longer has the snapshot."""
+        with self.lock:
+            self.missing_at = self.missing_at.with_node(source)
+            for index, (s, _) in list(self.requested.items()):
+                if s == source:
+                    del self.requested[index]
+
+    def snapshot(self):
+        """Returns the assembled Snapshot, or None if it is not complete.
+
+        If the assembled snapshot does not match the digest, all chunks
+        are discarded and requested again.
+        """
+        with self.lock:
+            if self.assembled is not None or len(self.pieces) != self.chunks:
+                return self.assembled
+            data = b"".join(self.pieces[i] for i in range(self.chunks))
+            snapshot = Snapshot(data)
+            if snapshot.digest != self.digest or len(data) != self.size:
+                logger.warning(f"Snapshot {self.digest} corrupted, restarting")
+                self.pieces = {}
+                self.corrupted += 1
+                return None
+            self.assembled = snapshot
+            return snapshot
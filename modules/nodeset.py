@@ -0,0 +1,195 @@
+"""Contains an immutable set of processor ids represented as a bitmask."""
+
+# standard
+import re
+
+# globals
+_ONE = re.compile("1")
+_popcount = getattr(int, "bit_count", lambda mask: bin(mask).count("1"))
+
+
+class NodeSet:
+    """Immutable set of processor ids, bit k of mask is set if k is in it.
+
+    Equality, hashing, union, intersection and difference are single integer
+    operations. Iteration yields ids in increasing order. Comparison
+    operators test for subsets like for sets, lex_lt() compares the sorted
+    ids lexicographically, like sorted lists would be. For compatibility
+    with code and tests using lists and sets of ids, a NodeSet compares
+    equal to a list or set containing the same ids.
+
+    Lists of ids are the wire format, see to_wire() and from_wire().
+    """
+
+    __slots__ = ("mask",)
+
+    def __init__(self, ids=()):
+        """Initializes the set from an iterable of non-negative int ids."""
+        mask = 0
+        for k in ids:
+            if type(k) is not int or k < 0:
+                raise ValueError(f"Invalid processor id {k!r}")
+            mask |= 1 << k
+        object.__setattr__(self, "mask", mask)
+
+    @classmethod
+    def from_mask(cls, mask):
+        """Returns the NodeSet with the given bitmask."""
+        node_set = cls.__new__(cls)
+        object.__setattr__(node_set, "mask", mask)
+        return node_set
+
+    @classmethod
+    def of(cls, ids):
+        """Returns ids as a NodeSet, without copying if it already is one."""
+        if isinstance(ids, cls):
+            return ids
+        return cls(ids)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("NodeSet is immutable")
+
+    def __reduce__(self):
+        return (NodeSet.from_mask, (self.mask,))
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __len__(self):
+        return _popcount(self.mask)
+
+    def __bool__(self):
+        return self.mask != 0
+
+    def __contains__(self, k):
+        return type(k) is int and k >= 0 and (self.mask >> k) & 1 == 1
+
+    def __or__(self, other):
+        return NodeSet.from_mask(self.mask | NodeSet.of(other).mask)
+
+    def __and__(self, other):
+        return NodeSet.from_mask(self.mask & NodeSet.of(other).mask)
+
+    def __sub__(self, other):
+        return NodeSet.from_mask(self.mask & ~NodeSet.of(other).mask)
+
+    __ror__ = __or__
+    __rand__ = __and__
+
+    def with_node(self, k):
+        """Returns the set with processor k added."""
+        return NodeSet.from_mask(self.mask | 1 << k)
+
+    def issubset(self, other):
+        """Returns True if all ids in this set are in other."""
+        return self.mask & ~NodeSet.of(other).mask == 0
+
+    def __eq__(self, other):
+        if isinstance(other, NodeSet):
+            return self.mask == other.mask
+        if isinstance(other, (list, set)):
+            try:
+                return self.mask == NodeSet(other).mask
+            except ValueError:
+                return False
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.mask)
+
+    def __le__(self, other):
+        if not isinstance(other, NodeSet):
+            return NotImplemented
+        return self.issubset(other)
+
+    def __lt__(self, other):
+        if not isinstance(other, NodeSet):
+            return NotImplemented
+        return self.mask != other.mask and self.issubset(other)
+
+    def __ge__(self, other):
+        if not isinstance(other, NodeSet):
+            return NotImplemented
+        return other.issubset(self)
+
+    def __gt__(self, other):
+        if not isinstance(other, NodeSet):
+            return NotImplemented
+        return self.mask != other.mask and other.issubset(self)
+
+    def lex_lt(self, other):
+        """Returns True if the sorted ids of self precede those of other."""
+        diff = self.mask ^ other.mask
+        if diff == 0:
+            return False
+        # ids below the lowest differing id are shared by both sets
+        low = (diff & -diff).bit_length() - 1
+        if (self.mask >> low) & 1:
+            # other continues with a larger id or is a prefix of self
+            return (other.mask >> (low + 1)) != 0
+        return (self.mask >> (low + 1)) == 0
+
+    def __repr__(self):
+        return f"NodeSet({list(self)})"
+
+    def to_list(self):
+        """Returns the ids as a sorted list."""
+        # bit k is character k of the reversed binary representation
+        bits = bin(self.mask)[:1:-1]
+        if 8 * len(self) >= len(bits):
+            return [k for k, bit in enumerate(bits) if bit == "1"]
+        return [match.start() for match in _ONE.finditer(bits)]
+
+
+def to_wire(value):
+    """Converts a NodeSet in a value to a list, leaves other values as is.
+
+    Converts the set of a (phase, set) notification as well.
+    """
+    if isinstance(value, NodeSet):
+        return value.to_list()
+    if isinstance(value, tuple):
+        return tuple(to_wire(v) for v in value)
+    return value
+
+
+def from_wire(value, n=None):
+    """Converts the lists in a value received from another node to NodeSets.
+
+    Raises ValueError if a list contains an invalid processor id, or an id
+    of n or more if n is given. The ids should be bounded by the number of
+    processors, since a NodeSet of a huge id takes as much memory.
+    """
+    if isinstance(value, (list, set, frozenset)):
+        if n is not None:
+            for k in value:
+                if type(k) is int and k >= n:
+                    raise ValueError(f"Invalid processor id {k!r}")
+        return NodeSet(value)
+    if isinstance(value, tuple):
+        return tuple(from_wire(v, n) for v in value)
+    return value
+
+
+def as_node_set(value):
+    """Returns value as a NodeSet, or None if it is not a set of ids.
+
+    Used where a value may also be a marker such as BOTTOM or
+    NOT_PARTICIPANT instead of a set of processors.
+    """
+    if isinstance(value, NodeSet):
+        return value
+    if isinstance(value, (list, set, frozenset, tuple)):
+        try:
+            return NodeSet(value)
+        except ValueError:
+            return None
+    return None
+
+
+def same_ids(a, b):
+    """Returns True if a and b are sets of the same ids or equal markers."""
+    a_set, b_set = as_node_set(a), as_node_set(b)
+    if a_set is None or b_set is None:
+        return a == b
+    return a_set == b_set
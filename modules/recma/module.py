@@ -2,32 +2,67 @@
 
 # standard
 import logging
+import threading
 import time
 import datetime
 
 # local
-from modules.constants import RUN_SLEEP, BOTTOM
+from modules.constants import (RUN_SLEEP, BOTTOM, GOSSIP_MAX_BACKOFF,
+                               RECSA_FD_POLL_INTERVAL, RECMA_MIN_INTERVAL,
+                               RECMA_REFRESH_PERIOD)
+from modules.nodeset import NodeSet, as_node_set, same_ids
+from modules.recma.policies import TrustPolicy
 from resolve.enums import MessageType
+from metrics.recma import backoff, flag_latency
 
 # globals
 logger = logging.getLogger(__name__)
 
 
 class RecMAModule:
-    """RecMA module"""
+    """RecMA module
+
+    Iterations run every RUN_SLEEP seconds. While p_i raises no flag, a
+    reconfiguration would be allowed and the trusted set did not change,
+    the interval is doubled after every iteration, up to GOSSIP_MAX_BACKOFF
+    times. It snaps back as soon as a flag received from another processor
+    changes or the trusted set changes, which also starts an iteration
+    after at least RECMA_MIN_INTERVAL seconds.
+
+    The flags of p_i are sent to a participant when they differ from the
+    ones sent to it last, and otherwise every RECMA_REFRESH_PERIOD
+    iterations, so that lost messages and corrupted state are repaired.
+
+    Whether p_i suggests a reconfiguration, and the set it proposes once a
+    majority of the trusted members agree, is decided by the policy, see
+    modules.recma.policies.
+    """
+
+    adaptive_backoff = True  # lengthen the interval while quiescent
+    change_only = True  # send unchanged flags every RECMA_REFRESH_PERIOD
 
     # TODO look into quorum size
-    def __init__(self, id, resolver, n, quorum_size=None):
+    def __init__(self, id, resolver, n, quorum_size=None, policy=None):
         """Initializes the module."""
         self.resolver = resolver
+        self.policy = policy if policy is not None else TrustPolicy()
         self.id = id
         self.number_of_nodes = n
         self.msgs_sent = 0
+        self.wakeup = threading.Event()  # set when a received flag changed
+        self.trusted_version = None  # FD version read by the last iteration
+        self.trusted = None  # FD[i] of RecSA read by the last iteration
+        self.participants = None  # FD[i].part read by the last iteration
+        self.backoff = 1  # factor RUN_SLEEP is lengthened by
+        self.iterations = 0
+        self.flags = None  # flags of p_i sent last, see flags_of()
+        self.changed_at = time.monotonic()  # time the flags of p_i last changed
+        self.sent = {}  # receiver -> (flags, iteration) sent last
 
         # Algorithm variables:
         self.need_reconf = {}  # Dict where key is id and value is bool
         self.no_maj = {}  # Dict where key is id and value is bool
-        self.prev_config = []
+        self.prev_config = NodeSet()
         self.quorum_size = quorum_size if quorum_size is not None else (n + 1) / 2
 
     # GETTERS for safe access to local dictionary variables:
@@ -42,20 +77,26 @@ class RecMAModule:
     def eval_config(self, conf):
         """ Evaluates the current configuration (conf).
             The criteria for predicting the need of a configuration can be
-            chosen based on the application and other circumstances.
-            Here, we suggest a reconfiguration if a quarter of the members are
-            not trusted. This criterion is suggested as a simple example by the
-            paper.
+            chosen based on the application and other circumstances, and are
+            given by the policy. By default, we suggest a reconfiguration if a
+            quarter of the members are not trusted. This criterion is
+            suggested as a simple example by the paper.
 
         Returns:
             bool: True if a reconfiguration is suggested, False otherwise.
         """
-        num_trusted = len([j for j in conf if j in self.resolver.recsa_get_fd_j(self.id)])
-        num_members = len(conf)
-        return num_trusted < (3 * (num_members / 4)) or (num_trusted < self.quorum_size)
+        return self.policy.need_reconf(self, conf)
+
+    def peek_config(self, conf):
+        """Returns eval_config(conf) without changing the policy state."""
+        return self.policy.peek(self, conf)
 
     # MACROS:
 
+    def members(self, conf):
+        """Returns the members of conf, none if conf is BOTTOM or #."""
+        return as_node_set(conf) or NodeSet()
+
     def core(self):
         """
         Returns the intersection of the FD readings that p_i has for the
@@ -64,19 +105,38 @@ class RecMAModule:
         fd_i_part = self.resolver.recsa_get_fd_part_j(self.id)
         print(fd_i_part)
         if not fd_i_part:
-            return []
+            return NodeSet()
         else:
-            core_set = set(self.resolver.recsa_get_fd_part_j(fd_i_part[0]))
-            for j in fd_i_part[1:]:
-                fd_j_part = set(self.resolver.recsa_get_fd_part_j(j))
-                core_set = core_set & fd_j_part
-            return list(core_set)
+            processors = iter(NodeSet.of(fd_i_part))
+            core_set = NodeSet.of(
+                self.resolver.recsa_get_fd_part_j(next(processors)))
+            for j in processors:
+                core_set &= self.resolver.recsa_get_fd_part_j(j)
+            return core_set
+
+    def flags_of(self, j):
+        """Returns tuple (no_maj, need_reconf) of p_j."""
+        return (self.get_no_maj_j(j), self.get_need_reconf_j(j))
+
+    def send_due(self, receiver):
+        """Tests whether the flags of p_i are to be sent to receiver."""
+        if not self.change_only:
+            return True
+        sent = self.sent.get(receiver)
+        return sent is None or sent[0] != self.flags or \
+            self.iterations - sent[1] >= RECMA_REFRESH_PERIOD
 
     def flush_flags(self):
+        """Resets the flags of the trusted processors.
+
+        The flags of p_i are then due to every receiver, which flush theirs
+        as well, see send_due().
+        """
         fd_i = self.resolver.recsa_get_fd_j(self.id)
         for j in fd_i:
             self.need_reconf[j] = False
             self.no_maj[j] = False
+        self.sent = {}
 
     def run(self, testing=False):
         """ The main loop of the Reconfiguration Management module """
@@ -85,74 +145,169 @@ class RecMAModule:
         while not testing and not self.resolver.system_running():
             time.sleep(0.1)
  
-        # Algorithm 3.2 in the technical report
         while True:
-            # line 7:
-            if self.id in self.resolver.recsa_get_fd_part_j(self.id):
-
-                # line 8:
-                cur_config = self.resolver.recsa_get_config()
+            started = time.monotonic()
+            self.run_iteration()
+            logger.debug(f"Another iteration of main RecMA loop completed") 
+            self.wait_for_input(started)
+
+    def notify(self):
+        """Snaps the interval between iterations back to RUN_SLEEP."""
+        self.reset_backoff()
+        self.wakeup.set()
+
+    def quiescent(self):
+        """Tests whether p_i raises no flag, reconfiguration is allowed and
+        the policy waits for no change, see TrustPolicy.quiescent()."""
+        return not self.get_need_reconf_j(self.id) and \
+            not self.get_no_maj_j(self.id) and \
+            self.resolver.recsa_allow_reco() and self.policy.quiescent()
+
+    def run_iteration(self):
+        """Runs an iteration and updates the backoff."""
+        self.wakeup.clear()
+        version = self.resolver.fd_get_trusted_snapshot()[0]
+        trusted = self.resolver.recsa_get_fd_j(self.id)
+        participants = self.resolver.recsa_get_fd_part_j(self.id)
+        fd_stable = version == self.trusted_version and \
+            trusted == self.trusted and participants == self.participants
+        self.trusted_version = version
+        self.trusted = trusted
+        self.participants = participants
+        self.iterate()
+        if not self.adaptive_backoff or self.wakeup.is_set():
+            return
+        if not fd_stable or not self.quiescent():
+            self.reset_backoff()
+        elif self.backoff < GOSSIP_MAX_BACKOFF:
+            self.set_backoff(self.backoff * 2)
+
+    def reset_backoff(self):
+        """Snaps the interval between iterations back to RUN_SLEEP."""
+        if self.backoff != 1:
+            self.set_backoff(1)
+
+    def set_backoff(self, factor):
+        """Sets the factor RUN_SLEEP is lengthened by."""
+        logger.debug(f"RecMA backoff set to {factor}")
+        self.backoff = factor
+        backoff.labels(self.id).set(factor)
+
+    def trusted_changed(self):
+        """Tests whether the trusted set changed since the last iteration.
+
+        Both the FD and FD[i] of the RecSA view are checked, as RecSA may
+        publish the change after RecMA read it from the FD. A processor that
+        joins or leaves the participants FD[i].part counts as a change.
+        """
+        return self.resolver.fd_get_trusted_snapshot()[0] != \
+            self.trusted_version or \
+            self.resolver.recsa_get_fd_j(self.id) != self.trusted or \
+            self.resolver.recsa_get_fd_part_j(self.id) != self.participants
 
-                # line 9:
-                self.need_reconf[self.id] = False
-                self.no_maj[self.id] = False
+    def wait_for_input(self, started):
+        """Blocks until the iteration after the one started at started is due.
 
-                # line 10:
-                if (set(self.prev_config) != set(cur_config)) and \
-                    (self.prev_config != BOTTOM):
+        Waits RECMA_MIN_INTERVAL, and then up to RUN_SLEEP times the backoff
+        unless a received flag or the trusted set changes.
+        """
+        time.sleep(max(0, started + RECMA_MIN_INTERVAL - time.monotonic()))
+        deadline = started + RUN_SLEEP * self.backoff
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if self.trusted_changed():
+                self.reset_backoff()
+                return
+            if self.wakeup.wait(min(remaining, RECSA_FD_POLL_INTERVAL)):
+                return
+
+    def iterate(self):
+        """Runs one iteration of the do-forever loop of Algorithm 3.2."""
+        self.iterations += 1
+
+        # line 7:
+        if self.id in self.resolver.recsa_get_fd_part_j(self.id):
+
+            # line 8:
+            cur_config = self.resolver.recsa_get_config()
+
+            # line 9:
+            self.need_reconf[self.id] = False
+            self.no_maj[self.id] = False
+
+            # line 10:
+            if (not same_ids(self.prev_config, cur_config)) and \
+                (self.prev_config != BOTTOM):
+                self.flush_flags()
+
+            # line 11:
+            if self.resolver.recsa_allow_reco():
+
+                # line 12:
+                self.prev_config = cur_config
+                members = self.members(cur_config)
+                trusted_members = members & self.resolver.recsa_get_fd_j(self.id)
+
+                # line 13:
+                self.no_maj[self.id] = \
+                    len(trusted_members) < ((len(members) // 2) + 1)
+                if self.no_maj[self.id]:
+                    logger.debug("no_maj detected! Here is everyones no_maj:",
+                            self.no_maj)
+
+                # lines 14-16:
+                core = self.core() if self.get_no_maj_j(self.id) else NodeSet()
+                if (len(core) > 1) and \
+                    (len([k for k in core if self.get_no_maj_j(k)]) > 0):
+                    self.resolver.recsa_estab(self.resolver.recsa_get_fd_part_j(self.id))
                     self.flush_flags()
 
-                # line 11:
-                if self.resolver.recsa_allow_reco():
-
-                    # line 12:
-                    self.prev_config = cur_config
-
-                    # line 13:
-                    self.no_maj[self.id] = \
-                        len([j for j in cur_config if j in self.resolver.recsa_get_fd_j(self.id)]) \
-                        < ((len(cur_config) // 2) + 1)
-                    if self.no_maj[self.id]:
-                        logger.debug("no_maj detected! Here is everyones no_maj:",
-                                self.no_maj)
-
-                    # lines 14-16:
-                    if self.get_no_maj_j(self.id) and (len(self.core()) > 1) and \
-                        (len([k for k in self.core() if self.get_no_maj_j(k)]) > 0):
-                        self.resolver.recsa_estab(self.resolver.recsa_get_fd_part_j(self.id))
+                # lines 17-19:
+                else:
+                    self.need_reconf[self.id] = self.eval_config(cur_config)
+                    if self.need_reconf[self.id]:
+                        logger.debug("need_reconf detected! Here is everyones need_reconf:",
+                                self.need_reconf)
+                    if self.get_need_reconf_j(self.id) and \
+                        (len([j for j in trusted_members if
+                            self.get_need_reconf_j(j)])
+                        > (len(members) // 2)):
+                        self.resolver.recsa_estab(self.policy.proposal(self))
                         self.flush_flags()
 
-                    # lines 17-19:
-                    else:
-                        self.need_reconf[self.id] = self.eval_config(cur_config)
-                        if self.need_reconf[self.id]:
-                            logger.debug("need_reconf detected! Here is everyones need_reconf:",
-                                    self.need_reconf)
-                        if self.get_need_reconf_j(self.id) and \
-                            (len([j for j in cur_config if
-                                (j in self.resolver.recsa_get_fd_j(self.id))
-                                and self.get_need_reconf_j(j)])
-                            > (len(cur_config) // 2)):
-                            self.resolver.recsa_estab(self.resolver.recsa_get_fd_part_j(self.id))
-                            self.flush_flags()
-
-                # line 20:
-                for j in self.resolver.recsa_get_fd_part_j(self.id):
+            # line 20:
+            flags = self.flags_of(self.id)
+            if flags != self.flags:
+                self.flags = flags
+                self.changed_at = time.monotonic()
+            for j in self.resolver.recsa_get_fd_part_j(self.id):
+                if self.send_due(j):
                     self.send_state(j)
-            else:
-                logger.debug(f"RecMA did not perform its loop because not participant. Participants: {self.resolver.recsa_get_fd_part_j(self.id)}")
-
-            logger.debug(f"Another iteration of main RecMA loop completed") 
-            time.sleep(RUN_SLEEP)
+        else:
+            logger.debug(f"RecMA did not perform its loop because not participant. Participants: {self.resolver.recsa_get_fd_part_j(self.id)}")
 
     def receive_msg(self, msg):
-        """Called whenever a message is received from another processor."""
+        """Called whenever a message is received from another processor.
+
+        Snaps the interval back to RUN_SLEEP if a flag of p_j changed.
+        """
         processor_j = msg["sender"]
-        self.no_maj[processor_j] = msg["data"]["no_maj"]
-        self.need_reconf[processor_j] = msg["data"]["need_reconf"]
+        no_maj = msg["data"]["no_maj"]
+        need_reconf = msg["data"]["need_reconf"]
+        if (no_maj, need_reconf) != self.flags_of(processor_j):
+            self.notify()
+        self.no_maj[processor_j] = no_maj
+        self.need_reconf[processor_j] = need_reconf
 
     def send_state(self, receiver):
-        """Sends a token to another processor."""
+        """Sends a token to another processor.
+
+        Records the time from the last change of the flags of p_i to sending
+        them, if receiver was sent other flags before. The time is measured
+        by the local clock only, the delivery delay is not included.
+        """
 
         # don't send to self
         if receiver == self.id:
@@ -168,6 +323,12 @@ class RecMAModule:
             }
         }
         self.resolver.send_to_node(receiver, msg)
+        flags = self.flags_of(self.id)
+        sent = self.sent.get(receiver)
+        if sent is not None and sent[0] != flags:
+            flag_latency.labels(self.id).observe(
+                time.monotonic() - self.changed_at)
+        self.sent[receiver] = (flags, self.iterations)
         self.msgs_sent += 1
 
     def broadcast(self, msg):
@@ -0,0 +1,217 @@
+"""Contains the policies RecMA evaluates the configuration with.
+
+A policy decides whether p_i suggests a reconfiguration (need_reconf) and
+which set it proposes to RecSA once a majority of the trusted members agree.
+The round-trip times the latency-based policies rank processors by are the
+smoothed RTTs of the FD token links, see communication.udp.rtt.
+"""
+
+# standard
+import copy
+import logging
+import math
+import time
+
+# local
+from modules.constants import (RECMA_SLOW_PERCENTILE, RECMA_SLOW_FACTOR,
+                               RECMA_SLOW_EVALUATIONS, JOIN_BATCH_WINDOW,
+                               JOIN_BATCH_MAX_WAIT)
+from modules.nodeset import NodeSet
+
+# globals
+logger = logging.getLogger(__name__)
+
+
+def rtt(recma, j):
+    """Returns the RTT in seconds to p_j, None if not measured yet."""
+    if j == recma.id:
+        return 0.0
+    return recma.resolver.fd_get_rtt(j)
+
+
+def median(values):
+    """Returns the median of a non-empty sorted list."""
+    mid = len(values) // 2
+    if len(values) % 2:
+        return values[mid]
+    return (values[mid - 1] + values[mid]) / 2
+
+
+class TrustPolicy:
+    """Suggests a reconfiguration if a quarter of the members are not trusted.
+
+    This criterion is suggested as a simple example by the paper. The set
+    proposed is the trusted participants of p_i.
+    """
+
+    def need_reconf(self, recma, conf):
+        """Returns True if a reconfiguration of conf is suggested."""
+        members = recma.members(conf)
+        num_trusted = len(members & recma.resolver.recsa_get_fd_j(recma.id))
+        num_members = len(members)
+        return num_trusted < (3 * (num_members / 4)) or \
+            num_trusted < recma.quorum_size
+
+    def peek(self, recma, conf):
+        """Returns need_reconf(recma, conf) without changing the policy.
+
+        Policies replace their attributes rather than modify them in place,
+        so restoring a shallow copy undoes the evaluation.
+        """
+        state = copy.copy(self.__dict__)
+        try:
+            return self.need_reconf(recma, conf)
+        finally:
+            self.__dict__.clear()
+            self.__dict__.update(state)
+
+    def proposal(self, recma):
+        """Returns the set p_i proposes as the new configuration."""
+        return recma.resolver.recsa_get_fd_part_j(recma.id)
+
+    def quiescent(self):
+        """Tests whether RecMA may lengthen the interval between iterations."""
+        return True
+
+
+class LatencyPolicy(TrustPolicy):
+    """Also replaces members whose RTT is persistently in the worst percentile.
+
+    A member is slow in an evaluation if its RTT ranks above the given
+    percentile of the measured members and is at least factor times their
+    median, so that a homogeneous configuration is never shrunk. Members that
+    are slow in the given number of evaluations in a row are left out of the
+    proposal, at most as many as keep a majority of the members and the
+    quorum size.
+    """
+
+    def __init__(self, percentile=RECMA_SLOW_PERCENTILE,
+                 factor=RECMA_SLOW_FACTOR, evaluations=RECMA_SLOW_EVALUATIONS):
+        """Initializes the policy."""
+        if not 0 <= percentile < 1:
+            raise ValueError("Percentile must satisfy 0 <= percentile < 1")
+        self.percentile = percentile
+        self.factor = factor
+        self.evaluations = evaluations
+        self.slow_count = {}  # member -> evaluations in a row it was slow
+        self.slow = NodeSet()  # members left out of the proposal
+
+    def slow_members(self, recma, members):
+        """Returns the members that are slow in this evaluation."""
+        measured = sorted((rtt(recma, j), j) for j in members
+                          if rtt(recma, j) is not None)
+        if not measured:
+            return NodeSet()
+        threshold = self.factor * median([r for r, _ in measured])
+        first = math.floor(self.percentile * len(measured))
+        return NodeSet(j for r, j in measured[first:] if r >= threshold)
+
+    def update(self, recma, members):
+        """Counts the evaluations in a row the members were slow in."""
+        slow = self.slow_members(recma, members)
+        self.slow_count = {j: self.slow_count.get(j, 0) + 1 for j in slow}
+        persistent = sorted((j for j, c in self.slow_count.items()
+                             if c >= self.evaluations),
+                            key=lambda j: rtt(recma, j), reverse=True)
+        kept = max(len(members) // 2 + 1, math.ceil(recma.quorum_size))
+        self.slow = NodeSet(persistent[:max(0, len(members) - kept)])
+        if self.slow:
+            logger.debug(f"Members {self.slow} are persistently slow")
+
+    def need_reconf(self, recma, conf):
+        self.update(recma, recma.members(conf))
+        return bool(self.slow) or super().need_reconf(recma, conf)
+
+    def proposal(self, recma):
+        return NodeSet.of(super().proposal(recma)) - self.slow
+
+
+class FastestPolicy(TrustPolicy):
+    """Keeps the configuration at the k fastest trusted participants.
+
+    Replaces the trust criterion, as k may be below the quorum size. Suggests
+    a reconfiguration if a member is not a trusted participant, if the
+    configuration does not have k members while enough trusted participants
+    exist, or if a trusted participant that is not a member has a factor
+    times lower RTT than the slowest member. Participants whose RTT is not
+    measured yet rank after all others.
+    """
+
+    def __init__(self, k, factor=RECMA_SLOW_FACTOR):
+        """Initializes the policy."""
+        if k < 1:
+            raise ValueError("Configuration size k must be at least 1")
+        self.k = k
+        self.factor = factor
+
+    def ranked(self, recma, processors):
+        """Returns the processors ordered from the fastest to the slowest."""
+        def key(j):
+            r = rtt(recma, j)
+            return (r is None, r or 0, j)
+        return sorted(processors, key=key)
+
+    def need_reconf(self, recma, conf):
+        members = recma.members(conf)
+        candidates = self.candidates(recma)
+        if not members:
+            return bool(candidates)
+        if not members.issubset(candidates) or \
+                len(members) != min(self.k, len(candidates)):
+            return True
+        slowest = rtt(recma, self.ranked(recma, members)[-1])
+        outside = self.ranked(recma, candidates - members)
+        fastest = rtt(recma, outside[0]) if outside else None
+        return slowest is not None and fastest is not None and \
+            slowest > self.factor * fastest
+
+    def candidates(self, recma):
+        """Returns the trusted participants of p_i."""
+        return NodeSet.of(super().proposal(recma))
+
+    def proposal(self, recma):
+        return NodeSet(self.ranked(recma, self.candidates(recma))[:self.k])
+
+
+class BatchPolicy(TrustPolicy):
+    """Makes the configuration follow the trusted participants in batches.
+
+    Joins, trusted participants that are not members, and leaves, members
+    that are not trusted participants, are grouped. A reconfiguration to the
+    trusted participants is suggested once they did not change for window
+    seconds, or max_wait seconds after the first join or leave was seen, so
+    that all that arrive within a window of each other are established by
+    one reconfiguration.
+    """
+
+    def __init__(self, window=JOIN_BATCH_WINDOW, max_wait=JOIN_BATCH_MAX_WAIT,
+                 clock=time.monotonic):
+        """Initializes the policy, clock returns the current time."""
+        self.window = window
+        self.max_wait = max_wait
+        self.clock = clock
+        self.pending_since = None  # time a join or leave was first seen
+        self.changed_at = None  # time the trusted participants last changed
+        self.participants = None  # trusted participants seen last
+
+    def need_reconf(self, recma, conf):
+        if super().need_reconf(recma, conf):
+            return True
+        participants = NodeSet.of(self.proposal(recma))
+        now = self.clock()
+        if recma.members(conf) == participants:
+            self.pending_since = None
+            self.participants = participants
+            return False
+        if self.pending_since is None:
+            self.pending_since = now
+            self.changed_at = now
+            logger.debug("Join or leave seen, waiting for the batch")
+        if participants != self.participants:
+            self.participants = participants
+            self.changed_at = now
+        return now - self.changed_at >= self.window or \
+            now - self.pending_since >= self.max_wait
+
+    def quiescent(self):
+        return self.pending_since is None
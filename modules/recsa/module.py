@@ -1,39 +1,256 @@
 """Contains code related to the RecMA module."""
 
 # standard
+import functools
+import hashlib
 import logging
 import time
 import datetime
+import threading
+import types
 
 # local
-from modules.constants import RUN_SLEEP, BOTTOM, NOT_PARTICIPANT
+from modules.constants import (BOTTOM, NOT_PARTICIPANT, RECSA_MIN_INTERVAL,
+                               RECSA_MAX_INTERVAL, RECSA_FD_POLL_INTERVAL,
+                               RECSA_FULL_EVALUATION_PERIOD,
+                               RECSA_FULL_STATE_PERIOD, GOSSIP_MAX_BACKOFF)
 import modules.constants as constants
+from modules.nodeset import (NodeSet, as_node_set, same_ids, to_wire,
+                             from_wire)
 from resolve.enums import MessageType
+from metrics.recsa import predicates_skipped, backoff, view_age
 
 # globals
 logger = logging.getLogger(__name__)
 
+# variables holding the state received from p_j, and their message fields
+RECEIVED_STATE = [("fd", "fd"), ("fd_part", "fd_part"), ("config", "config"),
+                  ("prp", "prp"), ("alll", "alll"),
+                  ("echo_part", "echo_fd_part"), ("echo_prp", "echo_prp"),
+                  ("echo_all", "echo_all")]
+SHARED_FIELDS = 5  # the first fields of RECEIVED_STATE are sent to everyone
+
+# inputs of the predicates whose results are reused, see evaluate(): variables
+# of the algorithm, "trusted" for FD[i] and "all_seen"
+PREDICATE_INPUTS = {
+    "stale_info_type_1": ("prp",),
+    "stale_info_type_2": ("config",),
+    "stale_info_type_3": ("trusted", "config", "prp", "alll", "all_seen"),
+    "stale_info_type_4": ("trusted", "config", "fd", "fd_part"),
+    "config_conflict": ("trusted", "config"),
+}
+
+# pairs of degrees that differ by at most one, in mod 6
+OK_DEG_TUPS = frozenset(
+    [frozenset({0, 5}), frozenset({5, 5})] +
+    [frozenset({x, x + 1}) for x in range(0, 5)] +
+    [frozenset({x, x}) for x in range(0, 5)])
+
+
+def canonical(value):
+    """Returns a form of value that is equal for NodeSets and lists of ids."""
+    if isinstance(value, NodeSet):
+        return value.mask
+    if isinstance(value, tuple):
+        return tuple(canonical(v) for v in value)
+    if isinstance(value, (list, set, frozenset)):
+        node_set = as_node_set(value)
+        return repr(value) if node_set is None else node_set.mask
+    return value
+
+
+def digest(values):
+    """Returns a short hash of the sequence values."""
+    data = repr(tuple(canonical(v) for v in values)).encode()
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def state_digest(shared_digest, echo):
+    """Returns the digest of the state sent to one processor.
+
+    shared_digest is the digest of the fields sent to every processor, echo
+    the values of the echo fields sent to this one.
+    """
+    return digest((shared_digest, *echo))
+
+
+class TrackedDict(dict):
+    """Dictionary that counts the changes of its values.
+
+    version is incremented after every assignment that adds a key or
+    replaces a value by an unequal one, and after every removal. Results
+    derived from the dictionary remain valid while its version is unchanged.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+
+    def __setitem__(self, key, value):
+        changed = key not in self or dict.__getitem__(self, key) != value
+        super().__setitem__(key, value)
+        if changed:
+            self.version += 1
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.version += 1
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self.version += 1
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self.version += 1
+        return item
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        super().clear()
+        self.version += 1
+
+
+class RecSAView:
+    """Immutable snapshot of the RecSA state read by the other modules.
+
+    Holds FD[j] and FD[j].part of every processor j, the configuration
+    returned by get_config() and the result of allow_reco(), as computed
+    when the view was published. version is incremented by every
+    publication, published is its time.monotonic().
+    """
+
+    __slots__ = ("version", "published", "fd", "fd_part", "config",
+                 "allow_reco")
+
+    def __init__(self, version, fd, fd_part, config, allow_reco):
+        """Initializes the view, fd and fd_part map ids to sets."""
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "published", time.monotonic())
+        object.__setattr__(self, "fd", types.MappingProxyType(fd))
+        object.__setattr__(self, "fd_part", types.MappingProxyType(fd_part))
+        object.__setattr__(self, "config", config)
+        object.__setattr__(self, "allow_reco", allow_reco)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RecSAView is immutable")
 
-class RecSAModule:
-    """RecSA module"""
+    def get_fd_j(self, j):
+        return self.fd.get(j, NodeSet())
+
+    def get_fd_part_j(self, j):
+        return self.fd_part.get(j, NodeSet())
+
+    def age(self):
+        """Returns the seconds since the view was published."""
+        return time.monotonic() - self.published
+
+
+class IterationContext:
+    """Values derived repeatedly during one iteration of the RecSA loop.
+
+    Holds the trusted set of the failure detector, read once per iteration,
+    and caches values derived from it and the local state, such as FD[i].part,
+    the degrees of notifications and the wire form of the state sent to every
+    trusted processor. The caches are cleared by invalidate() whenever the
+    loop modifies the local state.
+    """
+
+    def __init__(self, fd):
+        """Initializes the context with trusted set fd."""
+        self.fd = fd
+        self.invalidate()
+
+    def invalidate(self):
+        """Clears all values derived from the local state."""
+        self.fd_part = None
+        self.degrees = {}
+        self.pl_ahead = None
+        self.wire_state = None
+        self.shared_digest = None
+
+
+def in_context(method):
+    """Decorates an interface function to run in an iteration context.
+
+    Calls from other modules get a context of their own, such that values
+    derived from the local state are computed once per call, see
+    IterationContext. Calls during an iteration use its context.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.context() is not None:
+            return method(self, *args, **kwargs)
+        self.local.ctx = IterationContext(self.read_trusted())
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.local.ctx = None
+    return wrapper
 
-    def __init__(self, id, resolver, n, init_config=None):
+
+class RecSAModule:
+    """RecSA module
+
+    Sets of processors are stored as NodeSets and sent as lists, see
+    modules.nodeset. An iteration starts upon input, i.e. a changed received
+    state or trusted set, estab(), participate() or a change by the previous
+    iteration, at least min_interval and at most max_interval seconds after
+    the last one. max_interval is doubled while quiescent, up to
+    GOSSIP_MAX_BACKOFF times.
+
+    Received state is buffered in a per-sender inbox and applied at the
+    start of an iteration. estab() and participate() write the state from
+    the RecMA and Joining threads, the iteration they trigger publishes the
+    result as a RecSAView, which the other modules read. Predicates are only
+    re-evaluated when their inputs changed, see evaluate(), and with digests
+    enabled unchanged state is sent as a digest, see send_state().
+    """
+
+    wire_format = True  # False sends NodeSets as is, for in-process transports
+    adaptive_backoff = True  # lengthen max_interval while quiescent
+
+    def __init__(self, id, resolver, n, init_config=None,
+                 min_interval=RECSA_MIN_INTERVAL,
+                 max_interval=RECSA_MAX_INTERVAL, digests=False):
         """Initializes the module."""
         self.resolver = resolver
         self.id = id
         self.number_of_nodes = n
         self.msgs_sent = 0
+        self.local = threading.local()  # context of the running iteration
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.wakeup = threading.Event()  # set upon input relevant to the loop
+        self.trusted_version = None  # FD version read by the last iteration
+        self.backoff = 1  # factor max_interval is lengthened by
+        self.inbox = {}  # Dictionary where key is an id and value is the latest state received
+        self.trusted_memo = (None, NodeSet())  # (FD trusted set, as NodeSet)
+        self.iterations = 0
+        self.predicate_cache = {}  # predicate -> (inputs, result), see evaluate()
+        self.predicates_skipped = 0  # evaluations answered by predicate_cache
+        self.digests = digests  # send digests of unchanged state
+        self.full_sent = {}  # receiver -> (digest, iteration) of last full state
 
         # Algorithm variables:
-        self.config = {}  # Dictionary where key is an id and value is a config (list)
-        self.fd = {self.id: self.resolver.fd_get_trusted()}  # Dictionary where key is an id and value is a list of trusted ids
-        self.fd_part = {self.id: []}  # Dictionary where key is an id and value is a list of trusted participants
-        self.echo_part = {}
-        self.echo_prp = {}
-        self.echo_all = {}
-        self.prp = {}  # Dictionary where key is an id and value is tuple (phase, set). set='BOTTOM' indicates 'no proposal'
-        self.alll = {}  # Dictionary where key is an id and value is a Boolean
-        self.all_seen = set()  # Set of id k for which p_i received the alll[k] indication
+        self.config = TrackedDict()  # Dictionary where key is an id and value is a config (set)
+        self.fd = TrackedDict({self.id: self.read_trusted()})  # Dictionary where key is an id and value is a set of trusted ids
+        self.fd_part = TrackedDict({self.id: NodeSet()})  # Dictionary where key is an id and value is a set of trusted participants
+        self.echo_part = TrackedDict()
+        self.echo_prp = TrackedDict()
+        self.echo_all = TrackedDict()
+        self.prp = TrackedDict()  # Dictionary where key is an id and value is tuple (phase, set). set='BOTTOM' indicates 'no proposal'
+        self.alll = TrackedDict()  # Dictionary where key is an id and value is a Boolean
+        self.all_seen = NodeSet()  # Set of id k for which p_i received the alll[k] indication
         for k in range(self.number_of_nodes):
             self.config[k] = constants.NOT_PARTICIPANT
             self.prp[k] = constants.DFLT_NTF
@@ -41,35 +258,74 @@ class RecSAModule:
             self.echo_part[k] = self.get_fd_part_j(k)
             self.echo_prp[k] = constants.DFLT_NTF
             self.echo_all[k] = False
-
+        self.view = None
+        self.publish()
+        view_age.labels(self.id).set_function(lambda: self.view.age())
 
     # GETTERS for safe access to local dictionary variables:
 
     def get_config_j(self, j):
-        return self.config[j] if j in self.config.keys() else []
+        return self.config[j] if j in self.config.keys() else NodeSet()
 
     def get_fd_j(self, j):
         if j == self.id:
-            return self.resolver.fd_get_trusted()
+            ctx = self.context()
+            if ctx is not None:
+                return ctx.fd
+            return self.read_trusted()
         else:
-            return self.fd[j] if j in self.fd.keys() else []
+            return self.fd[j] if j in self.fd.keys() else NodeSet()
 
     def get_fd_part_j(self, j):
         if j == self.id:
-            fd_part_i = []
-            for pj in self.get_fd_j(self.id):
-                if pj in self.config.keys():
-                    if self.get_config_j(pj) != constants.NOT_PARTICIPANT:
-                        fd_part_i.append(pj)
-            return fd_part_i
+            ctx = self.context()
+            if ctx is None:
+                return self.compute_fd_part_i()
+            if ctx.fd_part is None:
+                ctx.fd_part = self.compute_fd_part_i()
+            return ctx.fd_part
         else:
-            return self.fd_part[j] if j in self.fd_part.keys() else []
+            return self.fd_part[j] if j in self.fd_part.keys() else NodeSet()
+
+    def compute_fd_part_i(self):
+        """Returns the trusted processors that are participants."""
+        mask = 0
+        for pj in self.get_fd_j(self.id):
+            if pj in self.config.keys():
+                if self.get_config_j(pj) != constants.NOT_PARTICIPANT:
+                    mask |= 1 << pj
+        return NodeSet.from_mask(mask)
+
+    def read_trusted(self):
+        """Returns the trusted set of the failure detector as a NodeSet.
+
+        The failure detector hands out the same frozenset until the trusted
+        set changes, so the conversion is done once per change.
+        """
+        trusted = self.resolver.fd_get_trusted()
+        if not isinstance(trusted, frozenset):
+            return NodeSet.of(trusted)
+        memo = self.trusted_memo
+        if memo[0] is not trusted:
+            memo = (trusted, NodeSet(trusted))
+            self.trusted_memo = memo
+        return memo[1]
+
+    def context(self):
+        """Returns the context of the iteration run by this thread, if any."""
+        return getattr(self.local, "ctx", None)
+
+    def invalidate_context(self):
+        """Clears derived values after the local state has been modified."""
+        ctx = self.context()
+        if ctx is not None:
+            ctx.invalidate()
 
     def get_echo_part_j(self, j):
         if j == self.id:
             return self.get_fd_part_j(self.id)
         else:
-            return self.echo_part[j] if j in self.echo_part.keys() else []
+            return self.echo_part[j] if j in self.echo_part.keys() else NodeSet()
 
     def get_echo_prp_j(self, j):
         if j == self.id:
@@ -92,6 +348,7 @@ class RecSAModule:
         # Assumption: a non-reported all[] value should be treated as False.
 
     # INTERFACE FUNCTIONS:
+    @in_context
     def get_config(self):
         """Returns the current quorum configuration, i.e. config[i]
         
@@ -103,6 +360,7 @@ class RecSAModule:
         else:
             return self.get_config_j(self.id)
 
+    @in_context
     def get_config_app(self):
         """Returns the current quorum configuration (config[i]) to application
 
@@ -110,38 +368,46 @@ class RecSAModule:
         proposal. Once participants agree on proposal, returns proposal set U
         current configuration.
         """
+        config_i = self.get_config_j(self.id)
         if self.degree(self.id) in [0, 1, 2]:
-            return self.get_config_j(self.id)
-        else:
-            return list(set(self.get_config_j(self.id)) | set(self.get_prp_j(self.id)[1]))
-
+            return config_i
+        config_set = as_node_set(config_i)
+        prp_set = as_node_set(self.get_prp_j(self.id)[1])
+        if config_set is None or prp_set is None:
+            return config_i
+        return config_set | prp_set
+
+    @in_context
     def allow_reco(self):
-        fd_of_trusted = []
-        part_of_trusted = [set(self.get_fd_part_j(self.id))]
+        trusted_by_all = None  # intersection of the trusted sets of trusted
+        part_i = NodeSet.of(self.get_fd_part_j(self.id))
+        part_stabilized = True
         no_reset = True
         all_dflt_ntf = True
         for j in self.get_fd_j(self.id):
             if j != self.id:
-                fd_of_trusted.append(set(self.get_fd_j(j)))
-                part_of_j = set(self.get_fd_part_j(j)).union(set(self.get_echo_part_j(j)))
-                if part_of_j not in part_of_trusted:
-                    part_of_trusted.append(part_of_trusted)
+                fd_j = NodeSet.of(self.get_fd_j(j))
+                trusted_by_all = fd_j if trusted_by_all is None \
+                    else trusted_by_all & fd_j
+                part_of_j = NodeSet.of(self.get_fd_part_j(j)) | self.get_echo_part_j(j)
+                if part_of_j != part_i:
+                    part_stabilized = False
             if self.get_config_j(j) == constants.BOTTOM:
                 no_reset = False
             if (self.get_prp_j(j) != constants.DFLT_NTF) or \
                   (not self.get_all_j(j)):
                 all_dflt_ntf = False
-        trusted_by_trusted = False if fd_of_trusted == [] \
-            else self.id in set.intersection(*fd_of_trusted)
-        part_stabilized = len(part_of_trusted) == 1
+        trusted_by_trusted = False if trusted_by_all is None \
+            else self.id in trusted_by_all
         all_part_echo = True
         for k in self.get_fd_part_j(self.id):
             if not self.echo_fun(k):
                 all_part_echo = False
-        return (not self.config_conflict()) and self.all_seen_fun() and \
+        return (not self.evaluate("config_conflict")) and self.all_seen_fun() and \
                all_part_echo and trusted_by_trusted and part_stabilized and \
                no_reset and all_dflt_ntf
 
+    @in_context
     def estab(self, s):
         """Interface for RecMA to request configuration update
 
@@ -149,16 +415,36 @@ class RecSAModule:
         must be non-empty and not the same as current conf.
         """
         logger.info("Running estab(set) with set:", s)
-        if self.allow_reco() and (set(s) not in [set(), set(self.get_config_j(self.id))]):
+        proposal = as_node_set(s)
+        if self.allow_reco() and proposal is not None and \
+                (proposal not in [NodeSet(), as_node_set(self.get_config_j(self.id))]):
             logger.info("estab() allowed!")
-            self.prp[self.id] = (1, s)
+            self.prp[self.id] = (1, proposal)
             self.alll[self.id] = False
-            self.all_seen = set()
+            self.all_seen = NodeSet()
+            self.invalidate_context()
+            self.notify()
 
+    @in_context
     def participate(self):
         """Interface for Joining mechanism to request a join for p_i."""
         if self.allow_reco():
             self.config[self.id] = self.chs_config()
+            self.invalidate_context()
+            self.notify()
+
+    @in_context
+    def publish(self):
+        """Publishes a view of the current state, see RecSAView."""
+        fd = dict(self.fd)
+        fd[self.id] = self.get_fd_j(self.id)
+        fd_part = dict(self.fd_part)
+        fd_part[self.id] = self.get_fd_part_j(self.id)
+        allow_reco = self.allow_reco()
+        config = self.chs_config() if allow_reco \
+            else self.get_config_j(self.id)
+        version = 0 if self.view is None else self.view.version + 1
+        self.view = RecSAView(version, fd, fd_part, config, allow_reco)
 
     # MACROS:
     def chs_config(self):
@@ -166,26 +452,36 @@ class RecSAModule:
 
         Returns BOTTOM if no config exists.
         """
-        conf = set()
+        conf = NodeSet()
         for j in self.get_fd_j(self.id):
-            if self.get_config_j(j) != constants.NOT_PARTICIPANT:
-                conf |= set(self.get_config_j(j))
-        if conf == set():
+            config_j = as_node_set(self.get_config_j(j))
+            if config_j is not None:
+                conf |= config_j
+        if not conf:
             return constants.BOTTOM
         else:
-            return list(conf)
+            return conf
 
     def my_alll(self, k):
         """Returns either the value stored in all[k] or if k == i,
         whether there exists p_l one phase "ahead" of p_i
         """
         all_k = self.get_all_j(k)
+        return all_k or ((k == self.id) and self.exists_pl_ahead())
+
+    def exists_pl_ahead(self):
+        """Tests whether some p_l in all_seen is one phase ahead of p_i."""
+        ctx = self.context()
+        if ctx is not None and ctx.pl_ahead is not None:
+            return ctx.pl_ahead
         exists_pl_ahead = False
         ahead = (self.get_prp_j(self.id)[0] + 1) % 3
         for l in self.all_seen:
             if self.get_prp_j(l)[0] == ahead:
                 exists_pl_ahead = True
-        return all_k or ((k == self.id) and exists_pl_ahead)
+        if ctx is not None:
+            ctx.pl_ahead = exists_pl_ahead
+        return exists_pl_ahead
 
     def degree(self, k):
         """Calculates the degree of p_k's most recently received notification
@@ -194,19 +490,21 @@ class RecSAModule:
         participants are using the same notification (0 otherwise), where each
         notification is a configuration replacement proposal.
         """
+        ctx = self.context()
+        if ctx is not None and k in ctx.degrees:
+            return ctx.degrees[k]
         one_if_my_all_k = 1 if self.my_alll(k) else 0
-        return (2 * self.get_prp_j(k)[0]) + one_if_my_all_k
+        degree = (2 * self.get_prp_j(k)[0]) + one_if_my_all_k
+        if ctx is not None:
+            ctx.degrees[k] = degree
+        return degree
 
     def corr_deg(self, k, k_prime):
         """Tests whether p_k and p_k' have degrees that differ by <= 1
 
         Used when considering operations in mod 6
         """
-        ok_deg_tups = [{0, 5}, {5, 5}]
-        for x in range(0, 5):
-            ok_deg_tups.append({x, x+1})
-            ok_deg_tups.append({x, x})
-        return {self.degree(k), self.degree(k_prime)} in ok_deg_tups
+        return frozenset({self.degree(k), self.degree(k_prime)}) in OK_DEG_TUPS
 
     def echo_no_all(self, k):
         """Tests whether p_i was acked by all participants for the values it has sent.
@@ -214,10 +512,11 @@ class RecSAModule:
         Considers just the fields that are related to its own participant set
         and notification.
         """
-        same_fd_part = set(self.get_fd_part_j(self.id)) == set(self.get_echo_part_j(k))
+        same_fd_part = NodeSet.of(self.get_fd_part_j(self.id)) == \
+            NodeSet.of(self.get_echo_part_j(k))
         (phase_i, set_i) = self.get_prp_j(self.id)
         (phase_k, set_k) = self.get_echo_prp_j(k)
-        same_prp = (phase_i == phase_k) and (set(set_i) == set(set_k))
+        same_prp = (phase_i == phase_k) and same_ids(set_i, set_k)
         return same_fd_part and same_prp
 
     def echo_fun(self, k):
@@ -239,6 +538,7 @@ class RecSAModule:
         for k in range(self.number_of_nodes):
             self.config[k] = val
             self.prp[k] = constants.DFLT_NTF
+        self.invalidate_context()
         logger.info(f"Set config to {self.config}")
 
     def increment(self, prp):
@@ -256,7 +556,8 @@ class RecSAModule:
         have finished the current phase.
         """
         return self.get_all_j(self.id) and \
-               (set(self.get_fd_part_j(self.id)) <= (self.all_seen | {self.id}))
+               NodeSet.of(self.get_fd_part_j(self.id)).issubset(
+                   NodeSet.of(self.all_seen).with_node(self.id))
 
     def mod_max(self):
         """Returns maximum phase value of two processors considering mod 3 operations.
@@ -268,7 +569,8 @@ class RecSAModule:
         for k in self.get_fd_part_j(self.id):
             phs.add(self.get_prp_j(k)[0])
         if (1 in phs) and (2 not in phs) and (self.get_prp_j(self.id)[0] != max(phs)):
-            self.all_seen = set()
+            self.all_seen = NodeSet()
+            self.invalidate_context()
             return max(phs)
         else:
             return self.get_prp_j(self.id)[0]
@@ -298,74 +600,229 @@ class RecSAModule:
             time.sleep(0.1)
 
         while True:
-            # Update some local variables
-            # self.fd[self.id] = self.get_fd_j(self.id)
-
-            # Algorithm 3.1 in the technical report
-            # line 22:
-            trusted = self.get_fd_part_j(self.id)
-            for k in range(self.number_of_nodes):
-                if (k not in trusted) and \
-                        ((self.get_config_j(k) != constants.NOT_PARTICIPANT) or (self.get_prp_j(k) != constants.DFLT_NTF)):
-                    self.config[k] = constants.NOT_PARTICIPANT
-                    self.prp[k] = constants.DFLT_NTF
-                    self.resolver.fd_reset_monitor(k)
-
-            # line 23:
-            self.prp[self.id] = self.max_ntf()
-
-            # line 25:
-            all_no_all = True
-            for k in self.get_fd_part_j(self.id):
-                if not self.echo_no_all(k):
-                    all_no_all = False
-            self.alll[self.id] = all_no_all
+            started = time.monotonic()
+            self.run_iteration()
+            logger.debug(f"Another iteration of main RecSA loop completed") 
+            self.wait_for_input(started)
 
-            # line 26:
-            for k in self.get_fd_part_j(self.id):
-                if self.get_all_j(k):
-                    self.all_seen.add(k)
-
-            # line 24:
-            if self.stale_info_type_1() or \
-                    self.stale_info_type_2() or \
-                    self.stale_info_type_3() or \
-                    self.stale_info_type_4() or \
-                    self.no_participants_and_stable_fd_monitors():
-                self.config_set(constants.BOTTOM)
+    def notify(self):
+        """Requests an iteration as soon as min_interval allows."""
+        self.reset_backoff()
+        self.wakeup.set()
 
-            # lines 27-32:
-            if self.no_ntf_arrived():
-                if self.config_conflict():
-                    logger.debug("Stale info (config conflict) found!")
-                    self.config_set(constants.BOTTOM)
-                if (self.get_config_j(self.id) == constants.BOTTOM) and self.fds_stabilized():
-                    self.config_set(self.get_fd_j(self.id))
-            else:
-                if (self.get_prp_j(self.id)[0] == 2) and self.get_all_j(self.id):
-                    self.config[self.id] = self.get_prp_j(self.id)[1]
-                if self.all_seen_fun():
-                    echo_fun_all = True
-                    for k in self.get_fd_part_j(self.id):
-                        if not self.echo_fun(k):
-                            echo_fun_all = False
-                    if echo_fun_all:
-                        (self.prp[self.id], self.alll[self.id]) = self.increment(self.get_prp_j(self.id))
-                        self.all_seen = set()
-
-            # line 33:
-            if self.get_config_j(self.id) != constants.NOT_PARTICIPANT:
-                for j in self.get_fd_j(self.id):
-                    self.send_state(j)
-            else:
-                logger.debug(f"Node not a participant, not sending state")
+    def quiescent(self):
+        """Tests whether no reconfiguration is in progress or pending.
 
-            logger.debug(f"Another iteration of main RecSA loop completed") 
-            time.sleep(RUN_SLEEP)
+        Reads allow_reco from the view published by the last iteration, so
+        that it is not evaluated again outside of an iteration.
+        """
+        return self.get_prp_j(self.id) == constants.DFLT_NTF and \
+            self.view is not None and self.view.allow_reco
+
+    def update_backoff(self):
+        """Doubles the backoff if quiescent, snaps it back otherwise."""
+        if not self.adaptive_backoff:
+            return
+        if not self.quiescent():
+            self.reset_backoff()
+        elif self.backoff < GOSSIP_MAX_BACKOFF:
+            self.set_backoff(self.backoff * 2)
+
+    def reset_backoff(self):
+        """Snaps the interval between iterations back to max_interval."""
+        if self.backoff != 1:
+            self.set_backoff(1)
+
+    def set_backoff(self, factor):
+        """Sets the factor max_interval is lengthened by."""
+        logger.debug(f"RecSA backoff set to {factor}")
+        self.backoff = factor
+        backoff.labels(self.id).set(factor)
+
+    def local_state(self):
+        """Returns the variables of p_i that the other processors observe."""
+        return (self.get_config_j(self.id), self.get_prp_j(self.id),
+                self.get_all_j(self.id), self.all_seen)
+
+    def run_iteration(self):
+        """Runs an iteration, requests another if it changed the state.
+
+        Updates the backoff after an iteration without any change.
+        """
+        self.wakeup.clear()
+        version = self.resolver.fd_get_trusted_snapshot()[0]
+        fd_stable = version == self.trusted_version
+        self.trusted_version = version
+        before = self.local_state()
+        self.iterate()
+        if self.local_state() != before:
+            self.notify()
+        elif fd_stable and not self.wakeup.is_set():
+            self.update_backoff()
+
+    def fd_changed(self):
+        """Tests whether the trusted set changed since the last iteration."""
+        version = self.resolver.fd_get_trusted_snapshot()[0]
+        return version != self.trusted_version
+
+    def wait_for_input(self, started):
+        """Blocks until the iteration after the one started at started is due.
+
+        Waits at least until min_interval has passed, then until notify() is
+        called or the trusted set changes, but no longer than max_interval
+        times the backoff.
+        """
+        time.sleep(max(0, started + self.min_interval - time.monotonic()))
+        deadline = started + self.max_interval * self.backoff
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if self.fd_changed():
+                self.reset_backoff()
+                return
+            if self.wakeup.wait(min(remaining, RECSA_FD_POLL_INTERVAL)):
+                return
+
+    def iterate(self):
+        """Runs one iteration of the do-forever loop of Algorithm 3.1.
+
+        The trusted set of the failure detector is read once, values derived
+        from it are computed at most once between modifications of the local
+        state, see IterationContext. The received state is applied first.
+        """
+        self.iterations += 1
+        if self.iterations % RECSA_FULL_EVALUATION_PERIOD == 0:
+            self.predicate_cache.clear()
+        skipped = self.predicates_skipped
+        self.apply_inbox()
+        self.local.ctx = IterationContext(self.read_trusted())
+        try:
+            self.iterate_in_context()
+            self.publish()
+        finally:
+            self.local.ctx = None
+        predicates_skipped.labels(self.id).inc(
+            self.predicates_skipped - skipped)
+
+    def iterate_in_context(self):
+        """Body of the do-forever loop, see iterate()."""
+        # Update some local variables
+        # self.fd[self.id] = self.get_fd_j(self.id)
+
+        # Algorithm 3.1 in the technical report
+        # line 22:
+        trusted = self.get_fd_part_j(self.id)
+        for k in range(self.number_of_nodes):
+            if (k not in trusted) and \
+                    ((self.get_config_j(k) != constants.NOT_PARTICIPANT) or (self.get_prp_j(k) != constants.DFLT_NTF)):
+                self.config[k] = constants.NOT_PARTICIPANT
+                self.prp[k] = constants.DFLT_NTF
+                self.resolver.fd_reset_monitor(k)
+        self.invalidate_context()
+
+        # line 23:
+        self.prp[self.id] = self.max_ntf()
+        self.invalidate_context()
+
+        # line 25:
+        all_no_all = True
+        for k in self.get_fd_part_j(self.id):
+            if not self.echo_no_all(k):
+                all_no_all = False
+        self.alll[self.id] = all_no_all
+        self.invalidate_context()
 
+        # line 26:
+        for k in self.get_fd_part_j(self.id):
+            if self.get_all_j(k):
+                self.all_seen = NodeSet.of(self.all_seen).with_node(k)
+        self.invalidate_context()
+
+        # line 24:
+        if self.evaluate("stale_info_type_1") or \
+                self.evaluate("stale_info_type_2") or \
+                self.evaluate("stale_info_type_3") or \
+                self.evaluate("stale_info_type_4") or \
+                self.no_participants_and_stable_fd_monitors():
+            self.config_set(constants.BOTTOM)
+
+        # lines 27-32:
+        if self.no_ntf_arrived():
+            if self.evaluate("config_conflict"):
+                logger.debug("Stale info (config conflict) found!")
+                self.config_set(constants.BOTTOM)
+            if (self.get_config_j(self.id) == constants.BOTTOM) and self.fds_stabilized():
+                self.config_set(self.get_fd_j(self.id))
+        else:
+            if (self.get_prp_j(self.id)[0] == 2) and self.get_all_j(self.id):
+                self.config[self.id] = self.get_prp_j(self.id)[1]
+                self.invalidate_context()
+            if self.all_seen_fun():
+                echo_fun_all = True
+                for k in self.get_fd_part_j(self.id):
+                    if not self.echo_fun(k):
+                        echo_fun_all = False
+                if echo_fun_all:
+                    (self.prp[self.id], self.alll[self.id]) = self.increment(self.get_prp_j(self.id))
+                    self.all_seen = NodeSet()
+                    self.invalidate_context()
+
+        # line 33: non-participants send their state too once they trust a
+        # participant. Otherwise the members never echo it or see all[i],
+        # allow_reco() stays false on both sides and no processor can join.
+        # Before that they keep quiet, so that a processor that is slower to
+        # reset does not overwrite the reset of the others while no
+        # participant exists yet
+        if self.get_config_j(self.id) != constants.NOT_PARTICIPANT or \
+                self.get_fd_part_j(self.id):
+            for j in self.get_fd_j(self.id):
+                self.send_state(j)
+        else:
+            logger.debug(f"Node not a participant, not sending state")
 
     # HELPER FUNCTIONS:
 
+    def predicate_inputs(self, name):
+        """Returns the current inputs of predicate name, see PREDICATE_INPUTS.
+
+        Variables are represented by their identity and version. Returns None
+        if an input is not tracked, e.g. a variable replaced by a plain dict.
+        """
+        inputs = []
+        for source in PREDICATE_INPUTS[name]:
+            if source == "trusted":
+                inputs.append(self.get_fd_j(self.id))
+            elif source == "all_seen":
+                if not isinstance(self.all_seen, NodeSet):
+                    return None
+                inputs.append(self.all_seen)
+            else:
+                variable = getattr(self, source)
+                if not isinstance(variable, TrackedDict):
+                    return None
+                inputs.append((id(variable), variable.version))
+        return tuple(inputs)
+
+    def evaluate(self, name):
+        """Returns the result of predicate name.
+
+        The result of the previous evaluation is reused, and counted in
+        predicates_skipped, if none of the inputs of the predicate changed.
+        The cache is cleared every RECSA_FULL_EVALUATION_PERIOD iterations,
+        so a corrupted entry cannot outlive a few iterations.
+        """
+        inputs = self.predicate_inputs(name)
+        if inputs is not None:
+            cached = self.predicate_cache.get(name)
+            if cached is not None and cached[0] == inputs:
+                self.predicates_skipped += 1
+                return cached[1]
+        result = getattr(self, name)()
+        if inputs is not None:
+            self.predicate_cache[name] = (inputs, result)
+        return result
+
     def stale_info_type_1(self):
         """Stale info check - type 1
         
@@ -397,21 +854,20 @@ class RecSAModule:
         synch
         """
         type_3_a = False
-        type_3_b_set = set()
-        prp_sets = []
+        type_3_b_mask = 0
+        prp_sets = set()
         exists_phase_2 = False
         for k in self.get_fd_part_j(self.id):
             if not self.corr_deg(self.id, k):
                 type_3_a = True
             if self.get_prp_j(k)[0] == ((self.get_prp_j(self.id)[0] + 1) % 3):
-                type_3_b_set.add(k)
+                type_3_b_mask |= 1 << k
             prp_k_set = self.get_prp_j(k)[1]
-            if (prp_k_set != constants.BOTTOM) and \
-                  (set(prp_k_set) not in prp_sets):
-                prp_sets.append(set(prp_k_set))
+            if prp_k_set != constants.BOTTOM:
+                prp_sets.add(NodeSet.of(prp_k_set))
             if self.get_prp_j(k)[0] == 2:
                 exists_phase_2 = True
-        type_3_b = not (type_3_b_set <= self.all_seen)
+        type_3_b = not NodeSet.from_mask(type_3_b_mask).issubset(self.all_seen)
         type_3_c = exists_phase_2 and (len(prp_sets) > 1)
         type_3 = type_3_a or type_3_b or type_3_c
         if type_3:
@@ -434,9 +890,10 @@ class RecSAModule:
                     type_4_a = False
         type_4_b = self.get_config_j(self.id) not in [constants.BOTTOM, constants.NOT_PARTICIPANT]
         type_4_c = True
-        for k in self.get_fd_part_j(self.id):
-            if k in self.get_config_j(self.id):
-                type_4_c = False
+        if type_4_b:
+            for k in self.get_fd_part_j(self.id):
+                if k in self.get_config_j(self.id):
+                    type_4_c = False
         type_4 = type_4_a and type_4_b and type_4_c
         if type_4:
             logger.debug("Stale info (type 4) found!")
@@ -444,8 +901,8 @@ class RecSAModule:
 
     def no_participants_and_stable_fd_monitors(self):
         """Tests if we are in the special state where there are no participants and all FD monitors are stable"""
-        if len(self.get_fd_j(self.id)) < 1:
-            return False
+        if len(self.get_fd_j(self.id)) < 1 or self.get_fd_part_j(self.id):
+            return False  # no trusted processor or a trusted participant
         for k in self.get_fd_j(self.id):
             if (not self.resolver.fd_stable_monitor(k)) or (self.get_config_j(k) != constants.NOT_PARTICIPANT):
                 return False
@@ -460,18 +917,16 @@ class RecSAModule:
         return not ntf_arrived
 
     def config_conflict(self):
-        real_configs_found = []
+        real_configs_found = set()
         for k in self.get_fd_j(self.id):
             if self.get_config_j(k) not in [constants.BOTTOM, constants.NOT_PARTICIPANT]:
-                config_k = set(self.get_config_j(k))
-                if config_k not in real_configs_found:
-                    real_configs_found.append(config_k)
+                real_configs_found.add(NodeSet.of(self.get_config_j(k)))
         return len(real_configs_found) > 1
 
     def fds_stabilized(self):
-        fd_i = set(self.get_fd_j(self.id))
-        for j in self.get_fd_j(self.id):
-            if set(self.fd.get(j, [])) != fd_i:
+        fd_i = NodeSet.of(self.get_fd_j(self.id))
+        for j in fd_i:
+            if NodeSet.of(self.fd.get(j, NodeSet())) != fd_i:
                 logger.debug("FDs have not stabilized")
                 return False
         logger.debug("FDs have stabilized!")
@@ -482,41 +937,139 @@ class RecSAModule:
             return s2
         if s2 == constants.BOTTOM:
             return s1
-        s1_sorted = sorted(s1)
-        s2_sorted = sorted(s2)
-        return max(s1_sorted, s2_sorted)
+        s1, s2 = NodeSet.of(s1), NodeSet.of(s2)
+        return s2 if s1.lex_lt(s2) else s1
 
     def receive_msg(self, msg):
-        """Called whenever a message is received from another processor."""
-        self.fd[self.id] = self.get_fd_j(self.id)
+        """Called whenever a message is received from another processor.
 
-        # Update state values
+        Stores the state in the inbox, replacing any state from the same
+        sender that has not been applied yet, see apply_inbox(). A digest is
+        compared to the digest of the state last received from the sender,
+        which is requested if they differ.
+        """
         j = int(msg["sender"])
-        data = msg["data"]
-        self.fd[j] = data["fd"]
-        self.fd_part[j] = data["fd_part"]
-        self.config[j] = data["config"]
-        self.prp[j] = data["prp"]
-        self.alll[j] = data["alll"]
-        self.echo_part[j] = data["echo_fd_part"]
-        self.echo_prp[j] = data["echo_prp"]
-        self.echo_all[j] = data["echo_all"]
+        if msg.get("resend"):
+            self.full_sent.pop(j, None)
+            self.notify()
+            return
+        if "digest" in msg:
+            if msg["digest"] != self.received_digest(j):
+                self.request_state(j)
+            return
+        try:
+            data = {key: from_wire(value, self.number_of_nodes)
+                    for key, value in msg["data"].items()}
+        except ValueError as e:
+            logger.warning(f"Dropping RecSA message from {j}: {e}")
+            return
+        self.inbox[j] = data
+        for name, key in RECEIVED_STATE:
+            variable = getattr(self, name)
+            if j not in variable or variable[j] != data[key]:
+                self.notify()
+                break
+
+    def apply_inbox(self):
+        """Moves the received state into the local variables.
+
+        Each slot is removed with an atomic popitem(), so the receiving
+        thread can keep filling the inbox meanwhile without a lock.
+        """
+        self.fd[self.id] = self.get_fd_j(self.id)
+        while True:
+            try:
+                j, data = self.inbox.popitem()
+            except KeyError:
+                return
+            for name, key in RECEIVED_STATE:
+                getattr(self, name)[j] = data[key]
+
+    def received_digest(self, j):
+        """Returns the digest of the latest state received from p_j.
+
+        Returns None if no state was received from p_j.
+        """
+        data = self.inbox.get(j)
+        try:
+            if data is not None:
+                values = [data[key] for _, key in RECEIVED_STATE]
+            else:
+                values = [getattr(self, name)[j] for name, _ in RECEIVED_STATE]
+        except KeyError:
+            return None
+        return state_digest(digest(values[:SHARED_FIELDS]),
+                            values[SHARED_FIELDS:])
+
+    def request_state(self, j):
+        """Asks p_j to send its state instead of a digest."""
+        msg = {
+            "type": MessageType.RECSA_MESSAGE,
+            "sender": self.id,
+            "resend": True
+        }
+        self.resolver.send_to_node(j, msg)
+
+    def encode(self, value):
+        """Returns value in the format it is sent in, see wire_format."""
+        return to_wire(value) if self.wire_format else value
+
+    def wire_state(self):
+        """Returns the fields of the state sent to every processor."""
+        ctx = self.context()
+        if ctx is not None and ctx.wire_state is not None:
+            return ctx.wire_state
+        wire_state = {
+            "fd": self.encode(self.get_fd_j(self.id)),
+            "fd_part": self.encode(self.get_fd_part_j(self.id)),
+            "config": self.encode(self.get_config_j(self.id)),
+            "prp": self.encode(self.get_prp_j(self.id)),
+            "alll": self.my_alll(self.id)
+        }
+        if ctx is not None:
+            ctx.wire_state = wire_state
+        return wire_state
     
+    def get_shared_digest(self):
+        """Returns the digest of the fields sent to every processor."""
+        ctx = self.context()
+        if ctx is not None and ctx.shared_digest is not None:
+            return ctx.shared_digest
+        shared_digest = digest([
+            self.get_fd_j(self.id), self.get_fd_part_j(self.id),
+            self.get_config_j(self.id), self.get_prp_j(self.id),
+            self.my_alll(self.id)])
+        if ctx is not None:
+            ctx.shared_digest = shared_digest
+        return shared_digest
+
     def send_state(self, receiver):
-        data = {
-            "fd": self.get_fd_j(self.id),
-            "fd_part": self.get_fd_part_j(self.id),
-            "config": self.get_config_j(self.id),
-            "prp": self.get_prp_j(self.id),
-            "alll": self.my_alll(self.id),
-            "echo_fd_part": self.get_fd_part_j(receiver),
-            "echo_prp": self.get_prp_j(receiver),
-            "echo_all": self.get_all_j(receiver)
-        }
+        """Sends the state to p_receiver.
+
+        With digests enabled, only a digest is sent if the state equals the
+        one last sent to p_receiver, unless that was
+        RECSA_FULL_STATE_PERIOD iterations ago or p_receiver requested it.
+        """
+        echo = (self.get_fd_part_j(receiver), self.get_prp_j(receiver),
+                self.get_all_j(receiver))
         msg = {
             "type": MessageType.RECSA_MESSAGE,
-            "sender": self.id,
-            "data": data
+            "sender": self.id
+        }
+        if self.digests:
+            state = state_digest(self.get_shared_digest(), echo)
+            sent = self.full_sent.get(receiver)
+            if sent is not None and sent[0] == state and \
+                    self.iterations - sent[1] < RECSA_FULL_STATE_PERIOD:
+                msg["digest"] = state
+                self.resolver.send_to_node(receiver, msg)
+                return
+            self.full_sent[receiver] = (state, self.iterations)
+        msg["data"] = {
+            **self.wire_state(),
+            "echo_fd_part": self.encode(echo[0]),
+            "echo_prp": self.encode(echo[1]),
+            "echo_all": echo[2]
         }
         self.resolver.send_to_node(receiver, msg)
 
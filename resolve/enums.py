@@ -33,4 +33,5 @@ class MessageType(IntEnum):
     RECSA_MESSAGE = 2
     FAILURE_DETECTOR_MESSAGE = 3
     JOINING_MECHANISM_MESSAGE = 4
-    ABD_MESSAGE = 5 
+    ABD_MESSAGE = 5
+    READY_MESSAGE = 6
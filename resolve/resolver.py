@@ -15,6 +15,7 @@ from communication.zeromq import rate_limiter
 from metrics.messages import msgs_sent
 from communication.zeromq.sender import Sender
 from communication.udp.sender import Sender as FDSender
+from modules.constants import FD_SLEEP, JOIN_RETRY_MIN, JOIN_RETRY_MAX
 
 # globals
 logger = logging.getLogger(__name__)
@@ -36,10 +37,14 @@ class Resolver:
         self.own_comm_ready = False
         self.other_comm_ready = False
         self.system_status = SystemStatus.BOOTING
+        self.ready_acks = set()  # nodes that acknowledged p_i is ready
 
-        # check other nodes for system ready before starting system
+        # check other nodes for system ready before starting system, a node
+        # started by scripts/join.py signals it is ready over the links
         if not testing:
-            t = Thread(target=self.wait_for_other_nodes)
+            wait = (self.wait_for_ready_acks if os.getenv("JOINING")
+                    else self.wait_for_other_nodes)
+            t = Thread(target=wait)
             t.start()
 
         # inject resolver in rate limiter module
@@ -72,32 +77,112 @@ class Resolver:
         self.system_status = SystemStatus.RUNNING
         logger.info(f"System running at UNIX time {time.time()}")
 
+    def wait_for_ready_acks(self):
+        """Waits until all other nodes acknowledged that p_i is ready.
+
+        Used by a joining node instead of polling the API of the others. Once
+        the own communication is set up, readiness is signalled over the
+        links the other nodes set up when p_i was published, and signalled
+        again with backoff to the nodes that have not acknowledged yet.
+        """
+        while self.system_status == SystemStatus.BOOTING:
+            time.sleep(0.01)
+
+        others = set(self.nodes) - {self.id}
+        interval = JOIN_RETRY_MIN
+        while not others <= self.ready_acks:
+            for j in others - self.ready_acks:
+                self.send_ready(j)
+            deadline = time.monotonic() + interval
+            while time.monotonic() < deadline and \
+                    not others <= self.ready_acks:
+                time.sleep(0.01)
+            interval = min(2 * interval, JOIN_RETRY_MAX)
+        self.other_comm_ready = True
+        self.system_status = SystemStatus.RUNNING
+        logger.info(f"System running at UNIX time {time.time()}")
+
+    def send_ready(self, node_id, ack=False):
+        """Signals to a node that p_i is ready, or acknowledges its signal."""
+        self.send_to_node(node_id, {"type": MessageType.READY_MESSAGE,
+                                    "sender": self.id, "ack": ack})
+
+    def receive_ready(self, msg):
+        """Called when a joining node signalled it is ready, or a node
+        acknowledged that p_i is.
+
+        The token the FD sender to the joining node lost while it was not up
+        is re-sent at once. Signals are acknowledged only once the own
+        communication is set up, the joining node signals again otherwise.
+        """
+        j = int(msg["sender"])
+        if msg.get("ack"):
+            self.ready_acks.add(j)
+            return
+        if self.system_status == SystemStatus.BOOTING:
+            return
+        sender = self.fd_senders.get(j)
+        if sender is not None:
+            sender.kick()
+        self.send_ready(j, ack=True)
+
     # Interface functions
     def fd_get_trusted(self):
         if self.system_running():
             return self.modules[Module.FAILURE_DETECTOR_MODULE].get_trusted()
         return []
 
+    def fd_get_trusted_snapshot(self):
+        """Returns tuple (version, frozenset) of the FD trusted set."""
+        if self.system_running():
+            return self.modules[
+                Module.FAILURE_DETECTOR_MODULE].get_trusted_snapshot()
+        return (0, frozenset())
+
     def fd_reset_monitor(self, j):
         return self.modules[Module.FAILURE_DETECTOR_MODULE].reset_monitor(j)
 
     def fd_stable_monitor(self, j):
         return self.modules[Module.FAILURE_DETECTOR_MODULE].stable_monitor(j)
 
+    def fd_token_interval(self):
+        """Returns the number of seconds FD tokens are currently paced by."""
+        if self.modules is None:
+            return FD_SLEEP
+        backoff = self.modules[Module.FAILURE_DETECTOR_MODULE].backoff
+        return FD_SLEEP * backoff
+
+    def fd_on_token_lost(self):
+        """Called by the FD senders when a token had to be retransmitted."""
+        if self.modules is not None:
+            self.modules[Module.FAILURE_DETECTOR_MODULE].reset_backoff()
+
+    def fd_get_rtt(self, j):
+        """Returns the smoothed RTT in seconds of the FD link to node j.
+
+        Returns None if no round trip to j has been measured yet.
+        """
+        sender = self.fd_senders.get(j)
+        return sender.rtt.srtt if sender is not None else None
+
+    def recsa_get_view(self):
+        """Returns the view of the RecSA state published last."""
+        return self.modules[Module.RECSA_MODULE].view
+
     def recsa_get_fd_j(self, j):
-        return self.modules[Module.RECSA_MODULE].get_fd_j(j)
+        return self.recsa_get_view().get_fd_j(j)
 
     def recsa_get_fd_part_j(self, j):
-        return self.modules[Module.RECSA_MODULE].get_fd_part_j(j)
+        return self.recsa_get_view().get_fd_part_j(j)
     
     def recsa_get_config(self):
-        return self.modules[Module.RECSA_MODULE].get_config()
+        return self.recsa_get_view().config
     
     def recsa_estab(self, s):
         return self.modules[Module.RECSA_MODULE].estab(s)
     
     def recsa_allow_reco(self):
-        return self.modules[Module.RECSA_MODULE].allow_reco()
+        return self.recsa_get_view().allow_reco
 
     def recsa_participate(self):
         return self.modules[Module.RECSA_MODULE].participate()
@@ -108,6 +193,10 @@ class Resolver:
         """Return True if the system as a whole i running."""
         return self.system_status == SystemStatus.RUNNING
 
+    def get_node_ids(self):
+        """Returns the ids of all nodes currently known in the system."""
+        return self.nodes.keys()
+
     def set_modules(self, modules):
         """Sets the modules dict of the resolver."""
         self.modules = modules
@@ -152,6 +241,8 @@ class Resolver:
             self.modules[Module.JOINING_MECHANISM_MODULE].receive_msg(msg)
         elif msg_type == MessageType.ABD_MESSAGE:
             self.modules[Module.ABD_MODULE].receive_msg(msg)
+        elif msg_type == MessageType.READY_MESSAGE:
+            self.receive_ready(msg)
         else:
             logger.error(f"Message with invalid type {msg_type} cannot be" +
                          " dispatched")
@@ -187,11 +278,21 @@ class Resolver:
             return 400, { "ERROR": "BAD_REQUEST" }
         reg = self.modules[Module.ABD_MODULE].write()
         return 200, reg
+
+    def abd_get_state(self):
+        """Returns the application state offered to joining nodes."""
+        return self.modules[Module.ABD_MODULE].get_state()
+
+    def abd_set_state(self, state):
+        """Initializes the application state of a joining node."""
+        self.modules[Module.ABD_MODULE].set_state(state)
+
     def run_sender_in_new_thread(self, new_node):
         # set up new sender
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        self.senders[new_node.id] = Sender(id, new_node, self.on_message_sent)
+        self.senders[new_node.id] = Sender(self.id, new_node,
+                                           self.on_message_sent)
         loop.create_task(self.senders[new_node.id].start())
         loop.run_forever()
         loop.close()
@@ -201,22 +302,36 @@ class Resolver:
         
         Sets up communication channels etc.
         """
+        self.refresh_nodes([new_node])
+
+    def refresh_nodes(self, new_nodes):
+        """Called by API when new nodes have been added to the system.
+
+        The hosts file is read and the modules are updated once for all of
+        them, and the communication channels to all of them are set up
+        concurrently.
+        """
         self.nodes = get_nodes()
 
         # update modules
         self.modules[Module.RECMA_MODULE].number_of_nodes = len(self.nodes)
         self.modules[Module.RECSA_MODULE].number_of_nodes = len(self.nodes)
-        self.modules[Module.FAILURE_DETECTOR_MODULE].number_of_nodes = len(self.nodes)
-        self.modules[Module.FAILURE_DETECTOR_MODULE].beat += [0]
+        for _ in new_nodes:
+            self.modules[Module.FAILURE_DETECTOR_MODULE].add_node()
         self.modules[Module.JOINING_MECHANISM_MODULE].number_of_nodes = len(self.nodes)
 
-        Thread(target=self.run_sender_in_new_thread, args=(new_node,)).start()
-
-        # set up new fd sender
-        new_fd_sender = FDSender(id, (new_node.hostname, 7000 + new_node.id),
-                              check_ready=self.system_running,
-                              on_message_sent=self.on_message_sent)
-        self.fd_senders[new_node.id] = new_fd_sender
-        Thread(target=self.fd_senders[new_node.id].start).start()
+        for new_node in new_nodes:
+            Thread(target=self.run_sender_in_new_thread,
+                   args=(new_node,)).start()
+
+            # set up new fd sender
+            new_fd_sender = FDSender(self.id,
+                                     (new_node.hostname, 7000 + new_node.id),
+                                     check_ready=self.system_running,
+                                     on_message_sent=self.on_message_sent,
+                                     token_interval=self.fd_token_interval,
+                                     on_token_lost=self.fd_on_token_lost)
+            self.fd_senders[new_node.id] = new_fd_sender
+            Thread(target=self.fd_senders[new_node.id].start).start()
 
         logger.info(f"System refreshed, now {len(self.nodes)} nodes in system")
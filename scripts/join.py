@@ -16,7 +16,6 @@ import json
 import subprocess
 import os
 import psutil
-import time
 import signal
 import threading
 
@@ -61,6 +60,7 @@ def launch(node, node_count):
     env["NUMBER_OF_NODES"] = str(node_count)
     env["WERKZEUG_RUN_MAIN"] = "true"  # no Flask output
     env["NUMBER_OF_CLIENTS"] = "1"
+    env["JOINING"] = "1"  # signal readiness to the nodes published to
 
     logger.info(f"Launching node {node_id}")
     p = subprocess.Popen(cmd, shell=True, cwd=cwd, env=env)
@@ -80,7 +80,6 @@ if __name__ == "__main__":
     new_node = get_node_details(node_id)
 
     publish(existing_nodes, new_node)
-    time.sleep(3)
     launch(new_node, len(existing_nodes) + 1)
 
     signal.signal(signal.SIGINT, on_sig_term)
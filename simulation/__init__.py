@@ -0,0 +1 @@
+"""Package containing an in-process simulator of the reconfiguration modules."""
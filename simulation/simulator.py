@@ -0,0 +1,328 @@
+"""Contains a round-based simulator of the RecSA, RecMA and Joining modules.
+
+Runs the modules of n processors in one process, in synchronous rounds on a
+virtual clock. In every round each alive processor first receives the
+messages due, then runs one iteration of RecSA, RecMA and the Joining
+Mechanism. Messages are delayed by a number of rounds and may be lost. The
+failure detector is mocked: a crashed processor stops being trusted by
+everyone a fixed number of rounds after its crash, an arriving processor is
+trusted the same number of rounds after its arrival, and an FD monitor is
+stable some rounds after it was reset. All randomness
+comes from a seeded generator, so a run is reproducible.
+"""
+
+# standard
+import heapq
+import itertools
+import math
+import random
+import time
+
+# local
+from modules import constants
+from modules.nodeset import NodeSet, as_node_set
+from modules.recsa.module import RecSAModule
+from modules.recma.module import RecMAModule
+from modules.recma.policies import BatchPolicy
+from modules.joining_mechanism.module import JoiningMechanismModule
+from resolve.enums import Module, MessageType
+
+# how processors start a run
+START_CLEAN = "clean"  # no processor is a participant
+START_STABLE = "stable"  # all processors share the configuration members
+
+MODULE_OF_MESSAGE = {
+    MessageType.RECSA_MESSAGE: Module.RECSA_MODULE,
+    MessageType.RECMA_MESSAGE: Module.RECMA_MODULE,
+    MessageType.JOINING_MECHANISM_MESSAGE: Module.JOINING_MECHANISM_MODULE,
+}
+
+
+class SimRecSAModule(RecSAModule):
+    """RecSA module sending NodeSets without converting them to lists."""
+
+    wire_format = False
+
+
+class SimResolver:
+    """Resolver of a simulated processor, with a mocked failure detector."""
+
+    def __init__(self, simulator, id):
+        """Initializes the resolver of processor id."""
+        self.simulator = simulator
+        self.id = id
+        self.modules = None
+        self.monitor_reset = {}  # processor k -> round its monitor was reset
+        self.app_state = None  # application state, None if there is none
+
+    def system_running(self):
+        return True
+
+    def send_to_node(self, node_id, msg, fd_msg=False):
+        if node_id != self.id:
+            self.simulator.send(self.id, node_id, msg)
+
+    def dispatch_msg(self, msg):
+        """Routes a delivered message to the module it is meant for."""
+        module = MODULE_OF_MESSAGE.get(msg["type"])
+        if module is not None:
+            self.modules[module].receive_msg(msg)
+
+    # Failure detector
+    def fd_get_trusted(self):
+        return self.simulator.trusted[1]
+
+    def fd_get_trusted_snapshot(self):
+        return self.simulator.trusted
+
+    def fd_stable_monitor(self, j):
+        reset = self.monitor_reset.get(j)
+        return reset is None or \
+            self.simulator.round - reset >= self.simulator.monitor_rounds
+
+    def fd_reset_monitor(self, j):
+        self.monitor_reset[j] = self.simulator.round
+
+    def fd_get_rtt(self, j):
+        """Message delays are not modelled in time, so no RTT is known."""
+        return None
+
+    # RecSA interface
+    def recsa_get_view(self):
+        """Returns the view of the RecSA state published last."""
+        return self.modules[Module.RECSA_MODULE].view
+
+    def recsa_get_fd_j(self, j):
+        return self.recsa_get_view().get_fd_j(j)
+
+    def recsa_get_fd_part_j(self, j):
+        return self.recsa_get_view().get_fd_part_j(j)
+
+    def recsa_get_config(self):
+        return self.recsa_get_view().config
+
+    def recsa_estab(self, s):
+        return self.modules[Module.RECSA_MODULE].estab(s)
+
+    def recsa_allow_reco(self):
+        return self.recsa_get_view().allow_reco
+
+    def recsa_participate(self):
+        return self.modules[Module.RECSA_MODULE].participate()
+
+    # Application interface
+    def abd_get_state(self):
+        return self.app_state
+
+    def abd_set_state(self, state):
+        self.app_state = state
+
+
+class Simulator:
+    """Round-based simulation of n processors.
+
+    Messages sent in round r are delivered in a round drawn uniformly from
+    r + min_delay to r + max_delay and dropped with probability loss.
+    crashes maps processors to the round they crash in, a crashed processor
+    neither runs nor receives. It is trusted for detection_rounds more
+    rounds. arrivals maps processors to the round they start running in,
+    they are trusted detection_rounds later. With start START_STABLE, the
+    processors in members (default all) are the configuration and the
+    others are joining. digests enables the digests of unchanged RecSA
+    state, see RecSAModule. Unless batch_window is None, the configuration
+    follows the participants, with the joins and leaves within batch_window
+    seconds grouped, see BatchPolicy and JoiningMechanismModule.
+    monitors_stable maps processors to the round their FD monitors first
+    become stable, as for a processor that boots later than the others.
+    The members of a stable start hold application state app_state, which
+    joining processors fetch as a snapshot before they participate.
+    """
+
+    def __init__(self, n, seed=0, min_delay=1, max_delay=1, loss=0,
+                 crashes=None, detection_rounds=2, monitor_rounds=2,
+                 start=START_CLEAN, members=None, round_duration=1,
+                 digests=False, arrivals=None, batch_window=None,
+                 monitors_stable=None, app_state=None):
+        """Initializes the simulation in round 0."""
+        self.n = n
+        self.rand = random.Random(seed)
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.loss = loss
+        self.crashes = dict(crashes or {})
+        self.arrivals = dict(arrivals or {})
+        self.detection_rounds = detection_rounds
+        self.monitor_rounds = monitor_rounds
+        self.round_duration = round_duration
+        self.round = 0
+        self.in_flight = []
+        self.order = itertools.count()
+        self.msgs_sent = 0
+        self.msgs_lost = 0
+        self.cpu_per_round = []
+        self.trusted = (0, frozenset())
+        self.update_trusted()
+        self.resolvers = [SimResolver(self, i) for i in range(n)]
+        clock = lambda: self.time
+        for resolver in self.resolvers:
+            policy = None if batch_window is None \
+                else BatchPolicy(batch_window, clock=clock)
+            resolver.modules = {
+                Module.RECSA_MODULE: SimRecSAModule(resolver.id, resolver, n,
+                                                    digests=digests),
+                Module.RECMA_MODULE: RecMAModule(resolver.id, resolver, n,
+                                                 policy=policy),
+                Module.JOINING_MECHANISM_MODULE:
+                    JoiningMechanismModule(resolver.id, resolver, n,
+                                           batch_window=batch_window or 0,
+                                           clock=clock),
+            }
+        for i, stable in (monitors_stable or {}).items():
+            for k in range(n):
+                self.resolvers[i].monitor_reset[k] = stable - monitor_rounds
+        if start == START_STABLE:
+            members = NodeSet(range(n) if members is None else members)
+            for i in range(n):
+                self.set_stable_state(i, members)
+                if i in members:
+                    self.resolvers[i].app_state = app_state
+        for i in range(n):
+            self.joining(i).flush_arrays()
+
+    # Access to the modules of processor i
+    def recsa(self, i):
+        return self.resolvers[i].modules[Module.RECSA_MODULE]
+
+    def recma(self, i):
+        return self.resolvers[i].modules[Module.RECMA_MODULE]
+
+    def joining(self, i):
+        return self.resolvers[i].modules[Module.JOINING_MECHANISM_MODULE]
+
+    @property
+    def time(self):
+        """Returns the virtual time in seconds."""
+        return self.round * self.round_duration
+
+    def set_stable_state(self, i, members):
+        """Sets the state of processor i to agree on configuration members.
+
+        The members are participants, all other processors are joining.
+        """
+        recsa = self.recsa(i)
+        everyone = NodeSet(range(self.n))
+        participants = members
+        for k in range(self.n):
+            participant = k in participants
+            recsa.config[k] = members if participant \
+                else constants.NOT_PARTICIPANT
+            recsa.prp[k] = constants.DFLT_NTF
+            recsa.alll[k] = participant
+            recsa.fd[k] = everyone
+            recsa.fd_part[k] = participants
+            recsa.echo_part[k] = participants
+            recsa.echo_prp[k] = constants.DFLT_NTF
+            recsa.echo_all[k] = participant
+        recsa.all_seen = participants
+        self.recma(i).prev_config = members
+
+    def alive(self, i, at_round=None):
+        """Tests whether processor i has arrived and not crashed by the
+        given round."""
+        at_round = self.round if at_round is None else at_round
+        arrival = self.arrivals.get(i)
+        if arrival is not None and at_round < arrival:
+            return False
+        crash = self.crashes.get(i)
+        return crash is None or at_round < crash
+
+    def update_trusted(self):
+        """Recomputes the trusted set, shared by all processors."""
+        trusted = frozenset(
+            k for k in range(self.n)
+            if self.alive(k, self.round - self.detection_rounds))
+        version, current = self.trusted
+        if trusted != current:
+            self.trusted = (version + 1, trusted)
+
+    def send(self, sender, receiver, msg):
+        """Schedules the delivery of msg unless it is lost."""
+        self.msgs_sent += 1
+        if self.loss and self.rand.random() < self.loss:
+            self.msgs_lost += 1
+            return
+        delay = self.rand.randint(self.min_delay, self.max_delay)
+        heapq.heappush(self.in_flight, (self.round + delay, next(self.order),
+                                        receiver, msg))
+
+    def deliver(self):
+        """Delivers the messages due in the current round."""
+        while self.in_flight and self.in_flight[0][0] <= self.round:
+            _, _, receiver, msg = heapq.heappop(self.in_flight)
+            if self.alive(receiver):
+                self.resolvers[receiver].dispatch_msg(msg)
+
+    def step(self):
+        """Runs one round and returns the CPU time it took."""
+        started = time.process_time()
+        self.round += 1
+        self.update_trusted()
+        self.deliver()
+        for i in range(self.n):
+            if not self.alive(i):
+                continue
+            self.recsa(i).iterate()
+            self.recma(i).iterate()
+            self.joining(i).run_iteration()
+        cpu = time.process_time() - started
+        self.cpu_per_round.append(cpu)
+        return cpu
+
+    def converged(self):
+        """Tests whether the alive processors are in a legitimate state.
+
+        All alive processors must be participants that agree on the same
+        configuration without an active notification, and RecMA must not
+        ask for a reconfiguration of it.
+        """
+        config = None
+        for i in range(self.n):
+            if not self.alive(i):
+                continue
+            recsa = self.recsa(i)
+            config_i = as_node_set(recsa.get_config_j(i))
+            if config_i is None or not config_i or \
+                    recsa.get_prp_j(i) != constants.DFLT_NTF:
+                return False
+            if config is None:
+                config = config_i
+            elif config_i != config:
+                return False
+            if self.recma(i).peek_config(config_i):
+                return False
+        return config is not None
+
+    def run(self, max_rounds=100, settle_rounds=3):
+        """Runs until converged for settle_rounds rounds in a row.
+
+        Returns the first round of the converged period, or None if the
+        processors did not converge within max_rounds.
+        """
+        converged_since = None
+        while self.round < max_rounds:
+            self.step()
+            if not self.converged():
+                converged_since = None
+            elif converged_since is None:
+                converged_since = self.round
+            if converged_since is not None and \
+                    self.round - converged_since + 1 >= settle_rounds:
+                return converged_since
+        return None
+
+    def cpu_stats(self):
+        """Returns tuple (mean, max) CPU seconds per round."""
+        if not self.cpu_per_round:
+            return (0, 0)
+        return (math.fsum(self.cpu_per_round) / len(self.cpu_per_round),
+                max(self.cpu_per_round))
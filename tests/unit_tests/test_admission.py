@@ -0,0 +1,150 @@
+"""Unit tests covering admission control of the receivers."""
+
+import socket
+import unittest
+from unittest.mock import MagicMock
+import jsonpickle
+from communication.admission import (AdmissionControl, TokenBucket,
+                                     UNKNOWN_SENDER, TOO_LARGE, RATE_LIMITED,
+                                     SENDER_MISMATCH)
+from communication.udp.message import Message, HEADER
+from communication.udp.receiver import Receiver
+from communication.zeromq import message as zmq_message
+from communication.zeromq.receiver import Receiver as ZeroMQReceiver
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst_then_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, burst=5, clock=clock)
+        self.assertEqual(sum(bucket.consume() for _ in range(10)), 5)
+        clock.now = 0.5
+        self.assertEqual(sum(bucket.consume() for _ in range(10)), 5)
+        clock.now = 100
+        self.assertEqual(sum(bucket.consume() for _ in range(10)), 5)
+
+
+class TestAdmissionControl(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.admission = AdmissionControl(0, known_senders=lambda: [0, 1, 2],
+                                          rate=1, burst=2, max_size=100,
+                                          clock=self.clock)
+
+    def test_unknown_sender(self):
+        self.assertFalse(self.admission.admit(5, 10))
+        self.assertEqual(self.admission.dropped[(5, UNKNOWN_SENDER)], 1)
+
+    def test_too_large(self):
+        self.assertFalse(self.admission.admit(1, 101))
+        self.assertEqual(self.admission.dropped[(1, TOO_LARGE)], 1)
+
+    def test_rate_limit_per_sender(self):
+        self.assertTrue(self.admission.admit(1, 10))
+        self.assertTrue(self.admission.admit(1, 10))
+        self.assertFalse(self.admission.admit(1, 10))
+        self.assertEqual(self.admission.dropped[(1, RATE_LIMITED)], 1)
+        # other senders have their own bucket
+        self.assertTrue(self.admission.admit(2, 10))
+        self.clock.now = 1
+        self.assertTrue(self.admission.admit(1, 10))
+        self.assertEqual(self.admission.dropped_from(1), 1)
+        self.assertEqual(self.admission.dropped_from(2), 0)
+
+    def test_any_sender_if_unknown_senders_not_supplied(self):
+        admission = AdmissionControl(0, rate=1, burst=1)
+        self.assertTrue(admission.admit(42, 10))
+
+
+class TestUDPReceiverAdmission(unittest.TestCase):
+    def setUp(self):
+        self.admission = AdmissionControl(0, known_senders=lambda: [0, 1],
+                                          rate=1, burst=1, max_size=1024)
+        self.receiver = Receiver(("127.0.0.1", 0), admission=self.admission)
+        self.receiver.socket.settimeout(1)
+        self.sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sender.connect(self.receiver.socket.getsockname())
+
+    def tearDown(self):
+        self.receiver.socket.close()
+        self.sender.close()
+
+    def test_drops_before_decoding(self):
+        self.sender.send(Message(3, 1).to_bytes())
+        self.sender.send(b"garbage")
+        self.sender.send(Message(1, 1).to_bytes())
+        self.sender.send(Message(1, 2).to_bytes())
+        self.sender.send(Message(0, 1).to_bytes())
+        msg, _ = self.receiver.recv()
+        self.assertEqual(msg.get_sender_id(), 1)
+        msg, _ = self.receiver.recv()
+        self.assertEqual(msg.get_sender_id(), 0)
+        self.assertEqual(self.admission.dropped_from(3), 1)
+        self.assertEqual(self.admission.dropped[(1, RATE_LIMITED)], 1)
+
+    def test_drops_sender_mismatching_header(self):
+        # body of a message from 0 behind the header of 1
+        spoofed = Message(0, 1).to_bytes()
+        self.sender.send(HEADER.pack(1) + spoofed[HEADER.size:])
+        self.sender.send(Message(1, 1).to_bytes())
+        msg, _ = self.receiver.recv()
+        self.assertEqual(msg.get_sender_id(), 1)
+        self.assertEqual(self.admission.dropped[(1, SENDER_MISMATCH)], 1)
+        # the spoofed datagram did not use up the rate of 1
+        self.assertEqual(self.admission.dropped_from(1), 1)
+
+
+class TestZeroMQReceiverAdmission(unittest.TestCase):
+    def setUp(self):
+        self.admission = AdmissionControl(0, known_senders=lambda: [0, 1],
+                                          rate=1, burst=1, max_size=1024)
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        self.resolver = MagicMock()
+        self.receiver = ZeroMQReceiver(0, "127.0.0.1", port, self.resolver,
+                                       admission=self.admission)
+        self.receiver.socket.close()
+        self.receiver.socket = MagicMock()
+
+    def handle(self, sender_id, counter, data):
+        msg = zmq_message.Message(zmq_message.MessageEnum.SENDER_MESSAGE,
+                                  counter, sender_id, data)
+        self.receiver.handle([msg.header_as_bytes(), msg.as_bytes()])
+        reply = self.receiver.socket.send.call_args[0][0]
+        return jsonpickle.decode(reply.decode())
+
+    def test_drops_are_rejected(self):
+        reply = self.handle(1, 1, {"sender": 1})
+        self.assertEqual(reply.get_type(),
+                         zmq_message.MessageEnum.RECEIVER_MESSAGE)
+        self.resolver.dispatch_msg.assert_called_once_with({"sender": 1})
+        reply = self.handle(1, 2, {"sender": 1})
+        self.assertEqual(reply.get_type(),
+                         zmq_message.MessageEnum.REJECT_MESSAGE)
+        self.assertEqual(reply.get_counter(), 2)
+        self.assertEqual(self.admission.dropped[(1, RATE_LIMITED)], 1)
+
+    def test_drops_sender_mismatching_header(self):
+        reply = self.handle(0, 1, {"sender": 3})
+        self.assertEqual(reply.get_type(),
+                         zmq_message.MessageEnum.REJECT_MESSAGE)
+        self.resolver.dispatch_msg.assert_not_called()
+        self.assertEqual(self.admission.dropped[(0, SENDER_MISMATCH)], 1)
+        # the spoofed message did not use up the rate of 0
+        reply = self.handle(0, 2, {"sender": 0})
+        self.assertEqual(reply.get_type(),
+                         zmq_message.MessageEnum.RECEIVER_MESSAGE)
+        self.assertEqual(self.admission.dropped_from(0), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,389 @@
+"""Unit tests covering the failure detector module."""
+
+import random
+import time
+import unittest
+from unittest.mock import MagicMock
+from resolve.resolver import Resolver
+from modules.fd.module import FDModule
+from modules.fd.vectorized import VectorizedFDModule, numpy_available
+from modules.fd.phi import PhiAccrualFDModule, phi
+from modules.fd.swim import (SwimFDModule, ALIVE, SUSPECT, FAULTY, PING, ACK,
+                             PING_REQ)
+from modules.constants import (BEAT_THRESHOLD, FD_MAX_BACKOFF,
+                               FD_QUIET_PERIOD, SWIM_PERIOD,
+                               SWIM_PROBE_TIMEOUT, SWIM_SUSPECT_TIMEOUT,
+                               SWIM_INDIRECT_PROBES)
+
+
+class ReferenceFD:
+    """Eager (N, THETA) failure detector, updating all beats on each token."""
+
+    def __init__(self, id, n):
+        self.id = id
+        self.n = n
+        self.beat = [0 for i in range(n)]
+        self.monitor = [0 for i in range(n)]
+        self.fd_set = set()
+
+    def upon_token_from_pj(self, processor_j):
+        self.beat[processor_j] = 0
+        self.beat[self.id] = 0
+        self.monitor[processor_j] = min(self.monitor[processor_j] + 1, 3)
+        self.monitor[self.id] = min(self.monitor[processor_j] + 1, 3)
+        new_fd_set = {processor_j, self.id}
+        for k in range(self.n):
+            if k == self.id or k == processor_j:
+                continue
+            self.beat[k] += 1
+            if self.beat[k] < BEAT_THRESHOLD:
+                new_fd_set.add(k)
+        self.fd_set = new_fd_set
+
+
+class TestFDModule(unittest.TestCase):
+    def setUp(self):
+        self.resolver = Resolver(testing=True)
+        self.n = 6
+        self.mod = FDModule(0, self.resolver, self.n)
+
+    def test_nothing_trusted_before_first_token(self):
+        self.assertEqual(self.mod.get_trusted(), set())
+
+    def test_token_resets_beat(self):
+        for _ in range(5):
+            self.mod.upon_token_from_pj(1)
+        self.mod.upon_token_from_pj(2)
+        self.assertEqual(self.mod.get_beat(), [0, 1, 0, 6, 6, 6])
+        self.assertEqual(self.mod.get_trusted(), {0, 1, 2, 3, 4, 5})
+
+    def test_suspects_silent_processor(self):
+        for _ in range(BEAT_THRESHOLD):
+            self.mod.upon_token_from_pj(1)
+            self.mod.upon_token_from_pj(2)
+        self.assertEqual(self.mod.get_trusted(), {0, 1, 2})
+
+    def test_matches_eager_failure_detector(self):
+        rand = random.Random(1)
+        ref = ReferenceFD(0, self.n)
+        alive = [1, 2, 3, 4, 5]
+        for i in range(2000):
+            if i % 300 == 0:
+                alive = rand.sample(range(1, self.n), rand.randint(1, 5))
+            j = rand.choice(alive)
+            ref.upon_token_from_pj(j)
+            self.mod.upon_token_from_pj(j)
+            if rand.random() < 0.3:
+                self.assertEqual(self.mod.get_trusted(), ref.fd_set)
+                self.assertEqual(self.mod.get_beat(), ref.beat)
+                self.assertEqual(self.mod.monitor, ref.monitor)
+
+    def test_reset_keeps_trusted_set_until_next_token(self):
+        for _ in range(BEAT_THRESHOLD):
+            self.mod.upon_token_from_pj(1)
+        self.mod.reset()
+        self.assertEqual(self.mod.get_trusted(), {0, 1})
+        self.assertEqual(self.mod.get_beat(), [0] * self.n)
+        self.mod.upon_token_from_pj(1)
+        self.assertEqual(self.mod.get_trusted(), set(range(self.n)))
+
+    def test_add_node(self):
+        self.mod.upon_token_from_pj(1)
+        self.mod.add_node()
+        self.assertEqual(self.mod.number_of_nodes, self.n + 1)
+        self.assertEqual(self.mod.get_beat()[self.n], 0)
+        self.mod.upon_token_from_pj(self.n)
+        self.assertIn(self.n, self.mod.get_trusted())
+
+    def test_trusted_snapshot_versions(self):
+        self.assertEqual(self.mod.get_trusted_snapshot(), (0, frozenset()))
+        self.mod.upon_token_from_pj(1)
+        version, trusted = self.mod.get_trusted_snapshot()
+        self.assertIsInstance(trusted, frozenset)
+        self.assertEqual((version, trusted), (1, frozenset(range(self.n))))
+
+        # same membership, same version and snapshot
+        for _ in range(BEAT_THRESHOLD - 2):
+            self.mod.upon_token_from_pj(1)
+            self.assertEqual(self.mod.get_trusted_snapshot()[0], 1)
+        self.assertIs(self.mod.get_trusted(), trusted)
+
+        # membership changes, version is incremented
+        self.mod.upon_token_from_pj(1)
+        self.assertEqual(self.mod.get_trusted_snapshot(),
+                         (2, frozenset({0, 1})))
+
+    def test_monitor(self):
+        for _ in range(3):
+            self.assertFalse(self.mod.stable_monitor(1))
+            self.mod.upon_token_from_pj(1)
+        self.assertTrue(self.mod.stable_monitor(1))
+        self.mod.reset_monitor(1)
+        self.assertFalse(self.mod.stable_monitor(1))
+
+    def test_run_drains_queue_in_one_batch(self):
+        self.mod.send_msg = MagicMock()
+        for j in [1, 2, 1, 3]:
+            self.mod.receive_msg({"sender": j})
+        self.mod.run(testing=True)
+        self.assertTrue(self.mod.msg_queue.empty())
+        self.assertEqual(self.mod.clock, 4)
+        self.assertEqual(self.mod.get_beat(), [0, 1, 2, 0, 4, 4])
+        self.assertEqual([c.args[0] for c in self.mod.send_msg.call_args_list],
+                         [1, 2, 3])
+
+    def test_drain_queue_times_out(self):
+        self.assertEqual(self.mod.drain_queue(0.01), [])
+
+    def quiet(self, periods):
+        for _ in range(periods):
+            self.mod.quiet_since -= FD_QUIET_PERIOD
+            self.mod.update_backoff(time.monotonic())
+
+    def test_backoff_while_quiet(self):
+        for _ in range(3):
+            self.mod.upon_tokens_from(range(1, self.n))
+        self.quiet(10)
+        self.assertEqual(self.mod.backoff, FD_MAX_BACKOFF)
+
+        self.mod.reset_monitor(1)
+        self.assertEqual(self.mod.backoff, 1)
+        # monitor of processor 1 not stable yet
+        self.quiet(1)
+        self.assertEqual(self.mod.backoff, 1)
+
+        for _ in range(3):
+            self.mod.upon_tokens_from(range(1, self.n))
+        self.quiet(1)
+        self.assertEqual(self.mod.backoff, 2)
+        for _ in range(BEAT_THRESHOLD):
+            self.mod.upon_token_from_pj(1)
+        self.quiet(1)
+        self.assertEqual(self.mod.backoff, 1)
+
+    def test_weighted_tokens_keep_timeout(self):
+        self.mod.set_backoff(4)
+        self.assertEqual(self.mod.token_weight({"backoff": 4}), 4)
+        self.assertEqual(self.mod.token_weight({"backoff": 1}), 2.5)
+        self.assertEqual(self.mod.token_weight({"backoff": 10**6}),
+                         (4 + FD_MAX_BACKOFF) / 2)
+        self.assertEqual(self.mod.token_weight({}), 2.5)
+
+        # a quarter of the tokens suffices to suspect silent processors
+        for _ in range(BEAT_THRESHOLD // 4 + 1):
+            self.mod.upon_tokens_from([1], [4])
+        self.assertEqual(self.mod.get_trusted(), {0, 1})
+
+
+@unittest.skipUnless(numpy_available(), "NumPy not installed")
+class TestVectorizedFDModule(unittest.TestCase):
+    def setUp(self):
+        self.resolver = Resolver(testing=True)
+        self.n = 8
+        self.lists = FDModule(0, self.resolver, self.n)
+        self.arrays = VectorizedFDModule(0, self.resolver, self.n)
+
+    def assertSameState(self):
+        self.assertEqual(self.arrays.get_trusted_snapshot(),
+                         self.lists.get_trusted_snapshot())
+        self.assertEqual(self.arrays.get_beat(), self.lists.get_beat())
+        self.assertEqual(self.arrays.monitor.tolist(), self.lists.monitor)
+        for j in range(self.lists.number_of_nodes):
+            self.assertEqual(self.arrays.stable_monitor(j),
+                             self.lists.stable_monitor(j))
+
+    def test_matches_list_based_failure_detector(self):
+        rand = random.Random(2)
+        alive = list(range(1, self.n))
+        for i in range(300):
+            if i % 50 == 0:
+                alive = rand.sample(range(1, self.n), rand.randint(1, 4))
+            batch = [rand.choice(alive) for _ in range(rand.randint(0, 40))]
+            weights = [rand.choice([1, 1.5, 2, 4.5]) for _ in batch]
+            if rand.random() < 0.2:
+                self.lists.upon_tokens_from(batch, weights)
+                self.arrays.upon_tokens_from(batch, weights)
+            elif rand.random() < 0.5:
+                self.lists.upon_tokens_from(batch)
+                self.arrays.upon_tokens_from(batch)
+            else:
+                for j in batch:
+                    self.lists.upon_token_from_pj(j)
+                    self.arrays.upon_token_from_pj(j)
+            if rand.random() < 0.05:
+                self.lists.reset_monitor(batch[0] if batch else 1)
+                self.arrays.reset_monitor(batch[0] if batch else 1)
+            self.assertSameState()
+
+    def test_reset_and_add_node(self):
+        self.lists.upon_tokens_from([1, 2, 1])
+        self.arrays.upon_tokens_from([1, 2, 1])
+        self.lists.reset()
+        self.arrays.reset()
+        self.assertSameState()
+        self.lists.add_node()
+        self.arrays.add_node()
+        self.lists.upon_tokens_from([self.n, 3])
+        self.arrays.upon_tokens_from([self.n, 3])
+        self.assertSameState()
+
+
+class TestPhiAccrualFDModule(unittest.TestCase):
+    def setUp(self):
+        self.time = 0
+        self.resolver = Resolver(testing=True)
+        self.mod = PhiAccrualFDModule(0, self.resolver, 3,
+                                      now=lambda: self.time)
+
+    def tick(self, seconds, senders=(1, 2)):
+        for _ in range(int(seconds / 0.25)):
+            self.time += 0.25
+            for j in senders:
+                self.mod.upon_token_from_pj(j)
+
+    def test_phi_grows_with_elapsed_time(self):
+        self.assertLess(phi(0.25, 0.25, 0.1), 1)
+        self.assertLess(phi(0.5, 0.25, 0.1), phi(1, 0.25, 0.1))
+        self.assertGreater(phi(10**4, 0.25, 0.1), 10**6)
+        self.assertAlmostEqual(phi(0, 10**4, 0.1), 0)
+
+    def test_nothing_trusted_before_first_token(self):
+        self.assertEqual(self.mod.get_trusted(), set())
+
+    def test_trusts_regular_processors(self):
+        self.tick(10)
+        self.assertEqual(self.mod.get_trusted(), {0, 1, 2})
+
+    def test_suspects_silent_processor_without_tokens(self):
+        self.tick(10)
+        version = self.mod.get_trusted_snapshot()[0]
+        self.tick(1, senders=(1,))
+        self.assertEqual(self.mod.get_trusted(), {0, 1})
+        self.assertEqual(self.mod.get_trusted_snapshot()[0], version + 1)
+
+        # all processors silent, time alone increases suspicion
+        self.time += 10
+        self.assertEqual(self.mod.get_trusted(), {0})
+
+        # trusted again once tokens arrive
+        self.tick(1)
+        self.assertEqual(self.mod.get_trusted(), {0, 1, 2})
+
+    def test_same_interface_as_fd_module(self):
+        self.tick(1, senders=(1,))
+        self.assertTrue(self.mod.stable_monitor(1))
+        self.mod.reset_monitor(1)
+        self.assertFalse(self.mod.stable_monitor(1))
+        self.mod.add_node()
+        self.tick(1, senders=(1, 2, 3))
+        self.assertEqual(self.mod.get_trusted(), {0, 1, 2, 3})
+
+
+class TestSwimFDModule(unittest.TestCase):
+    def setUp(self):
+        self.time = 0
+        self.resolver = Resolver(testing=True)
+        self.resolver.send_to_node = MagicMock()
+        self.mod = SwimFDModule(0, self.resolver, 6, now=lambda: self.time)
+        self.mod.random.seed(0)
+
+    def sent(self):
+        """Returns list of (receiver, msg) sent since last call."""
+        calls = self.resolver.send_to_node.call_args_list
+        self.resolver.send_to_node.reset_mock()
+        return [(c.args[0], c.args[1]) for c in calls]
+
+    def receive(self, sender, kind, **fields):
+        msg = {"sender": sender, "swim": kind, "incarnation": 0, **fields}
+        self.mod.handle_tokens([(0, msg)])
+
+    def ack_probe(self):
+        self.receive(self.mod.probe_target, ACK, seq=self.mod.probe_seq,
+                     target=self.mod.probe_target)
+
+    def test_nothing_trusted_before_first_message(self):
+        self.assertEqual(self.mod.get_trusted(), set())
+        self.receive(1, PING, seq=1)
+        self.assertEqual(self.mod.get_trusted(), set(range(6)))
+
+    def test_one_probe_per_period(self):
+        targets = []
+        for _ in range(5):
+            self.mod.tick(self.time)
+            [(target, msg)] = self.sent()
+            self.assertEqual(msg["swim"], PING)
+            targets.append(target)
+            self.ack_probe()
+            self.time += SWIM_PERIOD
+        # randomized round-robin probes every other processor once
+        self.assertEqual(sorted(targets), [1, 2, 3, 4, 5])
+        self.assertEqual(self.mod.get_trusted(), set(range(6)))
+
+    def test_suspects_and_removes_unresponsive_processor(self):
+        self.mod.tick(self.time)
+        target = self.mod.probe_target
+        self.sent()
+
+        self.time += SWIM_PROBE_TIMEOUT
+        self.mod.tick(self.time)
+        requests = self.sent()
+        self.assertEqual(len(requests), SWIM_INDIRECT_PROBES)
+        for helper, msg in requests:
+            self.assertEqual(msg["swim"], PING_REQ)
+            self.assertEqual(msg["target"], target)
+            self.assertNotIn(helper, (0, target))
+
+        self.receive(1 if target != 1 else 2, PING, seq=1)
+        self.time += SWIM_PERIOD
+        self.mod.tick(self.time)
+        self.assertEqual(self.mod.status[target], SUSPECT)
+        self.assertIn(target, self.mod.get_trusted())
+
+        self.time += SWIM_SUSPECT_TIMEOUT
+        self.mod.tick(self.time)
+        self.assertEqual(self.mod.status[target], FAULTY)
+        self.assertNotIn(target, self.mod.get_trusted())
+
+        # back once it refuted the suspicion with a higher incarnation
+        self.mod.handle_tokens([(0, {"sender": target, "swim": PING,
+                                     "incarnation": 1, "seq": 1})])
+        self.assertEqual(self.mod.status[target], ALIVE)
+        self.assertIn(target, self.mod.get_trusted())
+
+    def test_refutes_suspicion_of_itself(self):
+        self.receive(1, PING, seq=7, updates=[[0, SUSPECT, 0]])
+        self.assertEqual(self.mod.incarnation[0], 1)
+        [(receiver, msg)] = self.sent()
+        self.assertEqual(receiver, 1)
+        self.assertEqual(msg["swim"], ACK)
+        self.assertEqual(msg["seq"], 7)
+        self.assertEqual(msg["incarnation"], 1)
+        self.assertIn([0, ALIVE, 1], msg["updates"])
+
+    def test_precedence_of_updates(self):
+        self.receive(1, PING, seq=1, updates=[[2, SUSPECT, 0]])
+        self.assertEqual(self.mod.status[2], SUSPECT)
+        self.receive(1, PING, seq=1, updates=[[2, ALIVE, 0]])
+        self.assertEqual(self.mod.status[2], SUSPECT)
+        self.receive(1, PING, seq=1, updates=[[2, ALIVE, 1]])
+        self.assertEqual(self.mod.status[2], ALIVE)
+        self.receive(1, PING, seq=1, updates=[[2, FAULTY, 1]])
+        self.assertEqual(self.mod.status[2], FAULTY)
+
+    def test_indirect_probe_is_relayed(self):
+        self.receive(1, PING_REQ, seq=3, target=2)
+        [(receiver, msg)] = self.sent()
+        self.assertEqual((receiver, msg["swim"], msg["origin"]), (2, PING, 1))
+
+        self.receive(2, ACK, seq=3, target=2, origin=1)
+        [(receiver, msg)] = self.sent()
+        self.assertEqual((receiver, msg["swim"], msg["target"]), (1, ACK, 2))
+
+    def test_add_node(self):
+        self.receive(1, PING, seq=1)
+        self.mod.add_node()
+        self.assertEqual(self.mod.get_trusted(), set(range(7)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""Unit tests covering the Joining Mechanism module."""
+
+import sys
+import threading
+import unittest
+from unittest.mock import MagicMock
+from modules.joining_mechanism.module import JoiningMechanismModule
+from modules.joining_mechanism.snapshot import SnapshotCache
+from modules.nodeset import NodeSet
+from modules import constants
+
+
+class TestJoiningMechanismModule(unittest.TestCase):
+    def setUp(self):
+        self.n = 2000
+        self.members = NodeSet([0, 1, 2])
+        self.resolver = MagicMock()
+        self.resolver.recsa_get_fd_j = MagicMock(
+            return_value=NodeSet(range(self.n)))
+        self.resolver.recsa_get_fd_part_j = MagicMock(
+            return_value=self.members)
+        self.resolver.recsa_get_config = MagicMock(return_value=self.members)
+        self.resolver.recsa_allow_reco = MagicMock(return_value=True)
+        self.resolver.abd_get_state = MagicMock(return_value=None)
+        self.mod = JoiningMechanismModule(0, self.resolver, self.n,
+                                          batch_window=0)
+
+    def answered(self):
+        return [c[0][0] for c in self.resolver.send_to_node.call_args_list
+                if c[0][1]["data"] == {"pass": True,
+                                       "state": constants.BOTTOM}]
+
+    def test_join_requests_are_answered_in_one_batch(self):
+        self.mod.batch_window = 1
+        self.mod.clock = MagicMock(return_value=0)
+        for j in [3, 4, 1]:
+            self.mod.receive_msg({"sender": j, "data": "JOIN"})
+        self.mod.answer_join_requests()
+        self.assertEqual(self.answered(), [])
+        self.mod.clock.return_value = 1
+        self.mod.answer_join_requests()
+        self.assertEqual(self.answered(), [3, 4])
+        self.assertEqual(self.mod.requests, {})
+
+    def test_no_join_request_is_lost_while_answering(self):
+        joiners = range(3, self.n)
+        self.mod.batch_window = 0.001
+
+        def receive():
+            for j in joiners:
+                self.mod.receive_msg({"sender": j, "data": "JOIN"})
+        receiver = threading.Thread(target=receive)
+        # switch threads often, to interleave receiving and answering
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            receiver.start()
+            while receiver.is_alive():
+                self.mod.answer_join_requests()
+            receiver.join()
+        finally:
+            sys.setswitchinterval(interval)
+        self.mod.batch_window = 0
+        self.mod.answer_join_requests()
+        self.assertEqual(sorted(self.answered()), list(joiners))
+
+    def test_snapshot_is_kept_if_participate_is_rejected(self):
+        state = {"label": 1, "value": "x"}
+        cache = SnapshotCache()
+        meta = cache.offer(state)
+        joiner = JoiningMechanismModule(5, self.resolver, self.n)
+        for j in self.members:
+            joiner.receive_msg({"sender": j,
+                                "data": {"pass": True, "state": meta}})
+        joiner.run_iteration()
+        joiner.receive_msg({"sender": 0, "data": {
+            "chunk": cache.get(meta["digest"]).chunk(0)}})
+        # participate() has no effect, p_5 does not become a participant
+        for _ in range(2):
+            self.resolver.send_to_node.reset_mock()
+            joiner.run_iteration()
+            self.resolver.recsa_participate.assert_called()
+            self.resolver.abd_set_state.assert_called_with(state)
+            self.assertFalse(any(
+                "chunk_request" in c[0][1]["data"]
+                for c in self.resolver.send_to_node.call_args_list))
+        self.assertEqual(joiner.transfer.digest, meta["digest"])
+
+        self.resolver.recsa_get_fd_part_j.return_value = \
+            self.members.with_node(5)
+        joiner.run_iteration()
+        self.assertIsNone(joiner.transfer)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""Unit tests covering the NodeSet bitmask set of processor ids."""
+
+import copy
+import itertools
+import pickle
+import random
+import unittest
+from modules.nodeset import (NodeSet, as_node_set, same_ids, to_wire,
+                             from_wire)
+
+
+class TestNodeSet(unittest.TestCase):
+    def test_behaves_like_set(self):
+        rand = random.Random(0)
+        for _ in range(200):
+            a = set(rand.sample(range(100), rand.randint(0, 20)))
+            b = set(rand.sample(range(100), rand.randint(0, 20)))
+            a_set, b_set = NodeSet(a), NodeSet(b)
+            self.assertEqual(list(a_set), sorted(a))
+            self.assertEqual(len(a_set), len(a))
+            self.assertEqual(bool(a_set), bool(a))
+            self.assertEqual(a_set | b_set, a | b)
+            self.assertEqual(a_set & b_set, a & b)
+            self.assertEqual(a_set - b_set, a - b)
+            self.assertEqual(a_set.issubset(b_set), a <= b)
+            self.assertEqual(a_set <= b_set, a <= b)
+            self.assertEqual(a_set < b_set, a < b)
+            self.assertEqual(a_set == b_set, a == b)
+            self.assertEqual(a_set.lex_lt(b_set), sorted(a) < sorted(b))
+
+    def test_lex_lt_prefix(self):
+        self.assertTrue(NodeSet([1, 2]).lex_lt(NodeSet([1, 2, 3])))
+        self.assertFalse(NodeSet([1, 2, 3]).lex_lt(NodeSet([1, 2])))
+        self.assertTrue(NodeSet([1, 2, 3]).lex_lt(NodeSet([1, 3])))
+        self.assertTrue(NodeSet().lex_lt(NodeSet([0])))
+        self.assertFalse(NodeSet([4]).lex_lt(NodeSet([4])))
+
+    def test_lex_lt_all_small_sets(self):
+        subsets = [set(c) for r in range(5)
+                   for c in itertools.combinations(range(4), r)]
+        for a, b in itertools.product(subsets, repeat=2):
+            self.assertEqual(NodeSet(a).lex_lt(NodeSet(b)),
+                             sorted(a) < sorted(b))
+
+    def test_equal_to_lists_and_sets(self):
+        self.assertEqual(NodeSet([2, 0]), [0, 2])
+        self.assertEqual(NodeSet([2, 0]), {0, 2})
+        self.assertEqual(NodeSet(), [])
+        self.assertNotEqual(NodeSet([1]), [2])
+        self.assertNotEqual(NodeSet([1]), "BOTTOM")
+        self.assertNotEqual(NodeSet(), ["a"])
+        self.assertIn(NodeSet(), [[], "BOTTOM"])
+
+    def test_hash(self):
+        self.assertEqual(len({NodeSet([1, 2]), NodeSet([2, 1]),
+                              NodeSet([3])}), 2)
+
+    def test_contains(self):
+        node_set = NodeSet([0, 5])
+        self.assertIn(5, node_set)
+        self.assertNotIn(4, node_set)
+        self.assertNotIn(-1, node_set)
+        self.assertNotIn("B", node_set)
+
+    def test_invalid_ids(self):
+        for ids in [[-1], ["a"], [1.0], "BOTTOM"]:
+            with self.assertRaises(ValueError):
+                NodeSet(ids)
+
+    def test_immutable(self):
+        node_set = NodeSet([1])
+        with self.assertRaises(AttributeError):
+            node_set.mask = 3
+        other = node_set
+        other |= [2]
+        self.assertEqual(node_set, [1])
+        self.assertEqual(other, [1, 2])
+
+    def test_copy_and_pickle(self):
+        node_set = NodeSet([0, 3, 64])
+        self.assertEqual(copy.deepcopy(node_set), node_set)
+        self.assertEqual(pickle.loads(pickle.dumps(node_set)), node_set)
+
+    def test_of(self):
+        node_set = NodeSet([1])
+        self.assertIs(NodeSet.of(node_set), node_set)
+        self.assertEqual(NodeSet.of({1}), node_set)
+
+    def test_as_node_set(self):
+        self.assertEqual(as_node_set([1, 2]), [1, 2])
+        self.assertIsNone(as_node_set("BOTTOM"))
+        self.assertIsNone(as_node_set(["a"]))
+
+    def test_same_ids(self):
+        self.assertTrue(same_ids([1, 2], NodeSet([2, 1])))
+        self.assertTrue(same_ids("BOTTOM", "BOTTOM"))
+        self.assertFalse(same_ids("BOTTOM", NodeSet()))
+
+    def test_wire_roundtrip(self):
+        values = [NodeSet([0, 2]), NodeSet(), "BOTTOM", True,
+                  (1, NodeSet([3])), (0, "BOTTOM")]
+        for value in values:
+            wire = to_wire(value)
+            self.assertEqual(from_wire(wire), value)
+        self.assertEqual(to_wire(NodeSet([2, 0])), [0, 2])
+        self.assertEqual(to_wire((1, NodeSet([3]))), (1, [3]))
+        with self.assertRaises(ValueError):
+            from_wire([0, "x"])
+
+    def test_from_wire_bounds_ids(self):
+        self.assertEqual(from_wire((1, [0, 3]), 4), (1, NodeSet([0, 3])))
+        for wire in [[0, 4], (1, [2**33])]:
+            with self.assertRaises(ValueError):
+                from_wire(wire, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,13 @@
 """Unit tests covering the RecMA module."""
 
+import time
 import unittest
-from unittest.mock import Mock, MagicMock, call
+from unittest.mock import Mock, MagicMock, call, patch
 from resolve.resolver import Resolver
 from modules.recma.module import RecMAModule
+from modules.recma.policies import LatencyPolicy, FastestPolicy, BatchPolicy
+from modules.nodeset import NodeSet
+from modules import constants
 
 class TestRecMAModule(unittest.TestCase):
     def setUp(self):
@@ -38,5 +42,209 @@ class TestRecMAModule(unittest.TestCase):
         self.assertEqual(self.mod.need_reconf, {0: True, 1: False, 2: False, 3: False})
         self.assertEqual(self.mod.no_maj, {0: True, 1: False, 2: False, 3: False})
 
+    def test_backoff(self):
+        self.resolver.recsa_allow_reco = MagicMock(return_value=True)
+        self.resolver.recsa_get_fd_j = MagicMock(return_value=NodeSet([0]))
+        self.resolver.recsa_get_fd_part_j = MagicMock(return_value=NodeSet())
+        self.mod.iterate = MagicMock()
+        for factor in [1, 2, 4]:
+            self.mod.run_iteration()
+            self.assertEqual(self.mod.backoff, factor)
+        # an unchanged flag keeps the backoff, a changed one snaps it back
+        msg = {"sender": 1, "data": {"no_maj": False, "need_reconf": False}}
+        self.mod.receive_msg(msg)
+        self.assertEqual(self.mod.backoff, 4)
+        msg["data"]["need_reconf"] = True
+        self.mod.receive_msg(msg)
+        self.assertEqual(self.mod.backoff, 1)
+        self.assertTrue(self.mod.wakeup.is_set())
+
+        for _ in range(10):
+            self.mod.run_iteration()
+        self.assertEqual(self.mod.backoff, constants.GOSSIP_MAX_BACKOFF)
+        self.mod.need_reconf[0] = True
+        self.mod.run_iteration()
+        self.assertEqual(self.mod.backoff, 1)
+
+    def test_wait_for_input_on_trusted_change(self):
+        self.resolver.recsa_allow_reco = MagicMock(return_value=True)
+        self.resolver.recsa_get_fd_j = MagicMock(return_value=NodeSet([0, 1]))
+        self.resolver.recsa_get_fd_part_j = MagicMock(return_value=NodeSet())
+        self.mod.iterate = MagicMock()
+        self.mod.run_iteration()
+        self.mod.set_backoff(constants.GOSSIP_MAX_BACKOFF)
+        self.resolver.recsa_get_fd_j.return_value = NodeSet([0])
+        started = time.monotonic()
+        self.mod.wait_for_input(started)
+        self.assertLess(time.monotonic() - started, constants.RUN_SLEEP)
+        self.assertEqual(self.mod.backoff, 1)
+
+    def test_change_only_flags(self):
+        everyone = NodeSet(range(self.n))
+        self.resolver.recsa_get_fd_j = MagicMock(return_value=everyone)
+        self.resolver.recsa_get_fd_part_j = MagicMock(return_value=everyone)
+        self.resolver.recsa_get_config = MagicMock(return_value=everyone)
+        self.resolver.recsa_allow_reco = MagicMock(return_value=True)
+        self.resolver.send_to_node = MagicMock()
+        self.mod.prev_config = everyone
+
+        # the flags are sent once, and then only every refresh period
+        self.mod.iterate()
+        self.assertEqual(self.resolver.send_to_node.call_count, self.n - 1)
+        for _ in range(constants.RECMA_REFRESH_PERIOD - 1):
+            self.mod.iterate()
+        self.assertEqual(self.resolver.send_to_node.call_count, self.n - 1)
+        self.mod.iterate()
+        self.assertEqual(self.resolver.send_to_node.call_count,
+                         2 * (self.n - 1))
+
+        # a changed flag is sent at once
+        self.resolver.send_to_node.reset_mock()
+        self.mod.iterate()
+        self.resolver.send_to_node.assert_not_called()
+        self.resolver.recsa_get_fd_j.return_value = NodeSet([0, 1, 2, 3])
+        with patch("modules.recma.module.flag_latency") as latency:
+            self.mod.iterate()
+        self.assertEqual(self.resolver.send_to_node.call_count, self.n - 1)
+        msg = self.resolver.send_to_node.call_args[0][1]
+        self.assertTrue(msg["data"]["need_reconf"])
+        self.assertEqual(latency.labels(0).observe.call_count, self.n - 1)
+
+    def test_flags_sent_to_all_after_flush(self):
+        everyone = NodeSet(range(self.n))
+        self.resolver.recsa_get_fd_j = MagicMock(return_value=everyone)
+        self.resolver.recsa_get_fd_part_j = MagicMock(return_value=everyone)
+        self.resolver.recsa_get_config = MagicMock(return_value=everyone)
+        self.resolver.recsa_allow_reco = MagicMock(return_value=True)
+        self.resolver.send_to_node = MagicMock()
+        self.mod.prev_config = everyone
+        self.mod.iterate()
+        self.mod.iterate()
+        self.assertEqual(self.resolver.send_to_node.call_count, self.n - 1)
+
+        # unchanged flags go out to all after the configuration changed
+        self.resolver.send_to_node.reset_mock()
+        self.resolver.recsa_get_config.return_value = NodeSet(range(5))
+        with patch("modules.recma.module.flag_latency") as latency:
+            self.mod.iterate()
+        self.assertEqual(self.resolver.send_to_node.call_count, self.n - 1)
+        # the flags did not change, there is no latency to record
+        latency.labels(0).observe.assert_not_called()
+
+    def mock_rtts(self, rtts):
+        everyone = NodeSet(range(self.n))
+        self.resolver.recsa_get_fd_j = MagicMock(return_value=everyone)
+        self.resolver.recsa_get_fd_part_j = MagicMock(return_value=everyone)
+        self.resolver.fd_get_rtt = MagicMock(side_effect=rtts.get)
+
+    def test_latency_policy(self):
+        policy = LatencyPolicy(evaluations=3)
+        self.mod.policy = policy
+        conf = NodeSet(range(self.n))
+
+        # a homogeneous configuration is never replaced
+        self.mock_rtts({j: 0.01 + j / 1000 for j in range(1, self.n)})
+        for _ in range(5):
+            self.assertFalse(self.mod.eval_config(conf))
+
+        # a slow member is replaced once it was slow 3 evaluations in a row
+        self.mock_rtts({1: 0.01, 2: 0.01, 3: 0.02, 4: 0.01, 5: 0.5})
+        self.assertFalse(self.mod.eval_config(conf))
+        self.assertFalse(self.mod.eval_config(conf))
+        self.assertTrue(self.mod.eval_config(conf))
+        self.assertEqual(policy.proposal(self.mod), NodeSet(range(5)))
+
+        # the count starts over once the member is fast again
+        self.mock_rtts({j: 0.01 for j in range(1, self.n)})
+        self.assertFalse(self.mod.eval_config(conf))
+        self.mock_rtts({1: 0.01, 2: 0.01, 3: 0.02, 4: 0.01, 5: 0.5})
+        self.assertFalse(self.mod.eval_config(conf))
+
+    def test_fastest_policy(self):
+        self.mod.policy = FastestPolicy(3)
+        self.mock_rtts({1: 0.01, 2: 0.02, 3: 0.03, 4: 0.1, 5: None})
+        self.assertEqual(self.mod.policy.proposal(self.mod), NodeSet([0, 1, 2]))
+        self.assertFalse(self.mod.eval_config(NodeSet([0, 1, 2])))
+        # within the factor of the fastest processor left out
+        self.assertFalse(self.mod.eval_config(NodeSet([0, 1, 3])))
+        self.assertTrue(self.mod.eval_config(NodeSet([0, 1, 4])))
+        self.assertTrue(self.mod.eval_config(NodeSet([0, 1])))
+        self.assertTrue(self.mod.eval_config(NodeSet([0, 1, 2, 3])))
+
+    def test_estab_with_policy_proposal(self):
+        self.mod.policy = FastestPolicy(3)
+        self.mock_rtts({1: 0.01, 2: 0.02, 3: 0.03, 4: 0.1, 5: 0.2})
+        conf = NodeSet([0, 4, 5])
+        self.mod.prev_config = conf
+        self.resolver.recsa_get_config = MagicMock(return_value=conf)
+        self.resolver.recsa_allow_reco = MagicMock(return_value=True)
+        self.resolver.recsa_estab = MagicMock()
+        self.resolver.send_to_node = MagicMock()
+        self.mod.need_reconf[4] = True
+        self.mod.iterate()
+        self.resolver.recsa_estab.assert_called_once_with(NodeSet([0, 1, 2]))
+
+    def test_batch_policy(self):
+        now = [0]
+        policy = BatchPolicy(window=2, max_wait=5, clock=lambda: now[0])
+        self.mod.policy = policy
+        conf = NodeSet(range(4))
+        self.resolver.recsa_get_fd_j = MagicMock(return_value=NodeSet(range(6)))
+        participants = MagicMock(return_value=conf)
+        self.resolver.recsa_get_fd_part_j = participants
+        self.assertFalse(self.mod.eval_config(conf))
+        self.assertTrue(policy.quiescent())
+
+        # joins are grouped until the participants did not change for 2s
+        participants.return_value = NodeSet(range(5))
+        self.assertFalse(self.mod.eval_config(conf))
+        self.assertFalse(policy.quiescent())
+        now[0] = 1
+        participants.return_value = NodeSet(range(6))
+        self.assertFalse(self.mod.eval_config(conf))
+        now[0] = 3
+        self.assertTrue(self.mod.eval_config(conf))
+        self.assertEqual(policy.proposal(self.mod), NodeSet(range(6)))
+
+        # leaves are grouped as well, but not for longer than max_wait
+        conf = NodeSet(range(6))
+        self.assertFalse(self.mod.eval_config(conf))
+        self.assertTrue(policy.quiescent())
+        for t in range(4, 6):
+            now[0] = t
+            participants.return_value = NodeSet(range(t))
+            self.assertFalse(self.mod.eval_config(conf))
+        now[0] = 9
+        participants.return_value = NodeSet(range(1, 6))
+        self.assertTrue(self.mod.eval_config(conf))
+
+    def test_batch_policy_config_changes_while_participants_do_not(self):
+        now = [0]
+        self.mod.policy = BatchPolicy(window=2, max_wait=5,
+                                      clock=lambda: now[0])
+        self.resolver.recsa_get_fd_j = MagicMock(return_value=NodeSet(range(6)))
+        self.resolver.recsa_get_fd_part_j = MagicMock(
+            return_value=NodeSet(range(6)))
+        self.assertFalse(self.mod.eval_config(NodeSet(range(6))))
+        now[0] = 1
+        self.assertFalse(self.mod.eval_config(NodeSet(range(5))))
+        now[0] = 3
+        self.assertTrue(self.mod.eval_config(NodeSet(range(5))))
+
+    def test_peek_config_keeps_policy_state(self):
+        self.mod.policy = LatencyPolicy(evaluations=2)
+        self.mock_rtts({1: 0.01, 2: 0.01, 3: 0.02, 4: 0.01, 5: 0.5})
+        conf = NodeSet(range(self.n))
+        for _ in range(3):
+            self.assertFalse(self.mod.peek_config(conf))
+        self.assertEqual(self.mod.policy.slow_count, {})
+        self.assertFalse(self.mod.eval_config(conf))
+        self.assertTrue(self.mod.eval_config(conf))
+
+        self.mod.policy = BatchPolicy(window=2, clock=lambda: 0)
+        self.assertFalse(self.mod.peek_config(NodeSet(range(4))))
+        self.assertIsNone(self.mod.policy.pending_since)
+        self.assertTrue(self.mod.policy.quiescent())
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,11 +1,27 @@
 """Unit tests covering the RecSA module."""
 
+import random
+import threading
+import time
 import unittest
+from copy import deepcopy
 from unittest.mock import Mock, MagicMock, call
 from resolve.resolver import Resolver
-from modules.recsa.module import RecSAModule
+from resolve.enums import Module
+from modules.recsa.module import RecSAModule, TrackedDict
+from modules.nodeset import NodeSet
 from modules import constants
 
+
+class RecSAWithoutContext(RecSAModule):
+    """Computes every predicate from scratch, as before iteration contexts."""
+
+    def context(self):
+        return None
+
+    def evaluate(self, name):
+        return getattr(self, name)()
+
 class TestRecSAModule(unittest.TestCase):
     def setUp(self):
         self.resolver = Resolver(testing=True)
@@ -271,7 +287,414 @@ class TestRecSAModule(unittest.TestCase):
         pass
     
     # do-forever loop
-    
+    def random_state(self, rand, mod, trusted):
+        n = self.n
+        subset = lambda: sorted(rand.sample(range(n), rand.randint(0, n)))
+        if rand.random() < 0.3:
+            # all processors converged on a proposal in some phase
+            prp = (rand.randint(1, 2), subset() or [0])
+            for k in range(n):
+                mod.config[k] = [0, 1, 2]
+                mod.prp[k] = prp
+                mod.alll[k] = rand.random() < 0.9
+                mod.echo_all[k] = mod.alll[k]
+                mod.echo_prp[k] = prp
+                mod.echo_part[k] = sorted(trusted)
+                mod.fd[k] = sorted(trusted)
+                mod.fd_part[k] = sorted(trusted)
+            mod.all_seen = set(trusted)
+            return
+        coherent = rand.random() < 0.5
+        common_conf = subset()
+        common_set = subset() or constants.BOTTOM
+        for k in range(n):
+            if coherent:
+                mod.config[k] = rand.choice([common_conf] * 4 + [
+                    constants.NOT_PARTICIPANT, constants.BOTTOM])
+                phase = rand.choice([0, 0, 1, 2])
+                mod.prp[k] = (phase, constants.BOTTOM if phase == 0
+                              else common_set)
+            else:
+                mod.config[k] = rand.choice([
+                    subset(), [], constants.NOT_PARTICIPANT, constants.BOTTOM])
+                mod.prp[k] = (rand.randint(0, 2),
+                              rand.choice([subset(), constants.BOTTOM]))
+            mod.alll[k] = rand.random() < 0.5
+            mod.echo_all[k] = rand.random() < 0.5
+            mod.echo_prp[k] = rand.choice([mod.prp[k], constants.DFLT_NTF])
+            mod.echo_part[k] = subset()
+            if k != mod.id:
+                mod.fd[k] = subset()
+                mod.fd_part[k] = subset()
+        mod.all_seen = set(subset())
+
+    def test_state_roundtrip_over_wire(self):
+        sender = RecSAModule(1, self.resolver, self.n)
+        sender.fd[1] = NodeSet([0, 1])
+        sender.read_trusted = MagicMock(return_value=NodeSet([0, 1]))
+        sender.config = {k: NodeSet([0, 1]) for k in range(self.n)}
+        sender.prp[1] = (1, NodeSet([0, 1, 2]))
+        self.resolver.send_to_node = MagicMock()
+        sender.send_state(0)
+        msg = self.resolver.send_to_node.call_args[0][1]
+        self.assertEqual(msg["data"]["fd"], [0, 1])
+        self.assertEqual(msg["data"]["prp"], (1, [0, 1, 2]))
+
+        self.mod.receive_msg(msg)
+        self.mod.apply_inbox()
+        self.assertIsInstance(self.mod.fd[1], NodeSet)
+        self.assertEqual(self.mod.fd[1], [0, 1])
+        self.assertEqual(self.mod.config[1], [0, 1])
+        self.assertEqual(self.mod.prp[1], (1, NodeSet([0, 1, 2])))
+
+    def test_receive_msg_drops_invalid_ids(self):
+        data = {"fd": [0, "x"], "fd_part": [], "config": [],
+                "prp": constants.DFLT_NTF, "alll": False,
+                "echo_fd_part": [], "echo_prp": constants.DFLT_NTF,
+                "echo_all": False}
+        self.mod.receive_msg({"sender": 1, "data": data})
+        self.mod.apply_inbox()
+        self.assertNotIn(1, self.mod.fd)
+
+    def test_receive_msg_drops_oversized_ids(self):
+        data = {"fd": [0, 1], "fd_part": [], "config": [2**33],
+                "prp": (1, [0, self.n]), "alll": False,
+                "echo_fd_part": [], "echo_prp": constants.DFLT_NTF,
+                "echo_all": False}
+        self.mod.receive_msg({"sender": 1, "data": data})
+        self.mod.receive_msg({"sender": 1,
+                              "data": {**data, "config": [0, 1]}})
+        self.mod.apply_inbox()
+        self.assertNotIn(1, self.mod.fd)
+
+    def test_receive_msg_notifies_on_changed_state(self):
+        data = {"fd": [0, 1], "fd_part": [0, 1], "config": [0, 1],
+                "prp": constants.DFLT_NTF, "alll": True,
+                "echo_fd_part": [0, 1], "echo_prp": constants.DFLT_NTF,
+                "echo_all": True}
+        self.mod.receive_msg({"sender": 1, "data": data})
+        self.assertTrue(self.mod.wakeup.is_set())
+        self.mod.apply_inbox()
+        self.mod.wakeup.clear()
+        self.mod.receive_msg({"sender": 1, "data": dict(data)})
+        self.assertFalse(self.mod.wakeup.is_set())
+        self.mod.receive_msg({"sender": 1, "data": {**data, "alll": False}})
+        self.assertTrue(self.mod.wakeup.is_set())
+
+    def test_run_iteration_notifies_on_changed_local_state(self):
+        self.mod.iterate = MagicMock()
+        self.mod.run_iteration()
+        self.assertFalse(self.mod.wakeup.is_set())
+        self.mod.iterate = lambda: self.mod.prp.update({0: (1, [0])})
+        self.mod.run_iteration()
+        self.assertTrue(self.mod.wakeup.is_set())
+
+    def test_wait_for_input(self):
+        mod = RecSAModule(0, self.resolver, self.n, min_interval=0,
+                          max_interval=0.2)
+        mod.trusted_version = self.resolver.fd_get_trusted_snapshot()[0]
+        started = time.monotonic()
+        mod.wait_for_input(started)
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+        mod.max_interval = 10
+        started = time.monotonic()
+        mod.notify()
+        mod.wait_for_input(started)
+        self.assertLess(time.monotonic() - started, 1)
+
+        self.resolver.fd_get_trusted_snapshot = MagicMock(
+            return_value=(5, frozenset()))
+        mod.wakeup.clear()
+        started = time.monotonic()
+        mod.wait_for_input(started)
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_inbox_keeps_latest_state_per_sender(self):
+        data = {"fd": [0, 1], "fd_part": [0, 1], "config": [0, 1],
+                "prp": constants.DFLT_NTF, "alll": False,
+                "echo_fd_part": [0, 1], "echo_prp": constants.DFLT_NTF,
+                "echo_all": True}
+        self.mod.receive_msg({"sender": 1, "data": data})
+        self.mod.receive_msg({"sender": 1, "data": {**data, "alll": True}})
+        self.mod.receive_msg({"sender": 2, "data": data})
+        self.assertEqual(self.mod.alll[1], False)
+        self.assertEqual(len(self.mod.inbox), 2)
+        self.mod.apply_inbox()
+        self.assertEqual(self.mod.inbox, {})
+        self.assertEqual(self.mod.alll[1], True)
+        self.assertEqual(self.mod.config[2], [0, 1])
+
+    def test_receive_during_iterations(self):
+        self.resolver.fd_get_trusted = MagicMock(
+            return_value=frozenset(range(self.n)))
+        self.resolver.send_to_node = MagicMock()
+        self.resolver.fd_stable_monitor = MagicMock(return_value=True)
+        self.resolver.fd_reset_monitor = MagicMock()
+        everyone = list(range(self.n))
+        data = {"fd": everyone, "fd_part": everyone, "config": everyone,
+                "prp": constants.DFLT_NTF, "alll": True,
+                "echo_fd_part": everyone, "echo_prp": constants.DFLT_NTF,
+                "echo_all": True}
+        for k in range(self.n):
+            self.mod.config[k] = everyone
+            self.mod.alll[k] = True
+        stop = threading.Event()
+
+        def receive():
+            while not stop.is_set():
+                for j in range(1, self.n):
+                    self.mod.receive_msg({"sender": j, "data": data})
+
+        receiver = threading.Thread(target=receive)
+        receiver.start()
+        try:
+            for _ in range(200):
+                self.mod.iterate()
+        finally:
+            stop.set()
+            receiver.join()
+        self.mod.iterate()
+        self.assertEqual(self.mod.get_config_j(0), everyone)
+
+    def test_tracked_dict_counts_changes(self):
+        d = TrackedDict({0: NodeSet([1])})
+        self.assertEqual(d.version, 0)
+        d[0] = NodeSet([1])
+        self.assertEqual(d.version, 0)
+        d[0] = [1, 2]
+        d[1] = False
+        self.assertEqual(d.version, 2)
+        d.update({1: False, 2: True})
+        self.assertEqual(d.version, 3)
+        del d[2]
+        self.assertEqual(d.version, 4)
+        self.assertEqual(d, {0: [1, 2], 1: False})
+
+    def stable_module(self):
+        """Returns a module in a stable state with all processors trusted."""
+        self.resolver.fd_get_trusted = MagicMock(
+            return_value=frozenset(range(self.n)))
+        self.resolver.send_to_node = MagicMock()
+        self.resolver.fd_stable_monitor = MagicMock(return_value=True)
+        self.resolver.fd_reset_monitor = MagicMock()
+        everyone = NodeSet(range(self.n))
+        for k in range(self.n):
+            self.mod.config[k] = everyone
+            self.mod.alll[k] = True
+            self.mod.fd[k] = everyone
+            self.mod.fd_part[k] = everyone
+            self.mod.echo_part[k] = everyone
+            self.mod.echo_all[k] = True
+        self.mod.all_seen = everyone
+        return self.mod
+
+    def test_predicates_reused_while_inputs_unchanged(self):
+        mod = self.stable_module()
+        mod.iterate()
+        skipped = mod.predicates_skipped
+        mod.stale_info_type_3 = MagicMock(return_value=False)
+        mod.iterate()
+        mod.stale_info_type_3.assert_not_called()
+        self.assertGreaterEqual(mod.predicates_skipped - skipped, 4)
+
+        # a changed phase of p_1 re-evaluates the predicates reading prp[]
+        mod.prp[1] = (1, NodeSet([0, 1]))
+        mod.stale_info_type_4 = MagicMock(return_value=False)
+        mod.iterate()
+        mod.stale_info_type_3.assert_called_once()
+        mod.stale_info_type_4.assert_not_called()
+
+    def test_predicates_evaluated_after_received_change(self):
+        mod = self.stable_module()
+        mod.iterate()
+        mod.stale_info_type_2 = MagicMock(return_value=True)
+        data = {"fd": list(range(self.n)), "fd_part": list(range(self.n)),
+                "config": list(range(self.n)), "prp": constants.DFLT_NTF,
+                "alll": True, "echo_fd_part": list(range(self.n)),
+                "echo_prp": constants.DFLT_NTF, "echo_all": True}
+        mod.receive_msg({"sender": 1, "data": data})
+        mod.iterate()
+        mod.stale_info_type_2.assert_not_called()
+        mod.receive_msg({"sender": 1, "data": {**data, "config": "BOTTOM"}})
+        mod.iterate()
+        mod.stale_info_type_2.assert_called_once()
+
+    def test_predicates_evaluated_periodically(self):
+        mod = self.stable_module()
+        mod.stale_info_type_1 = MagicMock(return_value=False)
+        for _ in range(constants.RECSA_FULL_EVALUATION_PERIOD):
+            mod.iterate()
+        self.assertEqual(mod.stale_info_type_1.call_count, 2)
+
+    def test_backoff_while_quiescent(self):
+        mod = self.stable_module()
+        mod.resolver.fd_get_trusted_snapshot = MagicMock(
+            return_value=(1, frozenset(range(self.n))))
+        for factor in [1, 2, 4]:
+            mod.run_iteration()
+            self.assertEqual(mod.backoff, factor)
+        mod.notify()
+        self.assertEqual(mod.backoff, 1)
+        for _ in range(10):
+            mod.run_iteration()
+        self.assertEqual(mod.backoff, constants.GOSSIP_MAX_BACKOFF)
+
+        # p_1 not trusting p_0 disallows reconfigurations, snaps it back
+        mod.fd[1] = NodeSet([1])
+        mod.run_iteration()
+        self.assertEqual(mod.backoff, 1)
+
+    def test_quiescent_reads_published_view(self):
+        mod = self.stable_module()
+        mod.resolver.fd_get_trusted_snapshot = MagicMock(
+            return_value=(1, frozenset(range(self.n))))
+        mod.run_iteration()
+        mod.allow_reco = MagicMock(return_value=False)
+        self.assertTrue(mod.quiescent())
+        mod.allow_reco.assert_not_called()
+
+    def test_wait_for_input_resets_backoff_on_fd_change(self):
+        mod = self.stable_module()
+        mod.min_interval = 0
+        mod.backoff = 8
+        mod.trusted_version = 0
+        mod.resolver.fd_get_trusted_snapshot = MagicMock(
+            return_value=(1, frozenset(range(self.n))))
+        started = time.monotonic()
+        mod.wait_for_input(started)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(mod.backoff, 1)
+
+    def test_published_view(self):
+        mod = self.stable_module()
+        self.resolver.set_modules({Module.RECSA_MODULE: mod})
+        version = mod.view.version
+        mod.iterate()
+        view = mod.view
+        self.assertEqual(view.version, version + 1)
+        self.assertTrue(view.allow_reco)
+        self.assertEqual(view.config, list(range(self.n)))
+        self.assertEqual(view.get_fd_part_j(0), list(range(self.n)))
+        with self.assertRaises(AttributeError):
+            view.config = []
+        with self.assertRaises(TypeError):
+            view.fd[0] = NodeSet()
+
+        # the resolver reads the view without computing anything
+        mod.allow_reco = MagicMock()
+        mod.get_fd_part_j = MagicMock()
+        self.assertTrue(self.resolver.recsa_allow_reco())
+        self.assertEqual(self.resolver.recsa_get_config(), view.config)
+        self.assertEqual(self.resolver.recsa_get_fd_part_j(1),
+                         list(range(self.n)))
+        self.assertEqual(self.resolver.recsa_get_fd_j(7), [])
+        mod.allow_reco.assert_not_called()
+        mod.get_fd_part_j.assert_not_called()
+        self.assertGreaterEqual(view.age(), 0)
+
+    def test_digest_of_received_state(self):
+        mod = self.stable_module()
+        sender = RecSAModule(1, self.resolver, self.n, digests=True)
+        for name in ["config", "prp", "alll", "fd", "fd_part", "echo_part",
+                     "echo_prp", "echo_all"]:
+            getattr(sender, name).update(getattr(mod, name))
+        sender.all_seen = mod.all_seen
+        sender.send_state(0)
+        full = self.resolver.send_to_node.call_args[0][1]
+        self.assertIn("data", full)
+        sender.send_state(0)
+        msg = self.resolver.send_to_node.call_args[0][1]
+        self.assertNotIn("data", msg)
+
+        # a pending state is compared before it is applied
+        mod.receive_msg(full)
+        self.resolver.send_to_node.reset_mock()
+        mod.receive_msg(msg)
+        mod.apply_inbox()
+        mod.receive_msg(msg)
+        self.resolver.send_to_node.assert_not_called()
+
+        # a corrupted copy of the state of p_1 is requested again
+        mod.config[1] = NodeSet([1])
+        mod.receive_msg(msg)
+        request = self.resolver.send_to_node.call_args[0][1]
+        self.assertEqual(self.resolver.send_to_node.call_args[0][0], 1)
+        sender.receive_msg(request)
+        self.assertTrue(sender.wakeup.is_set())
+        sender.send_state(0)
+        self.assertIn("data", self.resolver.send_to_node.call_args[0][1])
+
+    def test_non_participant_sends_once_it_trusts_a_participant(self):
+        self.resolver.fd_get_trusted = MagicMock(
+            return_value=frozenset([0, 1, 2]))
+        self.resolver.fd_stable_monitor = MagicMock(return_value=False)
+        self.resolver.fd_reset_monitor = MagicMock()
+        self.resolver.send_to_node = MagicMock()
+
+        # no trusted participant, e.g. during a clean start: p_i keeps quiet
+        self.mod.iterate()
+        self.resolver.send_to_node.assert_not_called()
+
+        # a joiner sends its state, so the members echo it and see all[i]
+        for k in [1, 2]:
+            self.mod.config[k] = NodeSet([1, 2])
+        self.mod.iterate()
+        receivers = [c[0][0] for c in self.resolver.send_to_node.call_args_list]
+        self.assertEqual(sorted(set(receivers) - {0}), [1, 2])
+        self.assertEqual(self.mod.get_config_j(0), constants.NOT_PARTICIPANT)
+
+    def test_full_state_sent_periodically(self):
+        mod = RecSAModule(0, self.resolver, self.n, digests=True)
+        self.resolver.send_to_node = MagicMock()
+        sent = []
+        for _ in range(2 * constants.RECSA_FULL_STATE_PERIOD):
+            mod.iterations += 1
+            mod.send_state(1)
+            sent.append("data" in self.resolver.send_to_node.call_args[0][1])
+        self.assertEqual(sent.count(True), 2)
+
+    def test_iteration_context_gives_identical_results(self):
+        rand = random.Random(3)
+        for _ in range(300):
+            trusted = frozenset(rand.sample(range(self.n),
+                                            rand.randint(1, self.n)))
+            stable = {k: rand.random() < 0.8 for k in range(self.n)}
+            modules = []
+            for cls in [RecSAModule, RecSAWithoutContext]:
+                resolver = Resolver(testing=True)
+                resolver.fd_get_trusted = MagicMock(return_value=trusted)
+                resolver.fd_stable_monitor = lambda k: stable[k]
+                resolver.fd_reset_monitor = MagicMock()
+                resolver.send_to_node = MagicMock()
+                modules.append(cls(0, resolver, self.n))
+            with_ctx, without_ctx = modules
+            self.random_state(rand, with_ctx, trusted)
+            for attr in ["config", "prp", "alll", "all_seen", "fd",
+                         "fd_part", "echo_part", "echo_prp", "echo_all"]:
+                setattr(without_ctx, attr, deepcopy(getattr(with_ctx, attr)))
+
+            for _ in range(3):
+                # some corrupt states make both variants fail the same way
+                errors = []
+                for mod in modules:
+                    try:
+                        mod.iterate()
+                        errors.append(None)
+                    except TypeError as e:
+                        errors.append(str(e))
+                self.assertEqual(errors[0], errors[1])
+                for attr in ["config", "prp", "alll", "all_seen"]:
+                    self.assertEqual(getattr(with_ctx, attr),
+                                     getattr(without_ctx, attr))
+                self.assertEqual(
+                    with_ctx.resolver.send_to_node.call_args_list,
+                    without_ctx.resolver.send_to_node.call_args_list)
+                self.assertEqual(
+                    with_ctx.resolver.fd_reset_monitor.call_args_list,
+                    without_ctx.resolver.fd_reset_monitor.call_args_list)
+            self.assertIsNone(with_ctx.context())
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
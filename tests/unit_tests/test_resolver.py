@@ -1,5 +1,7 @@
 import unittest
+from unittest.mock import MagicMock
 from resolve.resolver import Resolver
+from resolve.enums import MessageType, SystemStatus
 
 class TestResolver(unittest.TestCase):
     def test_resolver_can_be_initialized(self):
@@ -7,5 +9,25 @@ class TestResolver(unittest.TestCase):
         self.assertIsNotNone(resolver)
         self.assertIsNone(resolver.modules)
 
+    def test_ready_signal_kicks_fd_sender_and_is_acknowledged(self):
+        resolver = Resolver(testing=True)
+        resolver.send_to_node = MagicMock()
+        resolver.fd_senders[1] = MagicMock()
+        msg = {"type": MessageType.READY_MESSAGE, "sender": 1, "ack": False}
+        resolver.receive_ready(msg)
+        resolver.fd_senders[1].kick.assert_not_called()
+        resolver.system_status = SystemStatus.RUNNING
+        resolver.dispatch_msg(msg)
+        resolver.fd_senders[1].kick.assert_called_once()
+        resolver.send_to_node.assert_called_once_with(
+            1, {"type": MessageType.READY_MESSAGE, "sender": resolver.id,
+                "ack": True})
+
+    def test_ready_ack_is_recorded(self):
+        resolver = Resolver(testing=True)
+        resolver.receive_ready({"type": MessageType.READY_MESSAGE,
+                                "sender": 2, "ack": True})
+        self.assertEqual(resolver.ready_acks, {2})
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,109 @@
+"""Unit tests covering the round-based simulator."""
+
+import unittest
+from modules import constants
+from modules.nodeset import as_node_set
+from simulation.simulator import Simulator, START_CLEAN, START_STABLE
+
+
+class TestSimulator(unittest.TestCase):
+    def test_clean_start_converges_to_all(self):
+        sim = Simulator(6, start=START_CLEAN)
+        self.assertIsNotNone(sim.run(30))
+        for i in range(6):
+            self.assertEqual(sim.recsa(i).get_config_j(i), list(range(6)))
+
+    def test_clean_start_with_slow_monitors_converges(self):
+        # processor 0 resets while the others still wait for their monitors,
+        # their state must not make it the only participant
+        sim = Simulator(3, start=START_CLEAN,
+                        monitors_stable={0: 3, 1: 20, 2: 20})
+        for _ in range(8):
+            sim.step()
+            participants = [i for i in range(3) if sim.recsa(0).get_config_j(i)
+                            != constants.NOT_PARTICIPANT]
+            self.assertNotEqual(participants, [0])
+        self.assertTrue(sim.converged())
+        for i in range(3):
+            self.assertEqual(sim.recsa(i).get_config_j(i), [0, 1, 2])
+
+    def test_stable_start_is_converged(self):
+        sim = Simulator(6, start=START_STABLE)
+        self.assertTrue(sim.converged())
+        self.assertEqual(sim.run(10), 1)
+
+    def test_crashes_lead_to_reconfiguration(self):
+        sim = Simulator(8, start=START_STABLE, crashes={1: 1, 2: 1, 3: 1})
+        self.assertIsNotNone(sim.run(60))
+        self.assertEqual(sim.recsa(0).get_config_j(0), [0, 4, 5, 6, 7])
+        self.assertEqual(sim.recsa(1).get_config_j(1), list(range(8)))
+
+    def test_crashes_lead_to_reconfiguration_with_digests(self):
+        sim = Simulator(8, start=START_STABLE, crashes={1: 1, 2: 1, 3: 1},
+                        max_delay=2, loss=0.1, digests=True)
+        self.assertIsNotNone(sim.run(80))
+        self.assertEqual(sim.recsa(0).get_config_j(0), [0, 4, 5, 6, 7])
+
+    def test_joining_processors_become_participants(self):
+        sim = Simulator(8, start=START_STABLE, members=range(6))
+        self.assertIsNotNone(sim.run(40))
+        for i in range(8):
+            self.assertEqual(sim.recsa(i).get_config_j(i), list(range(6)))
+
+    def test_joining_processors_apply_snapshot_before_participating(self):
+        state = {"label": 5, "data": "x" * 100000}
+        sim = Simulator(6, start=START_STABLE, members=range(4),
+                        app_state=state)
+        while sim.round < 40 and any(i not in sim.recsa(i).get_fd_part_j(i)
+                                     for i in (4, 5)):
+            sim.step()
+            for i in (4, 5):
+                if i in sim.recsa(i).get_fd_part_j(i):
+                    self.assertEqual(sim.resolvers[i].app_state, state)
+        self.assertEqual(sim.resolvers[4].app_state, state)
+        self.assertEqual(sim.resolvers[5].app_state, state)
+
+    def test_batched_joins_are_added_in_one_reconfiguration(self):
+        sim = Simulator(10, start=START_STABLE, members=range(6),
+                        arrivals={6: 1, 7: 2, 8: 3, 9: 4}, batch_window=1)
+        configs = [sim.recsa(0).get_config_j(0)]
+        while sim.round < 80 and any(sim.recsa(i).get_config_j(i) !=
+                                     list(range(10)) for i in range(10)):
+            sim.step()
+            config = as_node_set(sim.recsa(0).get_config_j(0))
+            if config is not None and config != configs[-1]:
+                configs.append(config)
+        self.assertEqual(configs, [list(range(6)), list(range(10))])
+        self.assertTrue(sim.converged())
+
+    def test_deterministic(self):
+        runs = []
+        for _ in range(2):
+            sim = Simulator(6, seed=3, max_delay=3, loss=0.2,
+                            start=START_CLEAN)
+            runs.append((sim.run(60), sim.msgs_sent, sim.msgs_lost))
+        self.assertEqual(runs[0], runs[1])
+        self.assertGreater(runs[0][2], 0)
+
+    def test_messages_to_self_are_not_delivered(self):
+        sim = Simulator(3, start=START_STABLE)
+        sim.resolvers[0].send_to_node(0, {"type": None})
+        self.assertEqual(sim.msgs_sent, 0)
+
+    def test_mocked_failure_detector(self):
+        sim = Simulator(4, crashes={2: 1}, detection_rounds=2,
+                        monitor_rounds=2)
+        resolver = sim.resolvers[0]
+        for _ in range(2):
+            sim.step()
+            self.assertIn(2, resolver.fd_get_trusted())
+        sim.step()
+        self.assertNotIn(2, resolver.fd_get_trusted())
+        resolver.fd_reset_monitor(1)
+        self.assertFalse(resolver.fd_stable_monitor(1))
+        sim.round += 2
+        self.assertTrue(resolver.fd_stable_monitor(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
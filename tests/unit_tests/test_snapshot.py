@@ -0,0 +1,100 @@
+"""Unit tests covering the snapshot transfer of the application state."""
+
+import queue
+import sys
+import threading
+import unittest
+from modules.nodeset import NodeSet
+from modules.joining_mechanism.snapshot import (Snapshot, SnapshotCache,
+                                                SnapshotTransfer)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.state = {"label": 3, "data": "".join(map(str, range(2000)))}
+        self.snapshot = Snapshot.of(self.state, chunk_size=1000)
+        self.clock = FakeClock()
+        self.transfer = SnapshotTransfer(self.snapshot.meta(), self.clock,
+                                         window=2, timeout=2)
+        self.transfer.sources = NodeSet([1, 2])
+
+    def deliver(self, requests):
+        for source, indexes in requests.items():
+            for index in indexes:
+                self.transfer.receive(source, self.snapshot.chunk(index))
+
+    def test_chunks_are_requested_from_all_sources_in_parallel(self):
+        requests = self.transfer.requests()
+        self.assertEqual(requests, {1: [0, 2], 2: [1, 3]})
+        self.assertEqual(self.transfer.requests(), {})
+        self.assertEqual(self.transfer.requests(NodeSet([1])), {})
+        while not self.transfer.complete():
+            self.deliver(requests)
+            requests = self.transfer.requests()
+        self.assertEqual(self.transfer.snapshot().state(), self.state)
+        self.assertEqual(self.transfer.received(), len(self.snapshot.data))
+
+    def test_corrupted_chunk_is_requested_again(self):
+        chunk = self.snapshot.chunk(0)
+        chunk["checksum"] = self.snapshot.chunk(1)["checksum"]
+        self.transfer.requests()
+        self.assertIsNone(self.transfer.receive(1, chunk))
+        self.assertEqual(self.transfer.corrupted, 1)
+        self.assertEqual(self.transfer.requests(), {1: [0]})
+
+    def test_timed_out_chunks_are_requested_from_other_sources(self):
+        self.transfer.requests()
+        self.deliver({2: [1, 3]})
+        self.clock.now = 2
+        self.assertEqual(self.transfer.requests(), {2: [0, 2]})
+        self.deliver({2: [0, 2]})
+        self.transfer.source_missing(2)
+        self.assertEqual(self.transfer.requests(), {1: [4, 5]})
+
+    def test_chunks_are_requested_once_while_received_concurrently(self):
+        snapshot = Snapshot.of(self.state, chunk_size=10)
+        transfer = SnapshotTransfer(snapshot.meta(), self.clock, window=4)
+        transfer.sources = NodeSet(range(8))
+        requested = queue.Queue()
+
+        def receive():
+            while True:
+                requests = requested.get()
+                if requests is None:
+                    return
+                for source, indexes in requests.items():
+                    for index in indexes:
+                        transfer.receive(source, snapshot.chunk(index))
+        receiver = threading.Thread(target=receive)
+        # switch threads often, to interleave receiving and requesting
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        indexes = []
+        try:
+            receiver.start()
+            while not transfer.complete():
+                requests = transfer.requests()
+                indexes += [i for r in requests.values() for i in r]
+                requested.put(requests)
+        finally:
+            requested.put(None)
+            receiver.join()
+            sys.setswitchinterval(interval)
+        self.assertEqual(sorted(indexes), list(range(snapshot.chunks)))
+        self.assertEqual(transfer.snapshot().state(), self.state)
+
+    def test_cache_keeps_most_recent_snapshots(self):
+        cache = SnapshotCache(size=2)
+        offered = [cache.offer({"label": k}) for k in range(3)]
+        self.assertIsNone(cache.get(offered[0]["digest"]))
+        self.assertEqual(cache.get(offered[2]["digest"]).state(),
+                         {"label": 2})
+        self.assertEqual(offered[2]["chunks"], 1)
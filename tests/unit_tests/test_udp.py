@@ -0,0 +1,219 @@
+"""Unit tests covering the self-stabilizing UDP channel."""
+
+import socket
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from communication.udp.sender import Sender
+from communication.udp.receiver import Receiver
+from communication.udp.message import Message
+from communication.udp.rtt import RTTEstimator
+from modules.constants import FD_RERESOLVE_AFTER
+
+
+class TestUDPSender(unittest.TestCase):
+    def setUp(self):
+        self.receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.receiver.bind(("127.0.0.1", 0))
+        self.receiver.settimeout(1)
+        port = self.receiver.getsockname()[1]
+        self.sender = Sender(0, ("localhost", port))
+
+    def tearDown(self):
+        self.receiver.close()
+        self.sender.socket.close()
+
+    def test_send_resolves_once(self):
+        with patch("socket.getaddrinfo", wraps=socket.getaddrinfo) as gai:
+            self.sender.send(Message(0, 1), timeout=False)
+            self.sender.send(Message(0, 2), timeout=False)
+            self.assertEqual(gai.call_count, 1)
+        self.assertEqual(self.sender.resolved_addr[0], "127.0.0.1")
+        for counter in [1, 2]:
+            msg = Message.from_bytes(self.receiver.recv(1024))
+            self.assertEqual(msg.get_msg_counter(), counter)
+
+    def test_re_resolve_after_failures(self):
+        self.sender.send(Message(0, 1), timeout=False)
+        self.assertFalse(self.sender.needs_resolve())
+        self.sender.failed_sends = FD_RERESOLVE_AFTER
+        self.assertTrue(self.sender.needs_resolve())
+        with patch("socket.getaddrinfo", wraps=socket.getaddrinfo) as gai:
+            self.sender.send(Message(0, 2), timeout=False)
+            self.assertEqual(gai.call_count, 1)
+        self.assertEqual(self.sender.failed_sends, 0)
+
+    def test_keeps_address_if_resolution_fails(self):
+        self.sender.send(Message(0, 1), timeout=False)
+        resolved = self.sender.resolved_addr
+        with patch("socket.getaddrinfo", side_effect=socket.gaierror):
+            self.assertTrue(self.sender.resolve())
+        self.assertEqual(self.sender.resolved_addr, resolved)
+
+    def test_pack_token_packs_queued_payloads_in_order(self):
+        for i in range(5):
+            self.sender.add_msg_to_queue({"sender": 0, "i": i})
+        msg = self.sender.pack_token()
+        self.assertEqual([p["i"] for p in msg.get_payloads()], list(range(5)))
+        self.assertFalse(self.sender.has_payload_to_send())
+
+    def test_pack_token_respects_bufsize(self):
+        self.sender.bufsize = 200
+        for i in range(10):
+            self.sender.add_msg_to_queue({"sender": 0, "i": i})
+        received = []
+        while self.sender.has_payload_to_send():
+            msg = self.sender.pack_token()
+            self.assertLessEqual(len(msg.to_bytes()), 200)
+            self.assertTrue(msg.has_payload())
+            received += [p["i"] for p in msg.get_payloads()]
+        self.assertEqual(received, list(range(10)))
+
+    def test_pack_token_drops_oversized_payload(self):
+        self.sender.bufsize = 200
+        self.sender.add_msg_to_queue({"data": "x" * 300})
+        self.sender.add_msg_to_queue({"data": "y"})
+        msg = self.sender.pack_token()
+        self.assertEqual(msg.get_payloads(), [{"data": "y"}])
+        self.assertLessEqual(len(msg.to_bytes()), 200)
+        self.assertFalse(self.sender.has_payload_to_send())
+
+    def test_pack_token_fills_bufsize_exactly(self):
+        shared = {"members": [1, 2, 3]}
+        payloads = [{"i": i, "shared": shared} for i in range(4)] + [{}, {}]
+        full = Message(0, self.sender.msg_counter, payloads=payloads)
+        self.sender.bufsize = len(full.to_bytes())
+        for payload in payloads + [{"i": 4}]:
+            self.sender.add_msg_to_queue(payload)
+        msg = self.sender.pack_token()
+        self.assertEqual(msg.get_payloads(), payloads)
+        self.assertEqual(len(msg.to_bytes()), self.sender.bufsize)
+        self.assertEqual(self.sender.pending_payload, {"i": 4})
+
+
+class TestUDPReceiver(unittest.TestCase):
+    def setUp(self):
+        self.payloads = []
+        self.receiver = Receiver(("127.0.0.1", 0),
+                                 on_message_recv=self.payloads.append)
+        self.sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sender.bind(("127.0.0.1", 0))
+        self.sender.settimeout(1)
+
+    def tearDown(self):
+        self.receiver.socket.close()
+        self.sender.close()
+
+    def test_dispatches_payloads_in_order_once(self):
+        addr = self.sender.getsockname()
+        msg = Message(1, 1, payloads=[{"i": 0}, {"i": 1}, {"i": 2}])
+        self.receiver.on_token(msg, addr)
+        self.receiver.on_token(msg, addr)
+        self.assertEqual(self.payloads, [{"i": 0}, {"i": 1}, {"i": 2}])
+
+        # only the token is sent back, for both the new and repeated token
+        for _ in range(2):
+            token = Message.from_bytes(self.sender.recv(1024))
+            self.assertEqual(token.get_msg_counter(), 1)
+            self.assertFalse(token.has_payload())
+
+
+class TestRTTEstimator(unittest.TestCase):
+    def test_first_sample(self):
+        rtt = RTTEstimator(initial_rto=5, min_rto=0.01, max_rto=60)
+        self.assertEqual(rtt.rto, 5)
+        rtt.on_sample(0.1)
+        self.assertAlmostEqual(rtt.srtt, 0.1)
+        self.assertAlmostEqual(rtt.rttvar, 0.05)
+        self.assertAlmostEqual(rtt.rto, 0.3)
+
+    def test_converges_to_stable_rtt(self):
+        rtt = RTTEstimator(initial_rto=5, min_rto=0.01, max_rto=60)
+        for _ in range(100):
+            rtt.on_sample(0.05)
+        self.assertAlmostEqual(rtt.srtt, 0.05)
+        self.assertLess(rtt.rto, 0.06)
+
+    def test_bounds_and_backoff(self):
+        rtt = RTTEstimator(initial_rto=5, min_rto=0.2, max_rto=8)
+        rtt.on_sample(0.0002)
+        self.assertEqual(rtt.rto, 0.2)
+        rtt.on_timeout()
+        self.assertEqual(rtt.rto, 0.4)
+        for _ in range(10):
+            rtt.on_timeout()
+        self.assertEqual(rtt.rto, 8)
+
+    def test_invalid_bounds(self):
+        with self.assertRaises(ValueError):
+            RTTEstimator(min_rto=2, max_rto=1)
+
+
+class TestUDPSenderRetransmission(unittest.TestCase):
+    def setUp(self):
+        self.receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.receiver.bind(("127.0.0.1", 0))
+        self.receiver.settimeout(1)
+        port = self.receiver.getsockname()[1]
+        self.sender = Sender(0, ("localhost", port))
+        self.sender.rtt = RTTEstimator(initial_rto=0.05, min_rto=0.05)
+
+    def tearDown(self):
+        self.receiver.close()
+        self.sender.socket.close()
+
+    def test_samples_only_non_retransmitted_tokens(self):
+        self.sender.send(Message(0, 0), timeout=False)
+        self.sender.token_sent_at = 0
+        self.sender.token_retransmitted = True
+        self.sender.on_token_returned(0)
+        self.assertIsNone(self.sender.rtt.srtt)
+        self.sender.token_retransmitted = False
+        self.sender.on_token_returned(0)
+        self.assertIsNotNone(self.sender.rtt.srtt)
+
+    def test_retransmits_after_rto(self):
+        msg = Message(0, 1)
+        self.sender.msg_counter = 1
+        self.sender.send(msg)
+        first = Message.from_bytes(self.receiver.recv(1024))
+        retransmitted = Message.from_bytes(self.receiver.recv(1024))
+        self.assertEqual(first.get_msg_counter(), 1)
+        self.assertEqual(retransmitted.get_msg_counter(), 1)
+        self.assertTrue(self.sender.token_retransmitted)
+        self.assertEqual(self.sender.rtt.rto, 0.1)
+        self.sender.last_recv_msg_counter = 1
+
+    def test_token_loss_is_reported(self):
+        self.sender.on_token_lost = MagicMock()
+        self.sender.msg_counter = 1
+        self.sender.send(Message(0, 1))
+        self.receiver.recv(1024)
+        self.receiver.recv(1024)
+        self.sender.last_recv_msg_counter = 1
+        self.sender.on_token_lost.assert_called()
+
+    def test_kick_re_sends_token_in_flight(self):
+        self.sender.kick()
+        self.sender.msg_counter = 1
+        self.sender.send(Message(0, 1), timeout=False)
+        self.receiver.recv(1024)
+        self.sender.kick()
+        resent = Message.from_bytes(self.receiver.recv(1024))
+        self.assertEqual(resent.get_msg_counter(), 1)
+        self.assertTrue(self.sender.token_retransmitted)
+        self.sender.last_recv_msg_counter = 1
+        self.sender.token_retransmitted = False
+        self.sender.kick()
+        self.assertFalse(self.sender.token_retransmitted)
+
+    def test_pace_rereads_token_interval(self):
+        intervals = iter([10, 0])
+        self.sender.token_interval = lambda: next(intervals)
+        start = time.time()
+        self.sender.pace(start)
+        self.assertLess(time.time() - start, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()